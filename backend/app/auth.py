@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
@@ -17,6 +17,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 дней
 
 # OAuth2 схема
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+# Для эндпоинтов, где токен может прийти query-параметром (EventSource не умеет заголовки)
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -101,3 +103,19 @@ def get_current_active_user(current_user: models.User = Depends(get_current_user
             headers={"WWW-Authenticate": "Bearer"},
         )
     return current_user
+
+
+def get_current_active_user_from_header_or_query(
+    header_token: Optional[str] = Depends(oauth2_scheme_optional),
+    token: Optional[str] = Query(None, description="JWT токен (если нельзя передать заголовок Authorization)"),
+    db: Session = Depends(get_db),
+):
+    """Получение активного пользователя по токену из заголовка или ?token=..."""
+    raw_token = header_token or token
+    if not raw_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return get_current_active_user(get_current_user(raw_token, db))
@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.services.app_metrics import InstrumentedQueuePool, register_pool
+from app.services.query_stats import instrument_engine
 import os
 
 # PostgreSQL connection
@@ -19,9 +21,13 @@ DATABASE_URL = os.getenv(
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,  # Проверка соединения перед использованием
+    poolclass=InstrumentedQueuePool,  # ожидание соединения — в /metrics
     pool_size=10,
     max_overflow=20
 )
+# Счётчик запросов и времени в БД на HTTP-запрос (QueryStatsMiddleware)
+instrument_engine(engine)
+register_pool(engine.pool)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, Float, DateTime, ForeignKey, Text, Enum as SQLEnum, ARRAY
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, Float, Date, DateTime, ForeignKey, Text, Enum as SQLEnum, ARRAY, Index, text, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -94,28 +94,14 @@ class Onboarding(Base):
     height = Column(Float, nullable=True)
     age = Column(Integer, nullable=True)
     activity_level = Column(String, nullable=True)  # low, medium, high
+    goals = Column(ARRAY(String), nullable=False, server_default=text("'{}'"))
+    restrictions = Column(ARRAY(String), nullable=False, server_default=text("'{}'"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", back_populates="onboarding")
 
 
-class OnboardingGoal(Base):
-    __tablename__ = "onboarding_goals"
-
-    id = Column(String, primary_key=True, index=True)
-    onboarding_id = Column(String, ForeignKey("onboardings.id"), nullable=False)
-    goal = Column(String, nullable=False)
-
-
-class OnboardingRestriction(Base):
-    __tablename__ = "onboarding_restrictions"
-
-    id = Column(String, primary_key=True, index=True)
-    onboarding_id = Column(String, ForeignKey("onboardings.id"), nullable=False)
-    restriction = Column(String, nullable=False)
-
-
 class PendingRegistration(Base):
     __tablename__ = "pending_registrations"
 
@@ -165,12 +151,20 @@ class Workout(Base):
     recurrence_end_date = Column(DateTime(timezone=True), nullable=True)
     recurrence_occurrences = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # метка для /api/sync
 
     user = relationship("User", foreign_keys=[user_id])
     trainer = relationship("User", foreign_keys=[trainer_id])
     template = relationship("WorkoutTemplate", foreign_keys=[template_id])
 
+    __table_args__ = (
+        # Лента изменений /api/sync: тренировки клиента и тренировки, которые ведёт тренер
+        Index("ix_workouts_user_updated", "user_id", "updated_at"),
+        Index("ix_workouts_trainer_updated", "trainer_id", "updated_at"),
+        # Тренировки клиента по времени: сводка списка клиентов и статистика клиента
+        Index("ix_workouts_user_start", "user_id", "start"),
+    )
+
 
 # Training Program models
 class TrainingProgram(Base):
@@ -183,12 +177,16 @@ class TrainingProgram(Base):
     owner = Column(String(20), nullable=False, default="client")  # 'trainer', 'client'
     club_id = Column(String, ForeignKey("clubs.id"), nullable=True, index=True)  # null = personal, set = club-shared
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = relationship("User", foreign_keys=[user_id], back_populates="training_programs")
     club = relationship("Club", foreign_keys=[club_id])
     days = relationship("ProgramDay", back_populates="program", cascade="all, delete-orphan", lazy="select")
 
+    __table_args__ = (
+        Index("ix_training_programs_user_updated", "user_id", "updated_at"),
+    )
+
 
 class ProgramDay(Base):
     __tablename__ = "program_days"
@@ -256,10 +254,15 @@ class BodyMetric(Base):
     unit = Column(String, nullable=False)
     target = Column(Float, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = relationship("User")
     entries = relationship("BodyMetricEntry", back_populates="metric", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_body_metrics_user_updated", "user_id", "updated_at"),
+    )
+
 
 class BodyMetricEntry(Base):
     __tablename__ = "body_metric_entries"
@@ -272,6 +275,13 @@ class BodyMetricEntry(Base):
 
     metric = relationship("BodyMetric", back_populates="entries")
 
+    __table_args__ = (
+        # Записи метрики по убыванию даты и последнее значение (DISTINCT ON)
+        Index("ix_body_metric_entries_metric_recorded", "metric_id", recorded_at.desc()),
+        # Новые записи для /api/sync (записи не редактируются — достаточно created_at)
+        Index("ix_body_metric_entries_metric_created", "metric_id", "created_at"),
+    )
+
 
 class BodyMetricTargetHistory(Base):
     """История изменения целевого значения метрики тела."""
@@ -293,10 +303,15 @@ class ExerciseMetric(Base):
     label = Column(String, nullable=False)
     muscle_group = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = relationship("User")
     entries = relationship("ExerciseMetricEntry", back_populates="exercise_metric", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_exercise_metrics_user_updated", "user_id", "updated_at"),
+    )
+
 
 class ExerciseMetricEntry(Base):
     __tablename__ = "exercise_metric_entries"
@@ -311,6 +326,12 @@ class ExerciseMetricEntry(Base):
 
     exercise_metric = relationship("ExerciseMetric", back_populates="entries")
 
+    __table_args__ = (
+        # Записи метрики по убыванию даты и последнее значение (DISTINCT ON)
+        Index("ix_exercise_metric_entries_metric_date", "exercise_metric_id", date.desc()),
+        Index("ix_exercise_metric_entries_metric_created", "exercise_metric_id", "created_at"),
+    )
+
 
 # Nutrition models
 class NutritionEntry(Base):
@@ -325,10 +346,16 @@ class NutritionEntry(Base):
     carbs = Column(Float, nullable=True)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = relationship("User")
 
+    __table_args__ = (
+        # Дневник пользователя за период и сводки по дням/неделям
+        Index("ix_nutrition_entries_user_date", "user_id", "date"),
+        Index("ix_nutrition_entries_user_updated", "user_id", "updated_at"),
+    )
+
 
 # Finance models
 class PaymentType(str, enum.Enum):
@@ -357,6 +384,26 @@ class Payment(Base):
     trainer = relationship("User", foreign_keys=[trainer_id])
     client = relationship("User", foreign_keys=[client_id])
 
+    __table_args__ = (
+        # Активные пакеты клиента по дате — списание занятий (app.services.session_ledger)
+        Index(
+            "ix_payments_active_packages",
+            "client_id", "date",
+            postgresql_where=text("type = 'PACKAGE' AND remaining_sessions > 0"),
+        ),
+    )
+
+
+class TrainerMonthlyRevenue(Base):
+    """Выручка тренера за месяц (UTC) по типу платежа; поддерживается app.services.revenue_rollup."""
+    __tablename__ = "trainer_monthly_revenue"
+
+    trainer_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True)  # первое число месяца
+    type = Column(SQLEnum(PaymentType), primary_key=True)
+    revenue = Column(Float, nullable=False, default=0)
+    payments_count = Column(Integer, nullable=False, default=0)
+
 
 # Exercise Library models
 class Exercise(Base):
@@ -394,11 +441,16 @@ class TrainerNote(Base):
     title = Column(String, nullable=False)
     content = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     trainer = relationship("User", foreign_keys=[trainer_id])
     client = relationship("User", foreign_keys=[client_id])
 
+    __table_args__ = (
+        Index("ix_trainer_notes_trainer_updated", "trainer_id", "updated_at"),
+        Index("ix_trainer_notes_client_updated", "client_id", "updated_at"),
+    )
+
 
 # User Goals models
 class UserGoal(Base):
@@ -424,13 +476,60 @@ class ProgressPhoto(Base):
     id = Column(String, primary_key=True, index=True)
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
     date = Column(DateTime(timezone=True), nullable=False, index=True)
-    url = Column(String, nullable=False)
+    url = Column(String, nullable=False)  # ключ в хранилище (или URL у старых фото)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 содержимого, см. StoredBlob
+    thumbnail_url = Column(String, nullable=True)  # WebP-миниатюра для плиток
+    medium_url = Column(String, nullable=True)  # WebP среднего размера для просмотра
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="progress_photos")
 
 
+class StoredBlob(Base):
+    """Файл в хранилище, адресуемый SHA-256 содержимого; ref_count — число ссылающихся записей."""
+    __tablename__ = "stored_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    key = Column(String, nullable=False)  # ключ в хранилище (app.services.storage)
+    content_type = Column(String(50), nullable=False)
+    size = Column(Integer, nullable=False)
+    has_variants = Column(Boolean, nullable=False, default=False)  # есть WebP thumb/medium
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SyncTombstone(Base):
+    """Удалённая запись для ленты изменений /api/sync (app.services.sync_feed)."""
+    __tablename__ = "sync_tombstones"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String(40), nullable=False)  # имя сущности в ленте: workouts, programs, ...
+    entity_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=False)  # владелец записи
+    trainer_id = Column(String, nullable=True)  # тренер, который тоже видит запись (тренировки, заметки)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_sync_tombstones_user_deleted", "user_id", "deleted_at"),
+        Index("ix_sync_tombstones_trainer_deleted", "trainer_id", "deleted_at"),
+    )
+
+
+class AccountExport(Base):
+    """Фоновая выгрузка данных пользователя в ZIP (app.services.account_export)."""
+    __tablename__ = "account_exports"
+
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, ready, failed
+    key = Column(String, nullable=True)  # ключ архива в хранилище
+    size = Column(BigInteger, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
 # Workout Template models
 class WorkoutTemplate(Base):
     __tablename__ = "workout_templates"
@@ -503,11 +602,29 @@ class Notification(Base):
     content = Column(Text, nullable=True)
     link = Column(String, nullable=True)  # Ссылка на объект (например, /calendar?workout_id=...)
     is_read = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Ключ секционирования по месяцам — поэтому входит в первичный ключ
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
     user = relationship("User", foreign_keys=[user_id])
     sender = relationship("User", foreign_keys=[sender_id])
 
+    __table_args__ = (
+        # Частичный индекс только по непрочитанным: счётчик бейджа и only_unread=true
+        Index(
+            "ix_notifications_user_unread",
+            "user_id", "created_at",
+            postgresql_where=text("is_read = false"),
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+@event.listens_for(Notification.__table__, "after_create")
+def _create_notification_partitions(target, connection, **kw):
+    """Секционированная таблица без партиций не принимает вставки — создаём их сразу."""
+    from app.services.notification_retention import ensure_partitions
+    ensure_partitions(connection)
+
 
 class DashboardSettings(Base):
     __tablename__ = "dashboard_settings"
@@ -2,25 +2,31 @@
 Роутер администратора системы — управление клубами и назначение club_admin.
 Доступен только с секретным ключом ADMIN_SECRET из переменных окружения.
 """
-from fastapi import APIRouter, Depends, HTTPException, Query as QueryParam
+from fastapi import APIRouter, Depends, HTTPException, Query as QueryParam, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
+import hmac
 import uuid
 import os
 
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_password_hash
+from app.services import profiler
 
 router = APIRouter()
 
 ADMIN_SECRET = os.getenv("ADMIN_SECRET", "change-me-in-production")
 
 
+def is_admin_secret(value: str) -> bool:
+    return hmac.compare_digest(value.encode(), ADMIN_SECRET.encode())
+
+
 def require_admin(admin_secret: str = QueryParam(..., alias="secret")):
     """Проверка секретного ключа администратора через query-параметр ?secret=..."""
-    if admin_secret != ADMIN_SECRET:
+    if not is_admin_secret(admin_secret):
         raise HTTPException(status_code=403, detail="Недействительный ключ администратора")
 
 
@@ -277,3 +283,32 @@ def admin_delete_club(
     db.delete(club)
     db.commit()
     return {"deleted": club_id}
+
+
+# ─── Профилирование ──────────────────────────────────────────────────────────
+
+@router.get("/profile", summary="Сэмплирующий профиль воркера за N секунд")
+async def admin_profile_worker(
+    seconds: float = QueryParam(10, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    format: str = QueryParam("speedscope"),
+    _: None = Depends(require_admin),
+):
+    """
+    Профиль всего процесса, обслужившего запрос (при нескольких воркерах —
+    одного из них). Профиль одного запроса — заголовок X-Profile, см.
+    app/services/profiler.py.
+    """
+    if not profiler.PROFILING_ENABLED:
+        raise HTTPException(404, "Профилирование выключено (PROFILING_ENABLED=0)")
+    if format not in profiler.PROFILE_FORMATS:
+        raise HTTPException(400, f"Формат профиля: {', '.join(profiler.PROFILE_FORMATS)}")
+    try:
+        sampler = await profiler.profile_worker(seconds, name=f"worker pid {os.getpid()}")
+    except profiler.ProfilerBusy:
+        raise HTTPException(409, "Профилирование уже идёт")
+    body, content_type = sampler.render(format)
+    return Response(
+        content=body,
+        media_type=content_type,
+        headers={"X-Profile-Samples": str(sampler.samples)},
+    )
@@ -1,19 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
+from starlette.concurrency import run_in_threadpool
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user, get_password_hash
+from app.services import client_overview, onboarding_store, revenue_rollup
+from app.services.photo_storage import release_photo_blobs
+from app.services.storage import delete_objects, is_storage_key
 from typing import List, Optional
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[schemas.UserResponse])
+@router.get("/", response_model=List[schemas.ClientRosterEntry])
 async def get_clients(
     search: Optional[str] = Query(None, description="Поиск по имени"),
+    include_summary: bool = Query(False, description="Добавить сводку по каждому клиенту (посещаемость, ближайшая тренировка, пакет)"),
+    period: str = Query("7d", description="Период посещаемости в сводке (7d, 14d, 30d)"),
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -21,6 +27,9 @@ async def get_clients(
     if current_user.role != models.UserRole.TRAINER:
         raise HTTPException(status_code=403, detail="Только тренеры могут просматривать клиентов")
     
+    if include_summary:
+        return client_overview.roster_with_summary(db, current_user.id, search, period)
+    
     query = db.query(models.User).filter(
         models.User.trainer_id == current_user.id
     )
@@ -153,65 +162,10 @@ async def update_client(
         client.is_active = update_data["is_active"]
     
     # Обновляем данные онбординга, если они указаны
-    onboarding_fields = ["weight", "height", "age", "goals", "restrictions", "activity_level"]
-    has_onboarding_data = any(field in update_data for field in onboarding_fields)
+    has_onboarding_data = any(field in update_data for field in onboarding_store.ONBOARDING_FIELDS)
     
     if has_onboarding_data:
-        onboarding = db.query(models.Onboarding).filter(
-            models.Onboarding.user_id == client_id
-        ).first()
-        
-        if not onboarding:
-            # Создаем онбординг, если его нет
-            onboarding_id = str(uuid.uuid4())
-            onboarding = models.Onboarding(
-                id=onboarding_id,
-                user_id=client_id,
-                weight=update_data.get("weight"),
-                height=update_data.get("height"),
-                age=update_data.get("age"),
-                activity_level=update_data.get("activity_level")
-            )
-            db.add(onboarding)
-            db.flush()
-        else:
-            # Обновляем существующий онбординг
-            if "weight" in update_data:
-                onboarding.weight = update_data["weight"]
-            if "height" in update_data:
-                onboarding.height = update_data["height"]
-            if "age" in update_data:
-                onboarding.age = update_data["age"]
-            if "activity_level" in update_data:
-                onboarding.activity_level = update_data["activity_level"]
-            
-            # Удаляем старые цели и ограничения
-            db.query(models.OnboardingGoal).filter(
-                models.OnboardingGoal.onboarding_id == onboarding.id
-            ).delete()
-            db.query(models.OnboardingRestriction).filter(
-                models.OnboardingRestriction.onboarding_id == onboarding.id
-            ).delete()
-        
-        # Добавляем новые цели
-        if "goals" in update_data and update_data["goals"]:
-            for goal in update_data["goals"]:
-                goal_obj = models.OnboardingGoal(
-                    id=str(uuid.uuid4()),
-                    onboarding_id=onboarding.id,
-                    goal=goal
-                )
-                db.add(goal_obj)
-        
-        # Добавляем новые ограничения
-        if "restrictions" in update_data and update_data["restrictions"]:
-            for restriction in update_data["restrictions"]:
-                restriction_obj = models.OnboardingRestriction(
-                    id=str(uuid.uuid4()),
-                    onboarding_id=onboarding.id,
-                    restriction=restriction
-                )
-                db.add(restriction_obj)
+        onboarding_store.save_onboarding(db, client_id, update_data)
     
     db.commit()
     db.refresh(client)
@@ -246,13 +200,8 @@ async def delete_client(
     # 2. Заметки тренера о клиенте
     db.query(models.TrainerNote).filter(models.TrainerNote.client_id == client_id).delete(synchronize_session=False)
 
-    # 3. Онбординг: сначала цели и ограничения, потом сам онбординг
-    onboarding = db.query(models.Onboarding).filter(models.Onboarding.user_id == client_id).first()
-    if onboarding:
-        db.query(models.OnboardingGoal).filter(models.OnboardingGoal.onboarding_id == onboarding.id).delete(synchronize_session=False)
-        db.query(models.OnboardingRestriction).filter(models.OnboardingRestriction.onboarding_id == onboarding.id).delete(synchronize_session=False)
-        db.delete(onboarding)
-        db.flush()
+    # 3. Онбординг (цели и ограничения хранятся в той же строке)
+    db.query(models.Onboarding).filter(models.Onboarding.user_id == client_id).delete(synchronize_session=False)
 
     # 4. Метрики тела (записи → метрики)
     body_metrics = db.query(models.BodyMetric).filter(models.BodyMetric.user_id == client_id).all()
@@ -274,10 +223,17 @@ async def delete_client(
     # 7. Цели клиента
     db.query(models.UserGoal).filter(models.UserGoal.user_id == client_id).delete(synchronize_session=False)
 
-    # 8. Фото прогресса
+    # 8. Фото прогресса (файлы, на которые больше никто не ссылается, удаляются после commit)
+    photo_hashes = [
+        content_hash for url, content_hash in db.query(models.ProgressPhoto.url, models.ProgressPhoto.content_hash)
+        .filter(models.ProgressPhoto.user_id == client_id)
+        if is_storage_key(url)
+    ]
+    orphaned_objects = release_photo_blobs(db, photo_hashes)
     db.query(models.ProgressPhoto).filter(models.ProgressPhoto.user_id == client_id).delete(synchronize_session=False)
 
-    # 9. Платежи (клиент как получатель)
+    # 9. Платежи (клиент как получатель) — сначала вычитаем их из помесячной выручки
+    revenue_rollup.remove_payments(db, models.Payment.client_id == client_id)
     db.query(models.Payment).filter(models.Payment.client_id == client_id).delete(synchronize_session=False)
 
     # 10. Уведомления
@@ -288,6 +244,7 @@ async def delete_client(
     # 11. Наконец, удаляем самого пользователя
     db.delete(client)
     db.commit()
+    await run_in_threadpool(delete_objects, orphaned_objects)
 
 
 @router.get("/{client_id}/onboarding", response_model=schemas.OnboardingResponse)
@@ -310,35 +267,13 @@ async def get_client_onboarding(
     if not client:
         raise HTTPException(status_code=404, detail="Клиент не найден")
     
-    onboarding = db.query(models.Onboarding).filter(
-        models.Onboarding.user_id == client_id
-    ).first()
-    
+    onboarding = onboarding_store.get_onboarding(db, client_id)
     if not onboarding:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Онбординг не найден"
         )
-    
-    # Получаем цели и ограничения
-    goals = [g.goal for g in db.query(models.OnboardingGoal).filter(
-        models.OnboardingGoal.onboarding_id == onboarding.id
-    ).all()]
-    restrictions = [r.restriction for r in db.query(models.OnboardingRestriction).filter(
-        models.OnboardingRestriction.onboarding_id == onboarding.id
-    ).all()]
-    
-    return schemas.OnboardingResponse(
-        id=onboarding.id,
-        user_id=onboarding.user_id,
-        weight=onboarding.weight,
-        height=onboarding.height,
-        age=onboarding.age,
-        goals=goals,
-        restrictions=restrictions,
-        activity_level=onboarding.activity_level,
-        created_at=onboarding.created_at
-    )
+    return onboarding
 
 
 @router.get("/{client_id}/stats", response_model=schemas.DashboardStats)
@@ -362,90 +297,46 @@ async def get_client_stats(
     if not client:
         raise HTTPException(status_code=404, detail="Клиент не найден")
     
-    # Определяем дату начала периода
-    today = datetime.now()
-    if period == "7d":
-        start_date = today - timedelta(days=7)
-    elif period == "14d":
-        start_date = today - timedelta(days=14)
-    elif period == "30d":
-        start_date = today - timedelta(days=30)
-    else:
-        start_date = today - timedelta(days=7)
-    
-    # Статистика тренировок за период
-    period_workouts_query = db.query(models.Workout).filter(
-        and_(
-            models.Workout.user_id == client_id,
-            models.Workout.start >= start_date,
-            models.Workout.start <= today
-        )
+    return client_overview.client_stats(db, client_id, period)
+
+
+@router.get(
+    "/{client_id}/overview",
+    response_model=schemas.ClientOverview,
+    summary="Карточка клиента",
+    description=(
+        "Профиль, статистика, онбординг, метрики тела, программы, заметки и тренировки клиента "
+        "одним запросом. include — разделы через запятую (по умолчанию все): "
+        + ", ".join(client_overview.OVERVIEW_SECTIONS) + "."
     )
-    
-    total_workouts = period_workouts_query.count()
-    completed_workouts = period_workouts_query.filter(
-        models.Workout.attendance == models.AttendanceStatus.COMPLETED
-    ).count()
-    
-    attendance_rate = (completed_workouts / total_workouts * 100) if total_workouts > 0 else 0
-    
-    # Тренировки на сегодня
-    today_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
-    today_workouts = db.query(models.Workout).filter(
-        and_(
-            models.Workout.user_id == client_id,
-            models.Workout.start >= today_start,
-            models.Workout.start <= today_end
-        )
-    ).count()
-    
-    # Ближайшая тренировка
-    next_workout = db.query(models.Workout).filter(
-        and_(
-            models.Workout.user_id == client_id,
-            models.Workout.start >= today
-        )
-    ).order_by(models.Workout.start.asc()).first()
-    
-    # Последняя тренировка (самая недавняя прошедшая)
-    last_workout = db.query(models.Workout).filter(
+)
+async def get_client_overview(
+    client_id: str,
+    include: Optional[str] = Query(None, description="Разделы через запятую"),
+    period: str = Query("7d", description="Период статистики (7d, 14d, 30d)"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода тренировок"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода тренировок"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить карточку клиента (только для тренеров)"""
+    if current_user.role != models.UserRole.TRAINER:
+        raise HTTPException(status_code=403, detail="Только тренеры могут просматривать клиентов")
+    try:
+        sections = client_overview.parse_sections(include)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    client = db.query(models.User).filter(
         and_(
-            models.Workout.user_id == client_id,
-            models.Workout.start < today
-        )
-    ).order_by(models.Workout.start.desc()).first()
-    
-    # Цель (берем первую активную)
-    user_goal = db.query(models.UserGoal).filter(
-        models.UserGoal.user_id == client_id
-    ).order_by(models.UserGoal.created_at.desc()).first()
-    
-    goal_response = None
-    if user_goal:
-        days_left = (user_goal.target_date.date() - today.date()).days
-        goal_response = schemas.GoalResponse(
-            headline=user_goal.headline,
-            description=user_goal.description,
-            milestone=user_goal.milestone,
-            days_left=days_left if days_left > 0 else 0,
-            progress=user_goal.progress
+            models.User.id == client_id,
+            models.User.trainer_id == current_user.id
         )
-    
-    # Фото прогресса (последние 4)
-    photos = db.query(models.ProgressPhoto).filter(
-        models.ProgressPhoto.user_id == client_id
-    ).order_by(models.ProgressPhoto.date.desc()).limit(4).all()
-    
-    return schemas.DashboardStats(
-        total_workouts=total_workouts,
-        completed_workouts=completed_workouts,
-        attendance_rate=round(attendance_rate, 2),
-        today_workouts=today_workouts,
-        next_workout=next_workout,
-        last_workout=last_workout,
-        goal=goal_response,
-        progress_photos=photos
-    )
+    ).first()
+    if not client:
+        raise HTTPException(status_code=404, detail="Клиент не найден")
 
+    return client_overview.build_overview(
+        db, current_user, client, sections,
+        period=period, start_date=start_date, end_date=end_date,
+    )
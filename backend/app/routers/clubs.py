@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy import and_, func as sqlfunc
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user
 from app.services.subscription_service import set_club_pro_status, revoke_club_pro_status
+from app.services.streaming_export import CHUNK_ROWS, EXPORT_FORMATS, export_response
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel as PydanticBase
@@ -315,6 +316,56 @@ async def get_trainer_payments(
     return query.order_by(models.Payment.date.desc()).all()
 
 
+@router.get("/payments/export", summary="Выгрузка платежей клуба в CSV/XLSX")
+async def export_club_payments(
+    format: str = Query("csv", description="csv или xlsx"),
+    trainer_id: Optional[str] = Query(None, description="Только платежи этого тренера"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Платежи всех тренеров клуба одной потоковой выгрузкой (для бухгалтерии)."""
+    club = get_admin_club(current_user, db)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format должен быть csv или xlsx")
+
+    trainer = aliased(models.User)
+    client = aliased(models.User)
+    query = (
+        db.query(
+            models.Payment.id,
+            models.Payment.date,
+            models.Payment.trainer_id,
+            trainer.full_name,
+            models.Payment.client_id,
+            client.full_name,
+            models.Payment.type,
+            models.Payment.amount,
+            models.Payment.package_size,
+            models.Payment.subscription_days,
+            models.Payment.notes,
+        )
+        .join(models.ClubTrainer, models.ClubTrainer.trainer_id == models.Payment.trainer_id)
+        .join(trainer, trainer.id == models.Payment.trainer_id)
+        .join(client, client.id == models.Payment.client_id)
+        .filter(models.ClubTrainer.club_id == club.id)
+    )
+    if trainer_id:
+        query = query.filter(models.Payment.trainer_id == trainer_id)
+    if start_date:
+        query = query.filter(models.Payment.date >= start_date)
+    if end_date:
+        query = query.filter(models.Payment.date <= end_date)
+
+    header = [
+        "id", "date", "trainer_id", "trainer_name", "client_id", "client_name",
+        "type", "amount", "package_size", "subscription_days", "notes",
+    ]
+    rows = query.order_by(models.Payment.date).yield_per(CHUNK_ROWS)
+    return export_response(format, "club-payments", header, rows)
+
+
 # ─── Calendar ─────────────────────────────────────────────────────────────────
 
 @router.get("/calendar", response_model=List[schemas.WorkoutResponse],
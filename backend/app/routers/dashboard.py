@@ -149,7 +149,9 @@ async def get_dashboard_stats(
             schemas.ProgressPhotoResponse(
                 id=photo.id,
                 date=photo.date,
-                url=photo.url
+                url=photo.url,
+                thumbnail_url=photo.thumbnail_url,
+                medium_url=photo.medium_url
             ) for photo in progress_photos
         ]
     }
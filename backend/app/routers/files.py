@@ -0,0 +1,141 @@
+"""
+Авторизованная раздача загруженных файлов.
+
+Доступ подтверждается одним из способов:
+- подписанная ссылка ?exp=&sig= (её выдают ответы API, см. url_signing) —
+  проверяется только HMAC, без JWT и БД; фото кэшируются публично до exp,
+  остальные ключи (выгрузки аккаунта exports/...) — private, no-store;
+- токен (заголовок или ?token=) + один лёгкий запрос: владелец фото или его тренер.
+
+Сама передача уходит из Python:
+- за nginx (X_ACCEL_REDIRECT_PREFIX задан) — заголовок X-Accel-Redirect,
+  файл отдаёт internal-location nginx;
+- без прокси — FileResponse, с zero-copy sendfile, если ASGI-сервер
+  поддерживает расширение http.response.zerocopy;
+- S3 — редирект на короткоживущую presigned-ссылку.
+"""
+import os
+import stat
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from sqlalchemy.orm import Session
+from starlette.types import Receive, Scope, Send
+
+from app.auth import get_current_active_user_from_header_or_query, oauth2_scheme_optional
+from app.database import get_db
+from app.services import url_signing
+from app.services.photo_storage import BLOB_KEY_RE, KEY_PREFIX as PHOTO_KEY_PREFIX, can_access_photo_object
+from app.services.storage import LocalStorage, get_storage
+
+router = APIRouter()
+
+# Например "/protected-uploads/" — internal location с alias на STORAGE_LOCAL_ROOT
+X_ACCEL_REDIRECT_PREFIX = os.getenv("X_ACCEL_REDIRECT_PREFIX", "")
+
+CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "heic": "image/heic",
+    "zip": "application/zip",
+}
+
+# Содержимое по ключу, отличному от хеша (старые фото), может смениться — кэшируем не дольше суток
+MUTABLE_MAX_AGE = 86400
+
+
+class SendfileResponse(FileResponse):
+    """FileResponse, использующий zero-copy отдачу, если сервер её поддерживает."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if "http.response.zerocopy" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+        with open(self.path, "rb") as file:
+            if self.stat_result is None:
+                self.set_stat_headers(os.fstat(file.fileno()))
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"].upper() == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            else:
+                await send({"type": "http.response.zerocopy", "file": file.fileno(), "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def _cache_headers(key: str, signed_exp: Optional[int]) -> dict:
+    """
+    Подписанный URL можно хранить в общих кэшах до exp; ответ по токену
+    зависит от пользователя — только кэш браузера. Прочие ключи (выгрузка
+    всех данных аккаунта) не кэшируются: после замены выгрузки или удаления
+    аккаунта копия не должна остаться ни в CDN, ни в браузере.
+    """
+    if not key.startswith(f"{PHOTO_KEY_PREFIX}/"):
+        return {"Cache-Control": "private, no-store"}
+    match = BLOB_KEY_RE.match(key)
+    if signed_exp is not None:
+        scope, max_age = "public", max(0, signed_exp - int(time.time()))
+    else:
+        scope, max_age = "private", 31536000
+    if match is None:
+        return {"Cache-Control": f"{scope}, max-age={min(max_age, MUTABLE_MAX_AGE)}"}
+    # Имя = хеш содержимого: сильный ETag без чтения файла
+    return {"Cache-Control": f"{scope}, max-age={max_age}, immutable", "ETag": f'"{match.group("hash")}"'}
+
+
+def _not_found() -> HTTPException:
+    return HTTPException(status_code=404, detail="File not found")
+
+
+@router.get("/{key:path}")
+async def get_file(
+    key: str,
+    request: Request,
+    exp: Optional[int] = Query(None, description="Срок действия подписанной ссылки (unix-время)"),
+    sig: Optional[str] = Query(None, description="Подпись ссылки"),
+    header_token: Optional[str] = Depends(oauth2_scheme_optional),
+    token: Optional[str] = Query(None, description="JWT токен (если нельзя передать заголовок Authorization)"),
+    db: Session = Depends(get_db),
+):
+    """Отдать файл хранилища по подписанной ссылке или пользователю, имеющему к нему доступ"""
+    if exp is not None and sig is not None:
+        if not url_signing.verify(key, exp, sig):
+            raise HTTPException(status_code=403, detail="Link is invalid or expired")
+        signed_exp = exp
+    else:
+        current_user = get_current_active_user_from_header_or_query(header_token, token, db)
+        # Нет доступа и нет файла неразличимы — не раскрываем существование чужих фото
+        if not can_access_photo_object(db, current_user, key):
+            raise _not_found()
+        signed_exp = None
+    db.close()
+
+    headers = _cache_headers(key, signed_exp)
+    etag: Optional[str] = headers.get("ETag")
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        url = storage.direct_url(key)
+        if url is None:
+            raise _not_found()
+        return RedirectResponse(url, status_code=307)
+
+    try:
+        path = storage.path(key)
+        stat_result = os.stat(path)
+    except (ValueError, OSError):
+        raise _not_found()
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise _not_found()
+
+    media_type = CONTENT_TYPES.get(key.rsplit(".", 1)[-1], "application/octet-stream")
+    if X_ACCEL_REDIRECT_PREFIX:
+        headers["X-Accel-Redirect"] = X_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + key
+        return Response(media_type=media_type, headers=headers)
+    return SendfileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
@@ -4,8 +4,10 @@ from sqlalchemy import and_, func
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user
+from app.services import revenue_rollup
+from app.services.streaming_export import CHUNK_ROWS, EXPORT_FORMATS, export_response
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 import uuid
 
 router = APIRouter()
@@ -57,6 +59,7 @@ async def create_payment(
         notes=payment.notes
     )
     db.add(db_payment)
+    revenue_rollup.add_payment(db, db_payment)
     
     # Обновляем данные клиента
     if payment.type == models.PaymentType.PACKAGE and payment.package_size:
@@ -112,6 +115,59 @@ async def get_payments(
     return payments
 
 
+PAYMENT_EXPORT_HEADER = [
+    "id", "date", "client_id", "client_name", "type", "amount", "package_size",
+    "remaining_sessions", "subscription_days", "next_payment_date", "notes",
+]
+
+
+@router.get(
+    "/export",
+    summary="Выгрузка платежей в CSV/XLSX",
+    description="Потоковая выгрузка платежей тренера (серверный курсор, память не зависит от объёма)."
+)
+async def export_payments(
+    format: str = Query("csv", description="csv или xlsx"),
+    client_id: Optional[str] = Query(None, description="ID клиента"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Выгрузить платежи (только для тренеров)"""
+    if current_user.role != models.UserRole.TRAINER:
+        raise HTTPException(status_code=403, detail="Только тренеры могут просматривать платежи")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format должен быть csv или xlsx")
+
+    query = db.query(
+        models.Payment.id,
+        models.Payment.date,
+        models.Payment.client_id,
+        models.User.full_name,
+        models.Payment.type,
+        models.Payment.amount,
+        models.Payment.package_size,
+        models.Payment.remaining_sessions,
+        models.Payment.subscription_days,
+        models.Payment.next_payment_date,
+        models.Payment.notes,
+    ).join(
+        models.User, models.User.id == models.Payment.client_id
+    ).filter(
+        models.Payment.trainer_id == current_user.id
+    )
+    if client_id:
+        query = query.filter(models.Payment.client_id == client_id)
+    if start_date:
+        query = query.filter(models.Payment.date >= start_date)
+    if end_date:
+        query = query.filter(models.Payment.date <= end_date)
+
+    rows = query.order_by(models.Payment.date).yield_per(CHUNK_ROWS)
+    return export_response(format, "payments", PAYMENT_EXPORT_HEADER, rows)
+
+
 @router.get("/stats")
 async def get_finance_stats(
     current_user: models.User = Depends(get_current_active_user),
@@ -121,24 +177,15 @@ async def get_finance_stats(
     if current_user.role != models.UserRole.TRAINER:
         raise HTTPException(status_code=403, detail="Только тренеры могут просматривать статистику")
     
-    # Месячная выручка
-    current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_revenue = db.query(func.sum(models.Payment.amount)).filter(
-        and_(
-            models.Payment.trainer_id == current_user.id,
-            models.Payment.date >= current_month_start
-        )
-    ).scalar() or 0
-    
-    # Общая выручка
-    total_revenue = db.query(func.sum(models.Payment.amount)).filter(
+    # Месячная и общая выручка, число платежей — один проход по платежам тренера
+    current_month_start = datetime.now().astimezone().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    total_revenue, monthly_revenue, payment_count = db.query(
+        func.coalesce(func.sum(models.Payment.amount), 0),
+        func.coalesce(func.sum(models.Payment.amount).filter(models.Payment.date >= current_month_start), 0),
+        func.count(models.Payment.id),
+    ).filter(
         models.Payment.trainer_id == current_user.id
-    ).scalar() or 0
-    
-    # Средний чек
-    payment_count = db.query(func.count(models.Payment.id)).filter(
-        models.Payment.trainer_id == current_user.id
-    ).scalar() or 0
+    ).one()
     average_check = total_revenue / payment_count if payment_count > 0 else 0
     
     return {
@@ -149,6 +196,53 @@ async def get_finance_stats(
     }
 
 
+@router.get(
+    "/revenue/series",
+    response_model=List[schemas.RevenueSeriesPoint],
+    summary="Выручка по месяцам",
+    description="""
+    Выручка и число платежей за последние `months` месяцев (включая текущий),
+    с разбивкой по типу платежа. Месяцы без платежей возвращаются с нулями.
+    Читает помесячную свёртку trainer_monthly_revenue, а не сами платежи.
+    """
+)
+async def get_revenue_series(
+    months: int = Query(12, ge=1, le=120, description="Число месяцев"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить выручку по месяцам (только для тренеров)"""
+    if current_user.role != models.UserRole.TRAINER:
+        raise HTTPException(status_code=403, detail="Только тренеры могут просматривать статистику")
+
+    current = revenue_rollup.month_of(datetime.now(timezone.utc))
+    month_starts = []
+    year, month = current.year, current.month
+    for _ in range(months):
+        month_starts.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    month_starts.reverse()
+
+    series = {
+        month_start: {"month": month_start, "revenue": 0.0, "payments_count": 0, "by_type": {}}
+        for month_start in month_starts
+    }
+    rows = db.query(models.TrainerMonthlyRevenue).filter(
+        and_(
+            models.TrainerMonthlyRevenue.trainer_id == current_user.id,
+            models.TrainerMonthlyRevenue.month >= month_starts[0]
+        )
+    ).all()
+    for row in rows:
+        point = series.get(row.month)
+        if point is None or row.payments_count <= 0:
+            continue
+        point["revenue"] += row.revenue
+        point["payments_count"] += row.payments_count
+        point["by_type"][row.type] = row.revenue
+    return list(series.values())
+
+
 @router.delete("/{payment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_payment(
     payment_id: str,
@@ -169,6 +263,7 @@ async def delete_payment(
     if not payment:
         raise HTTPException(status_code=404, detail="Платеж не найден")
     
+    revenue_rollup.remove_payment(db, payment)
     db.delete(payment)
     db.commit()
     return None
@@ -1,15 +1,59 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, func, insert, or_
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user
+from app.services.metric_series import CALENDAR_RESOLUTIONS, DEFAULT_MAX_POINTS, bucket_series, lttb_series
+from app.services.exercise_analytics import get_users_analytics
+from app.services.streaming_export import CHUNK_ROWS, EXPORT_FORMATS, export_response
 from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
 
 router = APIRouter()
 
+SERIES_METHODS = ("bucket", "lttb")
+SERIES_RESOLUTIONS = ("auto",) + CALENDAR_RESOLUTIONS
+# Значение записи упражнения, по которому строится ряд
+EXERCISE_SERIES_FIELDS = {
+    "weight": models.ExerciseMetricEntry.weight,
+    "repetitions": models.ExerciseMetricEntry.repetitions,
+    "volume": models.ExerciseMetricEntry.weight
+    * func.coalesce(models.ExerciseMetricEntry.repetitions, 1)
+    * func.coalesce(models.ExerciseMetricEntry.sets, 1),
+}
+
+
+def _resolve_target_user_id(user_id: Optional[str], current_user: models.User, db: Session) -> str:
+    """Пользователь, чьи метрики запрошены: сам пользователь или клиент тренера."""
+    if user_id and current_user.role == models.UserRole.TRAINER:
+        client = db.query(models.User.id).filter(
+            and_(
+                models.User.id == user_id,
+                models.User.trainer_id == current_user.id
+            )
+        ).first()
+        if not client:
+            raise HTTPException(status_code=404, detail="Клиент не найден")
+        return user_id
+    if user_id:
+        raise HTTPException(status_code=403, detail="Только тренеры могут просматривать метрики других пользователей")
+    return current_user.id
+
+
+def _build_series(db: Session, metric_id: str, time_col, value_col, filters: list,
+                  method: str, resolution: str, max_points: int) -> dict:
+    if method == "lttb":
+        series = lttb_series(db, time_col, value_col, filters, max_points)
+    else:
+        series = bucket_series(
+            db, time_col, value_col, filters,
+            resolution=None if resolution == "auto" else resolution,
+            max_points=max_points,
+        )
+    return {"metric_id": metric_id, **series}
+
 
 # Body Metrics
 @router.post(
@@ -64,6 +108,67 @@ async def create_body_metric(
     return db_metric
 
 
+@router.get(
+    "/export",
+    summary="Выгрузка записей метрик в CSV/XLSX",
+    description="""
+    Потоковая выгрузка всех записей метрик тела (`kind=body`) или упражнений (`kind=exercise`)
+    пользователя или клиента тренера.
+    """
+)
+async def export_metric_entries(
+    kind: str = Query("body", description="body или exercise"),
+    format: str = Query("csv", description="csv или xlsx"),
+    user_id: Optional[str] = Query(None, description="ID пользователя (только для тренеров)"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Выгрузить записи метрик"""
+    if kind not in ("body", "exercise"):
+        raise HTTPException(status_code=400, detail="kind должен быть body или exercise")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format должен быть csv или xlsx")
+    target_user_id = _resolve_target_user_id(user_id, current_user, db)
+
+    if kind == "body":
+        header = ["metric_id", "label", "unit", "recorded_at", "value"]
+        time_col = models.BodyMetricEntry.recorded_at
+        query = db.query(
+            models.BodyMetric.id,
+            models.BodyMetric.label,
+            models.BodyMetric.unit,
+            time_col,
+            models.BodyMetricEntry.value,
+        ).join(
+            models.BodyMetricEntry, models.BodyMetricEntry.metric_id == models.BodyMetric.id
+        ).filter(models.BodyMetric.user_id == target_user_id)
+        order = (models.BodyMetric.label, models.BodyMetric.id, time_col)
+    else:
+        header = ["exercise_metric_id", "label", "muscle_group", "date", "weight", "repetitions", "sets"]
+        time_col = models.ExerciseMetricEntry.date
+        query = db.query(
+            models.ExerciseMetric.id,
+            models.ExerciseMetric.label,
+            models.ExerciseMetric.muscle_group,
+            time_col,
+            models.ExerciseMetricEntry.weight,
+            models.ExerciseMetricEntry.repetitions,
+            models.ExerciseMetricEntry.sets,
+        ).join(
+            models.ExerciseMetricEntry, models.ExerciseMetricEntry.exercise_metric_id == models.ExerciseMetric.id
+        ).filter(models.ExerciseMetric.user_id == target_user_id)
+        order = (models.ExerciseMetric.label, models.ExerciseMetric.id, time_col)
+
+    if start_date:
+        query = query.filter(time_col >= start_date)
+    if end_date:
+        query = query.filter(time_col <= end_date)
+    rows = query.order_by(*order).yield_per(CHUNK_ROWS)
+    return export_response(format, f"{kind}-metrics", header, rows)
+
+
 @router.get("/body", response_model=List[schemas.BodyMetricResponse])
 async def get_body_metrics(
     user_id: Optional[str] = Query(None, description="ID пользователя (только для тренеров)"),
@@ -232,6 +337,7 @@ async def get_body_metric_entries(
     user_id: Optional[str] = Query(None, description="ID пользователя (только для тренеров)"),
     start_date: Optional[datetime] = Query(None, description="Начало периода"),
     end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    latest: bool = Query(False, description="Только последняя запись по каждой метрике"),
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -252,18 +358,11 @@ async def get_body_metric_entries(
     elif user_id and current_user.role != models.UserRole.TRAINER:
         raise HTTPException(status_code=403, detail="Только тренеры могут просматривать метрики других пользователей")
     
-    # Получаем все метрики пользователя
-    metrics = db.query(models.BodyMetric).filter(
-        models.BodyMetric.user_id == target_user_id
-    ).all()
-    metric_ids = [m.id for m in metrics]
-    
-    if not metric_ids:
-        return []
-    
-    query = db.query(models.BodyMetricEntry).filter(
-        models.BodyMetricEntry.metric_id.in_(metric_ids)
-    )
+    # Один запрос: записи метрик пользователя через JOIN,
+    # индекс (metric_id, recorded_at DESC)
+    query = db.query(models.BodyMetricEntry).join(
+        models.BodyMetric, models.BodyMetric.id == models.BodyMetricEntry.metric_id
+    ).filter(models.BodyMetric.user_id == target_user_id)
     
     if metric_id:
         query = query.filter(models.BodyMetricEntry.metric_id == metric_id)
@@ -272,10 +371,130 @@ async def get_body_metric_entries(
     if end_date:
         query = query.filter(models.BodyMetricEntry.recorded_at <= end_date)
     
+    if latest:
+        # DISTINCT ON (metric_id): последняя запись каждой метрики для экрана обзора
+        return query.distinct(models.BodyMetricEntry.metric_id).order_by(
+            models.BodyMetricEntry.metric_id, models.BodyMetricEntry.recorded_at.desc()
+        ).all()
+    
     entries = query.order_by(models.BodyMetricEntry.recorded_at.desc()).all()
     return entries
 
 
+def _accessible_metric_ids(db: Session, metric_model, metric_ids: set, current_user: models.User) -> set:
+    """Из metric_ids — метрики пользователя и (для тренера) его клиентов. Один запрос на все id."""
+    if not metric_ids:
+        return set()
+    owner_filter = metric_model.user_id == current_user.id
+    if current_user.role == models.UserRole.TRAINER:
+        owner_filter = or_(owner_filter, models.User.trainer_id == current_user.id)
+    rows = db.query(metric_model.id).join(
+        models.User, models.User.id == metric_model.user_id
+    ).filter(metric_model.id.in_(metric_ids), owner_filter).all()
+    return {row.id for row in rows}
+
+
+@router.post(
+    "/entries/batch",
+    response_model=schemas.MetricEntriesBatchResult,
+    status_code=status.HTTP_201_CREATED,
+    summary="Пакетное добавление записей метрик",
+    description="""
+    Добавление до 1000 записей метрик тела и до 1000 записей метрик упражнений за один запрос
+    (синхронизация с трекерами, импорт). Записи могут относиться к разным метрикам
+    и, для тренера, к разным клиентам.
+
+    Доступ проверяется один раз для каждой метрики; если хотя бы одна метрика недоступна,
+    ничего не сохраняется. Записи вставляются одним INSERT на тип.
+    """
+)
+async def create_metric_entries_batch(
+    batch: schemas.MetricEntriesBatchCreate,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Пакетно добавить записи метрик"""
+    body_metric_ids = {e.metric_id for e in batch.body_entries}
+    exercise_metric_ids = {e.exercise_metric_id for e in batch.exercise_entries}
+    missing = (body_metric_ids - _accessible_metric_ids(db, models.BodyMetric, body_metric_ids, current_user)) | (
+        exercise_metric_ids - _accessible_metric_ids(db, models.ExerciseMetric, exercise_metric_ids, current_user)
+    )
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Метрики не найдены: {', '.join(sorted(missing))}")
+
+    body_rows = [
+        {"id": str(uuid.uuid4()), "metric_id": e.metric_id, "value": e.value, "recorded_at": e.recorded_at}
+        for e in batch.body_entries
+    ]
+    exercise_rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "exercise_metric_id": e.exercise_metric_id,
+            "date": e.date,
+            "weight": e.weight,
+            "repetitions": e.repetitions,
+            "sets": e.sets,
+        }
+        for e in batch.exercise_entries
+    ]
+    if body_rows:
+        db.execute(insert(models.BodyMetricEntry).values(body_rows))
+    if exercise_rows:
+        db.execute(insert(models.ExerciseMetricEntry).values(exercise_rows))
+    db.commit()
+    return {
+        "body_entry_ids": [row["id"] for row in body_rows],
+        "exercise_entry_ids": [row["id"] for row in exercise_rows],
+    }
+
+
+@router.get(
+    "/body/series",
+    response_model=schemas.MetricSeriesResponse,
+    summary="Прореженный ряд метрики тела для графика",
+    description="""
+    Ряд значений метрики тела, уменьшенный до размера графика.
+
+    **Параметры:**
+    - `method` - `bucket` (агрегаты min/max/avg/last по интервалам, считаются в БД) или `lttb` (выборка исходных точек, сохраняющая форму линии)
+    - `resolution` - для `bucket`: `day`, `week`, `month` или `auto` (равные интервалы под `max_points`)
+    - `max_points` - максимальное число точек (для `auto` и `lttb`)
+    """
+)
+async def get_body_metric_series(
+    metric_id: str = Query(..., description="ID метрики"),
+    user_id: Optional[str] = Query(None, description="ID пользователя (только для тренеров)"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    method: str = Query("bucket", description="bucket или lttb"),
+    resolution: str = Query("auto", description="auto, day, week или month"),
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=3, le=5000, description="Максимальное число точек"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить прореженный ряд метрики тела"""
+    if method not in SERIES_METHODS or resolution not in SERIES_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Некорректные параметры method/resolution")
+    target_user_id = _resolve_target_user_id(user_id, current_user, db)
+    metric = db.query(models.BodyMetric.id).filter(
+        and_(
+            models.BodyMetric.id == metric_id,
+            models.BodyMetric.user_id == target_user_id
+        )
+    ).first()
+    if not metric:
+        raise HTTPException(status_code=404, detail="Метрика не найдена")
+
+    time_col = models.BodyMetricEntry.recorded_at
+    filters = [models.BodyMetricEntry.metric_id == metric_id]
+    if start_date:
+        filters.append(time_col >= start_date)
+    if end_date:
+        filters.append(time_col <= end_date)
+    return _build_series(db, metric_id, time_col, models.BodyMetricEntry.value, filters,
+                         method, resolution, max_points)
+
+
 # Exercise Metrics
 @router.post(
     "/exercise",
@@ -410,6 +629,7 @@ async def get_exercise_metric_entries(
     user_id: Optional[str] = Query(None, description="ID пользователя (только для тренеров)"),
     start_date: Optional[datetime] = Query(None, description="Начало периода"),
     end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    latest: bool = Query(False, description="Только последняя запись по каждой метрике"),
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -430,18 +650,11 @@ async def get_exercise_metric_entries(
     elif user_id and current_user.role != models.UserRole.TRAINER:
         raise HTTPException(status_code=403, detail="Только тренеры могут просматривать метрики других пользователей")
     
-    # Получаем все метрики пользователя
-    metrics = db.query(models.ExerciseMetric).filter(
-        models.ExerciseMetric.user_id == target_user_id
-    ).all()
-    metric_ids = [m.id for m in metrics]
-    
-    if not metric_ids:
-        return []
-    
-    query = db.query(models.ExerciseMetricEntry).filter(
-        models.ExerciseMetricEntry.exercise_metric_id.in_(metric_ids)
-    )
+    # Один запрос: записи метрик пользователя через JOIN,
+    # индекс (exercise_metric_id, date DESC)
+    query = db.query(models.ExerciseMetricEntry).join(
+        models.ExerciseMetric, models.ExerciseMetric.id == models.ExerciseMetricEntry.exercise_metric_id
+    ).filter(models.ExerciseMetric.user_id == target_user_id)
     
     if exercise_metric_id:
         query = query.filter(models.ExerciseMetricEntry.exercise_metric_id == exercise_metric_id)
@@ -450,6 +663,102 @@ async def get_exercise_metric_entries(
     if end_date:
         query = query.filter(models.ExerciseMetricEntry.date <= end_date)
     
+    if latest:
+        # DISTINCT ON (exercise_metric_id): последняя запись каждой метрики для экрана обзора
+        return query.distinct(models.ExerciseMetricEntry.exercise_metric_id).order_by(
+            models.ExerciseMetricEntry.exercise_metric_id, models.ExerciseMetricEntry.date.desc()
+        ).all()
+    
     entries = query.order_by(models.ExerciseMetricEntry.date.desc()).all()
     return entries
 
+
+
+@router.get(
+    "/exercise/series",
+    response_model=schemas.MetricSeriesResponse,
+    summary="Прореженный ряд метрики упражнения для графика",
+    description="""
+    Ряд значений метрики упражнения, уменьшенный до размера графика.
+    Параметры `method`, `resolution`, `max_points` — как у `/metrics/body/series`.
+
+    - `field` - `weight` (вес), `repetitions` (повторения) или `volume` (вес × повторения × подходы)
+    """
+)
+async def get_exercise_metric_series(
+    exercise_metric_id: str = Query(..., description="ID метрики упражнения"),
+    user_id: Optional[str] = Query(None, description="ID пользователя (только для тренеров)"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    field: str = Query("weight", description="weight, repetitions или volume"),
+    method: str = Query("bucket", description="bucket или lttb"),
+    resolution: str = Query("auto", description="auto, day, week или month"),
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=3, le=5000, description="Максимальное число точек"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить прореженный ряд метрики упражнения"""
+    if method not in SERIES_METHODS or resolution not in SERIES_RESOLUTIONS or field not in EXERCISE_SERIES_FIELDS:
+        raise HTTPException(status_code=400, detail="Некорректные параметры field/method/resolution")
+    target_user_id = _resolve_target_user_id(user_id, current_user, db)
+    metric = db.query(models.ExerciseMetric.id).filter(
+        and_(
+            models.ExerciseMetric.id == exercise_metric_id,
+            models.ExerciseMetric.user_id == target_user_id
+        )
+    ).first()
+    if not metric:
+        raise HTTPException(status_code=404, detail="Метрика не найдена")
+
+    time_col = models.ExerciseMetricEntry.date
+    filters = [models.ExerciseMetricEntry.exercise_metric_id == exercise_metric_id]
+    if start_date:
+        filters.append(time_col >= start_date)
+    if end_date:
+        filters.append(time_col <= end_date)
+    return _build_series(db, exercise_metric_id, time_col, EXERCISE_SERIES_FIELDS[field], filters,
+                         method, resolution, max_points)
+
+
+@router.get(
+    "/exercise/analytics",
+    response_model=List[schemas.ExerciseAnalyticsResponse],
+    summary="Аналитика упражнений пользователя",
+    description="""
+    Расчётный 1ПМ (формула Эпли), тоннаж по тренировкам и неделям и личные рекорды
+    по каждой метрике упражнения пользователя (или клиента тренера).
+
+    Считается на сервере; результат кэшируется по метрике и пересчитывается только
+    при появлении новых записей.
+    """
+)
+async def get_exercise_analytics(
+    user_id: Optional[str] = Query(None, description="ID пользователя (только для тренеров)"),
+    exercise_metric_id: Optional[str] = Query(None, description="ID метрики упражнения"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить аналитику упражнений"""
+    target_user_id = _resolve_target_user_id(user_id, current_user, db)
+    return get_users_analytics(db, [target_user_id], detail=True, exercise_metric_id=exercise_metric_id)
+
+
+@router.get(
+    "/exercise/analytics/roster",
+    response_model=List[schemas.ExerciseAnalyticsSummary],
+    summary="Сводная аналитика упражнений по всем клиентам тренера",
+)
+async def get_roster_exercise_analytics(
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить сводку 1ПМ/тоннажа/рекордов по всем клиентам тренера"""
+    if current_user.role != models.UserRole.TRAINER:
+        raise HTTPException(status_code=403, detail="Только тренеры могут просматривать аналитику клиентов")
+    client_ids = [
+        row.id for row in db.query(models.User.id).filter(
+            models.User.trainer_id == current_user.id,
+            models.User.is_deleted.isnot(True),
+        )
+    ]
+    return get_users_analytics(db, client_ids, detail=False)
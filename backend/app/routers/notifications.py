@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import models, schemas
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user, get_current_active_user_from_header_or_query
+from app.services.notification_service import hub, publish, get_unread_count
 from typing import List, Optional
+from datetime import datetime
+import asyncio
+import json
 import uuid
 
 router = APIRouter()
 
+# Интервал keep-alive комментариев, чтобы прокси не закрывали простаивающий поток
+STREAM_KEEPALIVE_SECONDS = 15
+
 
 @router.get("/", response_model=List[schemas.NotificationResponse])
 async def get_notifications(
@@ -27,6 +35,115 @@ async def get_notifications(
     return notifications
 
 
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user_from_header_or_query),
+    db: Session = Depends(get_db)
+):
+    """
+    Поток новых уведомлений (Server-Sent Events).
+
+    Пока поток открыт, опрашивать GET /api/notifications/ не нужно: каждое новое
+    уведомление приходит событием `notification` с телом NotificationResponse.
+    Токен можно передать заголовком Authorization или параметром `?token=`.
+    """
+    user_id = current_user.id
+    # Соединение с БД больше не нужно — не держим его всё время жизни потока
+    db.close()
+
+    async def event_stream():
+        queue = hub.subscribe(user_id)
+        try:
+            yield f"retry: {STREAM_KEEPALIVE_SECONDS * 1000}\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                data = message.get("data") or {}
+                event_id = f"id: {data['id']}\n" if data.get("id") else ""
+                yield f"{event_id}event: {message.get('event', 'message')}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        finally:
+            hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # nginx не должен буферизовать поток
+        },
+    )
+
+
+@router.get("/unread-count", response_model=schemas.NotificationUnreadCount)
+async def get_unread_notifications_count(
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Количество непрочитанных уведомлений (для бейджа)"""
+    return {"unread_count": get_unread_count(db, current_user.id)}
+
+
+@router.put("/read-all", response_model=schemas.NotificationBulkResult)
+async def mark_all_notifications_as_read(
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Пометить все уведомления как прочитанные (один UPDATE)"""
+    affected = db.query(models.Notification).filter(
+        models.Notification.user_id == current_user.id,
+        models.Notification.is_read == False
+    ).update({models.Notification.is_read: True}, synchronize_session=False)
+    if affected:
+        publish(db, {"event": "notifications_read", "user_id": current_user.id, "data": {"ids": None}})
+    db.commit()
+    return {"affected": affected}
+
+
+@router.put("/read", response_model=schemas.NotificationBulkResult)
+async def mark_notifications_as_read(
+    payload: schemas.NotificationBulkReadRequest,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Пометить уведомления из списка как прочитанные (один UPDATE)"""
+    affected = db.query(models.Notification).filter(
+        models.Notification.user_id == current_user.id,
+        models.Notification.id.in_(payload.ids),
+        models.Notification.is_read == False
+    ).update({models.Notification.is_read: True}, synchronize_session=False)
+    if affected:
+        publish(db, {"event": "notifications_read", "user_id": current_user.id, "data": {"ids": payload.ids}})
+    db.commit()
+    return {"affected": affected}
+
+
+@router.delete("/", response_model=schemas.NotificationBulkResult)
+async def delete_old_notifications(
+    before: datetime = Query(..., description="Удалить уведомления, созданные раньше этой даты"),
+    only_read: bool = Query(False, description="Удалять только прочитанные"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Удалить уведомления старше указанной даты (один DELETE)"""
+    query = db.query(models.Notification).filter(
+        models.Notification.user_id == current_user.id,
+        models.Notification.created_at < before
+    )
+    if only_read:
+        query = query.filter(models.Notification.is_read == True)
+    affected = query.delete(synchronize_session=False)
+    if affected:
+        publish(db, {"event": "notifications_deleted", "user_id": current_user.id, "data": {"before": before.isoformat()}})
+    db.commit()
+    return {"affected": affected}
+
+
 @router.put("/{notification_id}/read", response_model=schemas.NotificationResponse)
 async def mark_notification_as_read(
     notification_id: str,
@@ -42,7 +159,9 @@ async def mark_notification_as_read(
     if not notification:
         raise HTTPException(status_code=404, detail="Уведомление не найдено")
     
-    notification.is_read = True
+    if not notification.is_read:
+        notification.is_read = True
+        publish(db, {"event": "notifications_read", "user_id": current_user.id, "data": {"ids": [notification.id]}})
     db.commit()
     db.refresh(notification)
     return notification
@@ -64,5 +183,6 @@ async def delete_notification(
         raise HTTPException(status_code=404, detail="Уведомление не найдено")
     
     db.delete(notification)
+    publish(db, {"event": "notifications_deleted", "user_id": current_user.id, "data": {"ids": [notification_id]}})
     db.commit()
     return None
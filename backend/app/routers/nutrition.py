@@ -1,15 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import and_, case, func
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user
+from app.services.nutrition_import import NutritionImportError, import_nutrition_csv
 from typing import List, Optional
 from datetime import datetime, date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import uuid
 
 router = APIRouter()
 
+SUMMARY_GRANULARITIES = ("day", "week")
+
+
+def _valid_timezone(name: Optional[str]) -> str:
+    """IANA-имя часового пояса или UTC, если поле пустое или некорректное."""
+    if not name:
+        return "UTC"
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return "UTC"
+    return name
+
+
+def _round_or_none(value) -> Optional[float]:
+    return round(float(value), 2) if value is not None else None
+
 
 @router.post("/", response_model=schemas.NutritionEntryResponse, status_code=status.HTTP_201_CREATED)
 async def create_nutrition_entry(
@@ -111,6 +131,137 @@ async def get_nutrition_entries(
     return entries
 
 
+@router.post(
+    "/import",
+    response_model=schemas.NutritionImportResult,
+    summary="Импорт дневника питания из CSV",
+    description="""
+    Загрузка CSV-выгрузки другого трекера. Обязательные колонки — дата и калории,
+    необязательные — белки, жиры, углеводы, заметки (английские или русские заголовки,
+    разделитель `,`, `;` или табуляция).
+
+    Строки одного дня суммируются в одну запись; если запись на этот день уже есть,
+    она заменяется. Ошибочные строки пропускаются и перечисляются в `errors`.
+    """
+)
+async def import_nutrition_entries(
+    file: UploadFile = File(...),
+    user_id: Optional[str] = Query(None, description="ID клиента (для тренеров)"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Импортировать записи питания из CSV"""
+    target_user = current_user
+    if user_id and current_user.role == models.UserRole.TRAINER:
+        target_user = db.query(models.User).filter(
+            and_(
+                models.User.id == user_id,
+                models.User.trainer_id == current_user.id
+            )
+        ).first()
+        if not target_user:
+            raise HTTPException(status_code=404, detail="Клиент не найден")
+    elif user_id and current_user.role != models.UserRole.TRAINER:
+        raise HTTPException(status_code=403, detail="Только тренеры могут добавлять записи для других пользователей")
+
+    try:
+        # Разбор и вставка синхронные — не занимаем event loop
+        report = await run_in_threadpool(
+            import_nutrition_csv, db, target_user.id, _valid_timezone(target_user.timezone), file.file
+        )
+    except NutritionImportError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    return report
+
+
+@router.get(
+    "/summary",
+    response_model=List[schemas.NutritionSummaryPeriod],
+    summary="Сводка питания по дням или неделям",
+    description="""
+    Суммы и средние калорий и БЖУ за каждый день или неделю, посчитанные в БД.
+    Границы периодов — в часовом поясе пользователя (`User.timezone`, по умолчанию UTC),
+    неделя начинается с понедельника.
+
+    **Параметры:**
+    - `granularity` - `day` или `week`
+    - `user_ids` - для тренеров: один или несколько клиентов (`?user_ids=a&user_ids=b`)
+    """
+)
+async def get_nutrition_summary(
+    granularity: str = Query("day", description="day или week"),
+    user_ids: Optional[List[str]] = Query(None, description="ID клиентов (для тренеров)"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить сводку питания по периодам"""
+    if granularity not in SUMMARY_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity должен быть day или week")
+
+    if user_ids and current_user.role == models.UserRole.TRAINER:
+        requested = set(user_ids)
+        clients = db.query(models.User.id, models.User.timezone).filter(
+            and_(
+                models.User.id.in_(requested),
+                models.User.trainer_id == current_user.id
+            )
+        ).all()
+        if len(clients) != len(requested):
+            raise HTTPException(status_code=404, detail="Клиент не найден")
+        timezones = {client.id: client.timezone for client in clients}
+    elif user_ids and current_user.role != models.UserRole.TRAINER:
+        raise HTTPException(status_code=403, detail="Только тренеры могут просматривать питание других пользователей")
+    else:
+        timezones = {current_user.id: current_user.timezone}
+
+    Entry = models.NutritionEntry
+    # Часовой пояс каждой записи — по её владельцу; некорректные значения заменяются на UTC
+    tz_by_user = {user_id: _valid_timezone(tz) for user_id, tz in timezones.items()}
+    local_date = func.timezone(case(tz_by_user, value=Entry.user_id, else_="UTC"), Entry.date)
+    period = func.date_trunc(granularity, local_date).label("period_start")
+
+    query = db.query(
+        Entry.user_id,
+        period,
+        func.count(Entry.id),
+        func.sum(Entry.calories),
+        func.sum(func.coalesce(Entry.proteins, 0)),
+        func.sum(func.coalesce(Entry.fats, 0)),
+        func.sum(func.coalesce(Entry.carbs, 0)),
+        func.avg(Entry.calories),
+        func.avg(Entry.proteins),
+        func.avg(Entry.fats),
+        func.avg(Entry.carbs),
+    ).filter(Entry.user_id.in_(list(timezones)))
+    if start_date:
+        query = query.filter(Entry.date >= start_date)
+    if end_date:
+        query = query.filter(Entry.date <= end_date)
+
+    rows = query.group_by(Entry.user_id, period).order_by(Entry.user_id, period).all()
+    return [
+        {
+            "user_id": user_id,
+            "period_start": period_start.date(),
+            "entries_count": count,
+            "calories_total": round(calories, 2),
+            "proteins_total": round(proteins, 2),
+            "fats_total": round(fats, 2),
+            "carbs_total": round(carbs, 2),
+            "calories_avg": round(float(calories_avg), 2),
+            "proteins_avg": _round_or_none(proteins_avg),
+            "fats_avg": _round_or_none(fats_avg),
+            "carbs_avg": _round_or_none(carbs_avg),
+        }
+        for (user_id, period_start, count, calories, proteins, fats, carbs,
+             calories_avg, proteins_avg, fats_avg, carbs_avg) in rows
+    ]
+
+
 @router.get("/{entry_id}", response_model=schemas.NutritionEntryResponse)
 async def get_nutrition_entry(
     entry_id: str,
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user
-import uuid
+from app.services import onboarding_store
 
 router = APIRouter()
 
@@ -63,126 +63,17 @@ async def complete_onboarding(
     db: Session = Depends(get_db)
 ):
     """Завершение онбординга"""
-    # Проверяем, что онбординг еще не пройден
-    existing_onboarding = db.query(models.Onboarding).filter(
-        models.Onboarding.user_id == current_user.id
-    ).first()
+    # Повторное прохождение обновляет только переданные поля, цели и ограничения заменяются
+    values = {
+        field: value for field, value in metrics.model_dump().items()
+        if value is not None or field in ("goals", "restrictions")
+    }
+    onboarding = onboarding_store.save_onboarding(db, current_user.id, values)
     
-    if existing_onboarding:
-        # Обновляем существующий онбординг
-        if metrics.weight is not None:
-            existing_onboarding.weight = metrics.weight
-        if metrics.height is not None:
-            existing_onboarding.height = metrics.height
-        if metrics.age is not None:
-            existing_onboarding.age = metrics.age
-        if metrics.activity_level is not None:
-            existing_onboarding.activity_level = metrics.activity_level
-        
-        # Удаляем старые цели и ограничения
-        db.query(models.OnboardingGoal).filter(
-            models.OnboardingGoal.onboarding_id == existing_onboarding.id
-        ).delete()
-        db.query(models.OnboardingRestriction).filter(
-            models.OnboardingRestriction.onboarding_id == existing_onboarding.id
-        ).delete()
-        
-        # Добавляем новые цели
-        if metrics.goals:
-            for goal in metrics.goals:
-                goal_obj = models.OnboardingGoal(
-                    id=str(uuid.uuid4()),
-                    onboarding_id=existing_onboarding.id,
-                    goal=goal
-                )
-                db.add(goal_obj)
-        
-        # Добавляем новые ограничения
-        if metrics.restrictions:
-            for restriction in metrics.restrictions:
-                restriction_obj = models.OnboardingRestriction(
-                    id=str(uuid.uuid4()),
-                    onboarding_id=existing_onboarding.id,
-                    restriction=restriction
-                )
-                db.add(restriction_obj)
-        
-        db.commit()
-        db.refresh(existing_onboarding)
-        
-        # Получаем цели и ограничения
-        goals = [g.goal for g in db.query(models.OnboardingGoal).filter(
-            models.OnboardingGoal.onboarding_id == existing_onboarding.id
-        ).all()]
-        restrictions = [r.restriction for r in db.query(models.OnboardingRestriction).filter(
-            models.OnboardingRestriction.onboarding_id == existing_onboarding.id
-        ).all()]
-        
-        # Помечаем онбординг как пройденный
-        current_user.onboarding_seen = True
-        db.commit()
-        
-        return schemas.OnboardingResponse(
-            id=existing_onboarding.id,
-            user_id=existing_onboarding.user_id,
-            weight=existing_onboarding.weight,
-            height=existing_onboarding.height,
-            age=existing_onboarding.age,
-            goals=goals,
-            restrictions=restrictions,
-            activity_level=existing_onboarding.activity_level,
-            created_at=existing_onboarding.created_at
-        )
-    else:
-        # Создаем новый онбординг
-        onboarding_id = str(uuid.uuid4())
-        onboarding = models.Onboarding(
-            id=onboarding_id,
-            user_id=current_user.id,
-            weight=metrics.weight,
-            height=metrics.height,
-            age=metrics.age,
-            activity_level=metrics.activity_level
-        )
-        db.add(onboarding)
-        db.flush()  # Flush чтобы получить ID в базе перед добавлением связанных записей
-        
-        # Добавляем цели
-        if metrics.goals:
-            for goal in metrics.goals:
-                goal_obj = models.OnboardingGoal(
-                    id=str(uuid.uuid4()),
-                    onboarding_id=onboarding_id,
-                    goal=goal
-                )
-                db.add(goal_obj)
-        
-        # Добавляем ограничения
-        if metrics.restrictions:
-            for restriction in metrics.restrictions:
-                restriction_obj = models.OnboardingRestriction(
-                    id=str(uuid.uuid4()),
-                    onboarding_id=onboarding_id,
-                    restriction=restriction
-                )
-                db.add(restriction_obj)
-        
-        # Помечаем онбординг как пройденный
-        current_user.onboarding_seen = True
-        db.commit()
-        db.refresh(onboarding)
-        
-        return schemas.OnboardingResponse(
-            id=onboarding.id,
-            user_id=onboarding.user_id,
-            weight=onboarding.weight,
-            height=onboarding.height,
-            age=onboarding.age,
-            goals=metrics.goals or [],
-            restrictions=metrics.restrictions or [],
-            activity_level=onboarding.activity_level,
-            created_at=onboarding.created_at
-        )
+    # Помечаем онбординг как пройденный
+    current_user.onboarding_seen = True
+    db.commit()
+    return onboarding
 
 
 @router.put(
@@ -201,9 +92,11 @@ async def update_onboarding(
     db: Session = Depends(get_db)
 ):
     """Обновление онбординга"""
-    onboarding = db.query(models.Onboarding).filter(
-        models.Onboarding.user_id == current_user.id
-    ).first()
+    values = {
+        field: value for field, value in metrics.model_dump().items()
+        if value is not None or field in ("goals", "restrictions")
+    }
+    onboarding = onboarding_store.update_onboarding(db, current_user.id, values)
     
     if not onboarding:
         raise HTTPException(
@@ -211,66 +104,8 @@ async def update_onboarding(
             detail="Онбординг не найден. Используйте POST /api/onboarding/complete для создания."
         )
     
-    # Обновляем существующий онбординг
-    if metrics.weight is not None:
-        onboarding.weight = metrics.weight
-    if metrics.height is not None:
-        onboarding.height = metrics.height
-    if metrics.age is not None:
-        onboarding.age = metrics.age
-    if metrics.activity_level is not None:
-        onboarding.activity_level = metrics.activity_level
-    
-    # Удаляем старые цели и ограничения
-    db.query(models.OnboardingGoal).filter(
-        models.OnboardingGoal.onboarding_id == onboarding.id
-    ).delete()
-    db.query(models.OnboardingRestriction).filter(
-        models.OnboardingRestriction.onboarding_id == onboarding.id
-    ).delete()
-    
-    # Добавляем новые цели
-    if metrics.goals:
-        for goal in metrics.goals:
-            goal_obj = models.OnboardingGoal(
-                id=str(uuid.uuid4()),
-                onboarding_id=onboarding.id,
-                goal=goal
-            )
-            db.add(goal_obj)
-    
-    # Добавляем новые ограничения
-    if metrics.restrictions:
-        for restriction in metrics.restrictions:
-            restriction_obj = models.OnboardingRestriction(
-                id=str(uuid.uuid4()),
-                onboarding_id=onboarding.id,
-                restriction=restriction
-            )
-            db.add(restriction_obj)
-    
     db.commit()
-    db.refresh(onboarding)
-    
-    # Получаем цели и ограничения
-    goals = [g.goal for g in db.query(models.OnboardingGoal).filter(
-        models.OnboardingGoal.onboarding_id == onboarding.id
-    ).all()]
-    restrictions = [r.restriction for r in db.query(models.OnboardingRestriction).filter(
-        models.OnboardingRestriction.onboarding_id == onboarding.id
-    ).all()]
-    
-    return schemas.OnboardingResponse(
-        id=onboarding.id,
-        user_id=onboarding.user_id,
-        weight=onboarding.weight,
-        height=onboarding.height,
-        age=onboarding.age,
-        goals=goals,
-        restrictions=restrictions,
-        activity_level=onboarding.activity_level,
-        created_at=onboarding.created_at
-    )
+    return onboarding
 
 
 @router.get(
@@ -310,33 +145,11 @@ async def get_onboarding(
     db: Session = Depends(get_db)
 ):
     """Получить данные онбординга текущего пользователя"""
-    onboarding = db.query(models.Onboarding).filter(
-        models.Onboarding.user_id == current_user.id
-    ).first()
+    onboarding = onboarding_store.get_onboarding(db, current_user.id)
     
     if not onboarding:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Онбординг не найден"
         )
-    
-    # Получаем цели и ограничения
-    goals = [g.goal for g in db.query(models.OnboardingGoal).filter(
-        models.OnboardingGoal.onboarding_id == onboarding.id
-    ).all()]
-    restrictions = [r.restriction for r in db.query(models.OnboardingRestriction).filter(
-        models.OnboardingRestriction.onboarding_id == onboarding.id
-    ).all()]
-    
-    return schemas.OnboardingResponse(
-        id=onboarding.id,
-        user_id=onboarding.user_id,
-        weight=onboarding.weight,
-        height=onboarding.height,
-        age=onboarding.age,
-        goals=goals,
-        restrictions=restrictions,
-        activity_level=onboarding.activity_level,
-        created_at=onboarding.created_at
-    )
-
+    return onboarding
@@ -1,21 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from datetime import datetime
 import uuid
 import os
-import shutil
 from pathlib import Path
 
 from app.database import get_db
 from app.auth import get_current_user
 from app import models, schemas
+from app.services.upload_service import ImageUploadRoute, save_image_upload, UploadTooLarge, UnsupportedImageType
+from app.services.photo_variants import delete_variants
+from app.services.photo_storage import acquire_photo_blob, release_photo_blobs
+from app.services.storage import delete_objects, is_storage_key
 
-router = APIRouter()
+# Тело больше лимита загрузки отклоняется до разбора multipart
+router = APIRouter(route_class=ImageUploadRoute)
 
-# Directory for storing uploaded photos
+# Directory of photos uploaded before content-addressed storage (legacy URLs)
 UPLOAD_DIR = Path("uploads/progress_photos")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Local staging for incoming uploads before they go to storage
+STAGING_DIR = Path(os.getenv("UPLOAD_STAGING_DIR", "uploads/.staging"))
+STAGING_DIR.mkdir(parents=True, exist_ok=True)
 
 # Base URL for serving static files (in production, use CDN/S3)
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
@@ -31,17 +39,7 @@ async def get_progress_photos(
         models.ProgressPhoto.user_id == current_user.id
     ).order_by(models.ProgressPhoto.date.desc()).all()
     
-    return [
-        schemas.ProgressPhotoResponse(
-            id=photo.id,
-            date=photo.date,
-            url=photo.url,
-            thumbnail_url=photo.url,  # В простой реализации thumbnail = original
-            notes=photo.notes,
-            created_at=photo.created_at,
-        )
-        for photo in photos
-    ]
+    return [schemas.ProgressPhotoResponse.model_validate(photo) for photo in photos]
 
 
 @router.post("/", response_model=schemas.ProgressPhotoResponse)
@@ -54,32 +52,7 @@ async def upload_progress_photo(
 ):
     """Загрузить новое фото прогресса"""
     
-    # Validate file type
-    allowed_types = ["image/jpeg", "image/png", "image/webp", "image/heic"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type {file.content_type} not allowed. Allowed types: {', '.join(allowed_types)}"
-        )
-    
-    # Generate unique filename
-    file_ext = file.filename.split(".")[-1] if file.filename else "jpg"
-    photo_id = str(uuid.uuid4())
-    filename = f"{photo_id}.{file_ext}"
-    
-    # Create user-specific directory
-    user_dir = UPLOAD_DIR / current_user.id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Save file
-    file_path = user_dir / filename
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Generate URL for the photo (relative)
-    photo_url = f"/uploads/progress_photos/{current_user.id}/{filename}"
-    
-    # Parse date
+    # Parse date (до записи файла, чтобы не оставлять сирот на диске)
     try:
         photo_date = datetime.fromisoformat(date.replace("Z", "+00:00"))
     except ValueError:
@@ -89,27 +62,42 @@ async def upload_progress_photo(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use ISO format or YYYY-MM-DD")
     
-    # Create database record
-    photo = models.ProgressPhoto(
-        id=photo_id,
-        user_id=current_user.id,
-        date=photo_date,
-        url=photo_url,
-        notes=notes,
-    )
+    # Stream file to staging: тип по содержимому, лимит размера, SHA-256 на лету
+    photo_id = str(uuid.uuid4())
+    try:
+        stored = await save_image_upload(file, STAGING_DIR, photo_id)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedImageType as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    db.add(photo)
-    db.commit()
+    blob = None
+    try:
+        # Одинаковое содержимое хранится один раз; url — ключ в хранилище
+        blob = await acquire_photo_blob(db, stored)
+        photo = models.ProgressPhoto(
+            id=photo_id,
+            user_id=current_user.id,
+            date=photo_date,
+            url=blob.key,
+            content_hash=stored.sha256,
+            thumbnail_url=blob.thumbnail_key,
+            medium_url=blob.medium_key,
+            notes=notes,
+        )
+        db.add(photo)
+        db.commit()
+    except Exception:
+        db.rollback()
+        if blob is not None and blob.created:
+            await run_in_threadpool(delete_objects, blob.object_keys())
+        raise
+    finally:
+        stored.path.unlink(missing_ok=True)
+        delete_variants(stored.path)
     db.refresh(photo)
     
-    return schemas.ProgressPhotoResponse(
-        id=photo.id,
-        date=photo.date,
-        url=photo.url,
-        thumbnail_url=photo.url,
-        notes=photo.notes,
-        created_at=photo.created_at,
-    )
+    return schemas.ProgressPhotoResponse.model_validate(photo)
 
 
 @router.delete("/{photo_id}")
@@ -127,19 +115,23 @@ async def delete_progress_photo(
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    # Try to delete the file from disk
-    try:
-        # Extract filename from URL
-        url_parts = photo.url.split("/")
-        filename = url_parts[-1]
-        file_path = UPLOAD_DIR / current_user.id / filename
-        if file_path.exists():
-            file_path.unlink()
-    except Exception:
-        pass  # File deletion is not critical
+    # Файл в хранилище удаляется, только если на него больше никто не ссылается
+    orphaned = []
+    if is_storage_key(photo.url):
+        orphaned = release_photo_blobs(db, [photo.content_hash])
+    else:
+        # Legacy photo: file lives under uploads/progress_photos/<user_id>/
+        try:
+            filename = photo.url.split("/")[-1]
+            file_path = UPLOAD_DIR / current_user.id / filename
+            file_path.unlink(missing_ok=True)
+            delete_variants(file_path)
+        except Exception:
+            pass  # File deletion is not critical
     
     db.delete(photo)
     db.commit()
+    await run_in_threadpool(delete_objects, orphaned)
     
     return {"message": "Photo deleted successfully"}
 
@@ -159,11 +151,4 @@ async def get_progress_photo(
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    return schemas.ProgressPhotoResponse(
-        id=photo.id,
-        date=photo.date,
-        url=photo.url,
-        thumbnail_url=photo.url,
-        notes=photo.notes,
-        created_at=photo.created_at,
-    )
+    return schemas.ProgressPhotoResponse.model_validate(photo)
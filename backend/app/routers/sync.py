@@ -0,0 +1,59 @@
+"""
+Лента изменений для локального кэша клиента: GET /api/sync?since=<курсор>.
+
+Первый запрос без since возвращает id всех записей как созданные; дальше
+клиент передаёт cursor из предыдущего ответа и получает только изменения.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.auth import get_current_active_user
+from app.database import get_db
+from app.services.sync_feed import decode_cursor, get_changes
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    response_model=schemas.SyncResponse,
+    summary="Изменения с момента последней синхронизации",
+    description="""
+    Для каждой сущности (workouts, programs, nutrition, notes, body_metrics,
+    body_metric_entries, exercise_metrics, exercise_metric_entries) — id созданных,
+    изменённых и удалённых записей после курсора `since`.
+
+    Изменение может прийти повторно в соседних ответах — применять его нужно идемпотентно.
+    Тренер может синхронизировать данные клиента (`user_id`).
+    """
+)
+async def sync_changes(
+    since: Optional[str] = Query(None, description="cursor из предыдущего ответа; без него — полная выборка"),
+    user_id: Optional[str] = Query(None, description="ID клиента (для тренеров)"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить изменения данных после курсора"""
+    target_user_id = current_user.id
+    if user_id and current_user.role == models.UserRole.TRAINER:
+        client = db.query(models.User.id).filter(
+            and_(
+                models.User.id == user_id,
+                models.User.trainer_id == current_user.id
+            )
+        ).first()
+        if not client:
+            raise HTTPException(status_code=404, detail="Клиент не найден")
+        target_user_id = user_id
+    elif user_id and current_user.role != models.UserRole.TRAINER:
+        raise HTTPException(status_code=403, detail="Только тренеры могут синхронизировать данные других пользователей")
+
+    try:
+        since_moment = decode_cursor(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный курсор синхронизации")
+    return get_changes(db, current_user, target_user_id, since_moment)
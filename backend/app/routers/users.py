@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user
+from app.services.account_export import STALE_EXPORT_AFTER, iter_account_zip, run_account_export
 from app.services.subscription_service import check_client_limit
 from pydantic import BaseModel, Field
 
@@ -274,3 +276,103 @@ async def delete_account(
     db.commit()
     return {"message": "Аккаунт успешно удален. Вы можете зарегистрироваться с теми же данными."}
 
+
+
+def _account_export_response(job: models.AccountExport) -> schemas.AccountExportResponse:
+    return schemas.AccountExportResponse(
+        id=job.id,
+        status=job.status,
+        size=job.size,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        download_url=job.key if job.status == "ready" else None,
+    )
+
+
+@router.get(
+    "/me/export",
+    summary="Выгрузка всех данных (ZIP потоком)",
+    description="""
+    Архив собирается на лету и сразу отдаётся: профиль, тренировки, программы, метрики,
+    питание, заметки, платежи, уведомления (JSON/CSV) и оригиналы фото прогресса.
+
+    Для больших аккаунтов удобнее фоновая выгрузка: `POST /users/me/export`.
+    """
+)
+async def export_my_data(
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Скачать данные аккаунта ZIP-архивом"""
+    from datetime import datetime
+
+    filename = f"coach-flo-export-{datetime.now():%Y-%m-%d}.zip"
+    return StreamingResponse(
+        iter_account_zip(db, current_user),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.post(
+    "/me/export",
+    response_model=schemas.AccountExportResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Запустить фоновую выгрузку данных",
+    description="""
+    Архив собирается в фоне и сохраняется в хранилище. Статус и ссылка на скачивание —
+    `GET /users/me/export/{export_id}`. Пока выгрузка выполняется, повторный запрос
+    возвращает её же.
+    """
+)
+async def start_my_data_export(
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Запустить фоновую выгрузку данных аккаунта"""
+    import uuid
+    from datetime import datetime, timezone
+
+    # Задача, прерванная перезапуском сервера, остаётся running — через STALE_EXPORT_AFTER её не ждём
+    job = db.query(models.AccountExport).filter(
+        and_(
+            models.AccountExport.user_id == current_user.id,
+            models.AccountExport.status.in_(("pending", "running")),
+            models.AccountExport.created_at >= datetime.now(timezone.utc) - STALE_EXPORT_AFTER
+        )
+    ).first()
+    if job is None:
+        job = models.AccountExport(id=str(uuid.uuid4()), user_id=current_user.id, status="pending")
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        # Синхронная задача — Starlette выполнит её в пуле потоков после ответа
+        background_tasks.add_task(run_account_export, job.id)
+    return _account_export_response(job)
+
+
+@router.get(
+    "/me/export/{export_id}",
+    response_model=schemas.AccountExportResponse,
+    summary="Статус фоновой выгрузки данных"
+)
+async def get_my_data_export(
+    export_id: str,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Статус выгрузки и подписанная ссылка на архив, когда он готов"""
+    job = db.query(models.AccountExport).filter(
+        and_(
+            models.AccountExport.id == export_id,
+            models.AccountExport.user_id == current_user.id
+        )
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Выгрузка не найдена")
+    return _account_export_response(job)
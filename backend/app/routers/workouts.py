@@ -4,11 +4,16 @@ from sqlalchemy import and_, or_
 from app.database import get_db
 from app import models, schemas
 from app.auth import get_current_active_user
+from app.services import session_ledger
+from app.services.notification_service import create_notification
+from app.services.streaming_export import CHUNK_ROWS, EXPORT_FORMATS, export_response
 from typing import List, Optional
 from datetime import datetime, timedelta
+import logging
 import uuid
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.post("/", response_model=schemas.WorkoutResponse, status_code=status.HTTP_201_CREATED)
@@ -189,19 +194,20 @@ async def create_workout(
     return db_workout
 
 
-@router.get("/", response_model=List[schemas.WorkoutResponse])
-async def get_workouts(
-    start_date: Optional[datetime] = Query(None, description="Начало периода"),
-    end_date: Optional[datetime] = Query(None, description="Конец периода"),
-    client_id: Optional[str] = Query(None, description="ID клиента (только для тренеров)"),
-    trainer_view: Optional[bool] = Query(False, description="Просмотр всех тренировок команды (только для тренеров)"),
-    current_user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+def _workouts_query(
+    db: Session,
+    current_user: models.User,
+    client_id: Optional[str],
+    trainer_view: Optional[bool],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    *columns,
 ):
-    """Получить список тренировок"""
-    import logging
-    logger = logging.getLogger(__name__)
-    
+    """
+    Запрос тренировок, доступных пользователю (общий для списка и выгрузки).
+    columns — выбираемые колонки; по умолчанию сами объекты Workout.
+    """
+    entities = columns or (models.Workout,)
     if trainer_view and current_user.role == models.UserRole.TRAINER:
         # Тренер видит все тренировки своих клиентов И тренировки, где он указан как тренер
         # Используем подзапрос для получения ID всех клиентов тренера
@@ -213,7 +219,7 @@ async def get_workouts(
         logger.info(f"[GET workouts] trainer_view=True, trainer={current_user.id}, clients={client_id_list}")
         
         # Тренировки клиентов + тренировки самого тренера (где trainer_id = current_user.id)
-        query = db.query(models.Workout).filter(
+        query = db.query(*entities).filter(
             or_(
                 models.Workout.user_id.in_(client_id_list),
                 models.Workout.trainer_id == current_user.id,
@@ -241,21 +247,75 @@ async def get_workouts(
         ).first()
         if not client:
             raise HTTPException(status_code=404, detail="Клиент не найден")
-        query = db.query(models.Workout).filter(models.Workout.user_id == client_id)
+        query = db.query(*entities).filter(models.Workout.user_id == client_id)
     else:
         # Клиент видит свои тренировки
-        query = db.query(models.Workout).filter(models.Workout.user_id == current_user.id)
+        query = db.query(*entities).filter(models.Workout.user_id == current_user.id)
     
     if start_date:
         query = query.filter(models.Workout.start >= start_date)
     if end_date:
         query = query.filter(models.Workout.start <= end_date)
-    
+    return query
+
+
+@router.get("/", response_model=List[schemas.WorkoutResponse])
+async def get_workouts(
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    client_id: Optional[str] = Query(None, description="ID клиента (только для тренеров)"),
+    trainer_view: Optional[bool] = Query(False, description="Просмотр всех тренировок команды (только для тренеров)"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Получить список тренировок"""
+    query = _workouts_query(db, current_user, client_id, trainer_view, start_date, end_date)
     workouts = query.order_by(models.Workout.start).all()
     logger.info(f"[GET workouts] Returning {len(workouts)} workouts for user={current_user.id}, start_date={start_date}, end_date={end_date}")
     return workouts
 
 
+WORKOUT_EXPORT_HEADER = [
+    "id", "start", "end", "client_id", "client_name", "trainer_id", "title",
+    "attendance", "format", "location", "coach_note",
+]
+
+
+@router.get(
+    "/export",
+    summary="Выгрузка тренировок в CSV/XLSX",
+    description="Те же фильтры, что и у списка; строки читаются серверным курсором и отдаются потоком."
+)
+async def export_workouts(
+    format: str = Query("csv", description="csv или xlsx"),
+    start_date: Optional[datetime] = Query(None, description="Начало периода"),
+    end_date: Optional[datetime] = Query(None, description="Конец периода"),
+    client_id: Optional[str] = Query(None, description="ID клиента (только для тренеров)"),
+    trainer_view: Optional[bool] = Query(False, description="Все тренировки команды (только для тренеров)"),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Выгрузить тренировки"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format должен быть csv или xlsx")
+    query = _workouts_query(
+        db, current_user, client_id, trainer_view, start_date, end_date,
+        models.Workout.id,
+        models.Workout.start,
+        models.Workout.end,
+        models.Workout.user_id,
+        models.User.full_name,
+        models.Workout.trainer_id,
+        models.Workout.title,
+        models.Workout.attendance,
+        models.Workout.format,
+        models.Workout.location,
+        models.Workout.coach_note,
+    ).join(models.User, models.User.id == models.Workout.user_id)
+    rows = query.order_by(models.Workout.start).yield_per(CHUNK_ROWS)
+    return export_response(format, "workouts", WORKOUT_EXPORT_HEADER, rows)
+
+
 @router.get("/{workout_id}", response_model=schemas.WorkoutResponse)
 async def get_workout(
     workout_id: str,
@@ -326,34 +386,15 @@ async def update_workout(
     
     update_data = workout_update.model_dump(exclude_unset=True)
     
-    # Check if we need to update balance
-    status_changed_to_completed = (
-        "attendance" in update_data and 
-        update_data["attendance"] == models.AttendanceStatus.COMPLETED and
-        workout.attendance != models.AttendanceStatus.COMPLETED
-    )
-    
+    # Переход в COMPLETED — условным UPDATE до изменения объекта (flush не должен записать статус раньше);
+    # занятие списывает только запрос, выполнивший переход
+    if update_data.get("attendance") == models.AttendanceStatus.COMPLETED:
+        if session_ledger.claim_completion(db, workout.id):
+            session_ledger.deduct_session(db, workout.user_id)
+
     for field, value in update_data.items():
         setattr(workout, field, value)
     
-    # Deduct from package if status changed to completed
-    if status_changed_to_completed:
-        client = db.query(models.User).filter(models.User.id == workout.user_id).first()
-        if client and client.workouts_package is not None and client.workouts_package > 0:
-            client.workouts_package -= 1
-            
-        # Также списываем с конкретного платежа (самого старого активного пакета)
-        active_payment = db.query(models.Payment).filter(
-            and_(
-                models.Payment.client_id == workout.user_id,
-                models.Payment.type == models.PaymentType.PACKAGE,
-                models.Payment.remaining_sessions > 0
-            )
-        ).order_by(models.Payment.date.asc()).first()
-        
-        if active_payment:
-            active_payment.remaining_sessions -= 1
-    
     db.commit()
     db.refresh(workout)
     
@@ -361,8 +402,8 @@ async def update_workout(
     if current_user.role == models.UserRole.CLIENT and workout.trainer_id:
         # Проверяем, изменилось ли время
         if "start" in update_data or "end" in update_data:
-            notification = models.Notification(
-                id=str(uuid.uuid4()),
+            create_notification(
+                db,
                 user_id=workout.trainer_id,
                 sender_id=current_user.id,
                 type="workout_rescheduled",
@@ -370,7 +411,6 @@ async def update_workout(
                 content=f"Тренировка '{workout.title}' перенесена на {workout.start.strftime('%d.%m.%Y %H:%M')}",
                 link=f"/trainer/clients/{current_user.id}/calendar?workout_id={workout.id}"
             )
-            db.add(notification)
             db.commit()
             
     return workout
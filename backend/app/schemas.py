@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Dict, Optional, List
+from datetime import date as date_type, datetime
 from app.models import UserRole
+from app.services.storage import resolve_url
 
 
 # User schemas
@@ -409,6 +410,107 @@ class ExerciseMetricEntryResponse(ExerciseMetricEntryBase):
         from_attributes = True
 
 
+class BodyMetricEntryBatchItem(BodyMetricEntryBase):
+    metric_id: str
+
+
+class ExerciseMetricEntryBatchItem(ExerciseMetricEntryBase):
+    exercise_metric_id: str
+
+
+class MetricEntriesBatchCreate(BaseModel):
+    """Пакет записей по любым метрикам (в т.ч. разных клиентов тренера)."""
+    body_entries: List[BodyMetricEntryBatchItem] = Field(default_factory=list, max_length=1000)
+    exercise_entries: List[ExerciseMetricEntryBatchItem] = Field(default_factory=list, max_length=1000)
+
+
+class MetricEntriesBatchResult(BaseModel):
+    body_entry_ids: List[str]
+    exercise_entry_ids: List[str]
+
+
+class ExerciseSessionStats(BaseModel):
+    date: date_type
+    tonnage: float
+    best_e1rm: Optional[float] = None
+
+
+class ExerciseWeekStats(BaseModel):
+    week_start: date_type
+    tonnage: float
+
+
+class ExercisePersonalRecord(BaseModel):
+    date: datetime
+    e1rm: float
+    weight: float
+    repetitions: int
+
+
+class ExerciseAnalyticsSummary(BaseModel):
+    exercise_metric_id: str
+    user_id: str
+    label: str
+    entries_count: int
+    best_e1rm: Optional[float] = None  # расчётный 1ПМ (Эпли)
+    best_weight: Optional[float] = None
+    last_e1rm: Optional[float] = None
+    total_tonnage: float
+    last_pr_date: Optional[datetime] = None
+
+
+class ExerciseAnalyticsResponse(ExerciseAnalyticsSummary):
+    sessions: List[ExerciseSessionStats] = []
+    weeks: List[ExerciseWeekStats] = []
+    personal_records: List[ExercisePersonalRecord] = []
+
+
+class MetricSeriesPoint(BaseModel):
+    timestamp: datetime
+    value: float  # для интервала — последнее значение
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: Optional[float] = None
+    count: Optional[int] = None
+
+
+class MetricSeriesResponse(BaseModel):
+    metric_id: str
+    method: str  # bucket, lttb или raw (точек меньше max_points)
+    resolution: Optional[str] = None  # day/week/month или ширина интервала, например "86400s"
+    points: List[MetricSeriesPoint]
+
+
+class AccountExportResponse(BaseModel):
+    id: str
+    status: str  # pending, running, ready, failed
+    size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None  # подписанная ссылка, когда status == ready
+
+    class Config:
+        from_attributes = True
+
+    @model_validator(mode="after")
+    def _sign_download_url(self):
+        if self.download_url:
+            self.download_url = resolve_url(self.download_url)
+        return self
+
+
+class SyncEntityChanges(BaseModel):
+    created: List[str]
+    updated: List[str]
+    deleted: List[str]
+
+
+class SyncResponse(BaseModel):
+    cursor: str  # передаётся как since в следующий запрос
+    changes: Dict[str, SyncEntityChanges]
+
+
 # Nutrition schemas
 class NutritionEntryBase(BaseModel):
     date: datetime
@@ -433,6 +535,34 @@ class NutritionEntryResponse(NutritionEntryBase):
         from_attributes = True
 
 
+class NutritionSummaryPeriod(BaseModel):
+    user_id: str
+    period_start: date_type  # день или понедельник недели в часовом поясе пользователя
+    entries_count: int
+    calories_total: float
+    proteins_total: float
+    fats_total: float
+    carbs_total: float
+    calories_avg: float
+    proteins_avg: Optional[float] = None
+    fats_avg: Optional[float] = None
+    carbs_avg: Optional[float] = None
+
+
+class NutritionImportRowError(BaseModel):
+    row: int  # номер строки в файле, заголовок — 1
+    error: str
+
+
+class NutritionImportResult(BaseModel):
+    rows_total: int
+    rows_imported: int
+    days_created: int
+    days_updated: int
+    errors_count: int
+    errors: List[NutritionImportRowError]  # первые MAX_REPORTED_ERRORS ошибок
+
+
 # Finance schemas
 from app.models import PaymentType
 
@@ -462,6 +592,13 @@ class PaymentResponse(PaymentBase):
         from_attributes = True
 
 
+class RevenueSeriesPoint(BaseModel):
+    month: date_type  # первое число месяца (UTC)
+    revenue: float
+    payments_count: int
+    by_type: Dict[PaymentType, float]
+
+
 # Exercise Library schemas
 class ExerciseBase(BaseModel):
     name: str
@@ -571,12 +708,26 @@ class ProgressPhotoResponse(BaseModel):
     date: datetime
     url: str
     thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
     notes: Optional[str] = None
     created_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+    @model_validator(mode="after")
+    def fill_missing_variants(self):
+        # В БД хранятся ключи хранилища — превращаем их в URL бэкенда
+        self.url = resolve_url(self.url)
+        self.thumbnail_url = resolve_url(self.thumbnail_url)
+        self.medium_url = resolve_url(self.medium_url)
+        # Фото без сгенерированных вариантов отдаём оригиналом
+        if not self.thumbnail_url:
+            self.thumbnail_url = self.medium_url or self.url
+        if not self.medium_url:
+            self.medium_url = self.url
+        return self
+
 
 class DashboardStats(BaseModel):
     total_workouts: int
@@ -589,6 +740,37 @@ class DashboardStats(BaseModel):
     progress_photos: List[ProgressPhotoResponse] = []
 
 
+class ClientSummary(BaseModel):
+    """Сводка по клиенту для списка клиентов тренера."""
+    total_workouts: int = 0
+    completed_workouts: int = 0
+    attendance_rate: float = 0
+    next_workout_id: Optional[str] = None
+    next_workout_start: Optional[datetime] = None
+    last_workout_start: Optional[datetime] = None
+    workouts_package: Optional[int] = None  # остаток занятий на балансе клиента
+    package_remaining_sessions: Optional[int] = None  # сумма остатков активных пакетов
+    package_expiry_date: Optional[datetime] = None
+
+
+class ClientRosterEntry(UserResponse):
+    summary: Optional[ClientSummary] = None
+
+
+class ClientOverview(BaseModel):
+    """Карточка клиента; разделы, не указанные в include, равны null."""
+    client_id: str
+    sections: List[str]
+    profile: Optional[UserResponse] = None
+    stats: Optional[DashboardStats] = None
+    onboarding: Optional[OnboardingResponse] = None
+    body_metrics: Optional[List[BodyMetricResponse]] = None
+    body_metric_latest_entries: Optional[List[BodyMetricEntryResponse]] = None
+    programs: Optional[List[TrainingProgramResponse]] = None
+    notes: Optional[List[TrainerNoteResponse]] = None
+    workouts: Optional[List[WorkoutResponse]] = None
+
+
 # Notification schemas
 class NotificationBase(BaseModel):
     user_id: str
@@ -612,6 +794,18 @@ class NotificationUpdate(BaseModel):
     is_read: Optional[bool] = None
 
 
+class NotificationUnreadCount(BaseModel):
+    unread_count: int
+
+
+class NotificationBulkReadRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000, description="ID уведомлений")
+
+
+class NotificationBulkResult(BaseModel):
+    affected: int = Field(..., description="Количество затронутых уведомлений")
+
+
 # Dashboard Settings schemas
 class DashboardSettingsUpdate(BaseModel):
     tile_ids: Optional[List[str]] = None
@@ -0,0 +1,285 @@
+"""
+Выгрузка всех данных пользователя одним ZIP-архивом.
+
+Архив собирается на лету (ZipStreamBuffer из streaming_export): таблицы
+пишутся в CSV из серверных курсоров, вложенные данные (программы, заметки)
+— в JSON по одной записи, оригиналы фото прогресса копируются из хранилища
+кусками по COPY_CHUNK. В памяти — только текущий кусок, поэтому архив
+можно отдавать потоком (iter_account_zip) или, для больших аккаунтов,
+собирать фоновой задачей (run_account_export) во временный файл и класть
+в хранилище; пользователь получает подписанную ссылку на него.
+"""
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone
+from enum import Enum
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+
+from app import models
+from app.database import SessionLocal
+from app.services.storage import delete_objects, get_storage, storage_key_for
+from app.services.streaming_export import CHUNK_ROWS, ZipStreamBuffer, iter_csv
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK = 1024 * 1024
+EXPORT_KEY_PREFIX = "exports"
+# Незавершённая за это время выгрузка считается брошенной (например, сервер перезапускался)
+STALE_EXPORT_AFTER = timedelta(hours=6)
+
+PROFILE_FIELDS = (
+    "id", "full_name", "email", "phone", "role", "locale", "timezone", "trainer_id", "club_id",
+    "client_format", "workouts_package", "package_expiry_date", "subscription_plan",
+    "subscription_expires_at", "created_at",
+)
+
+
+def _json_default(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def _program_dict(program: models.TrainingProgram) -> dict:
+    return {
+        "id": program.id,
+        "title": program.title,
+        "description": program.description,
+        "owner": program.owner,
+        "created_at": program.created_at,
+        "days": [
+            {
+                "name": day.name,
+                "order": day.order,
+                "notes": day.notes,
+                "blocks": [
+                    {
+                        "type": block.type,
+                        "title": block.title,
+                        "order": block.order,
+                        "exercises": [
+                            {
+                                "title": exercise.title,
+                                "sets": exercise.sets,
+                                "reps": exercise.reps,
+                                "duration": exercise.duration,
+                                "rest": exercise.rest,
+                                "weight": exercise.weight,
+                                "description": exercise.description,
+                                "video_url": exercise.video_url,
+                            }
+                            for exercise in block.exercises
+                        ],
+                    }
+                    for block in day.blocks
+                ],
+            }
+            for day in sorted(program.days, key=lambda d: d.order)
+        ],
+    }
+
+
+def _csv_sections(db: Session, user_id: str):
+    """(имя файла, заголовок, строки) для табличных разделов."""
+    workouts = db.query(
+        models.Workout.id, models.Workout.start, models.Workout.end, models.Workout.user_id,
+        models.Workout.trainer_id, models.Workout.title, models.Workout.attendance,
+        models.Workout.format, models.Workout.location, models.Workout.coach_note,
+    ).filter(
+        or_(models.Workout.user_id == user_id, models.Workout.trainer_id == user_id)
+    ).order_by(models.Workout.start)
+    yield "workouts.csv", [
+        "id", "start", "end", "client_id", "trainer_id", "title", "attendance", "format", "location", "coach_note",
+    ], workouts
+
+    body = db.query(
+        models.BodyMetric.label, models.BodyMetric.unit, models.BodyMetric.target,
+        models.BodyMetricEntry.recorded_at, models.BodyMetricEntry.value,
+    ).join(
+        models.BodyMetricEntry, models.BodyMetricEntry.metric_id == models.BodyMetric.id
+    ).filter(models.BodyMetric.user_id == user_id).order_by(
+        models.BodyMetric.label, models.BodyMetricEntry.recorded_at
+    )
+    yield "body_metrics.csv", ["label", "unit", "target", "recorded_at", "value"], body
+
+    exercise = db.query(
+        models.ExerciseMetric.label, models.ExerciseMetric.muscle_group, models.ExerciseMetricEntry.date,
+        models.ExerciseMetricEntry.weight, models.ExerciseMetricEntry.repetitions, models.ExerciseMetricEntry.sets,
+    ).join(
+        models.ExerciseMetricEntry, models.ExerciseMetricEntry.exercise_metric_id == models.ExerciseMetric.id
+    ).filter(models.ExerciseMetric.user_id == user_id).order_by(
+        models.ExerciseMetric.label, models.ExerciseMetricEntry.date
+    )
+    yield "exercise_metrics.csv", ["label", "muscle_group", "date", "weight", "repetitions", "sets"], exercise
+
+    nutrition = db.query(
+        models.NutritionEntry.date, models.NutritionEntry.calories, models.NutritionEntry.proteins,
+        models.NutritionEntry.fats, models.NutritionEntry.carbs, models.NutritionEntry.notes,
+    ).filter(models.NutritionEntry.user_id == user_id).order_by(models.NutritionEntry.date)
+    yield "nutrition.csv", ["date", "calories", "proteins", "fats", "carbs", "notes"], nutrition
+
+    payments = db.query(
+        models.Payment.id, models.Payment.date, models.Payment.trainer_id, models.Payment.client_id,
+        models.Payment.type, models.Payment.amount, models.Payment.package_size,
+        models.Payment.remaining_sessions, models.Payment.subscription_days, models.Payment.notes,
+    ).filter(
+        or_(models.Payment.client_id == user_id, models.Payment.trainer_id == user_id)
+    ).order_by(models.Payment.date)
+    yield "payments.csv", [
+        "id", "date", "trainer_id", "client_id", "type", "amount", "package_size",
+        "remaining_sessions", "subscription_days", "notes",
+    ], payments
+
+    notifications = db.query(
+        models.Notification.created_at, models.Notification.type, models.Notification.title,
+        models.Notification.content, models.Notification.link, models.Notification.is_read,
+    ).filter(models.Notification.user_id == user_id).order_by(models.Notification.created_at)
+    yield "notifications.csv", ["created_at", "type", "title", "content", "link", "is_read"], notifications
+
+    photos = db.query(
+        models.ProgressPhoto.id, models.ProgressPhoto.date, models.ProgressPhoto.notes,
+    ).filter(models.ProgressPhoto.user_id == user_id).order_by(models.ProgressPhoto.date)
+    yield "progress_photos.csv", ["id", "date", "notes"], photos
+
+
+def iter_account_zip(db: Session, user: models.User) -> Iterator[bytes]:
+    """Байты ZIP-архива с данными пользователя, по мере готовности."""
+    out = ZipStreamBuffer()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("profile.json", _dumps({field: getattr(user, field) for field in PROFILE_FIELDS}))
+        yield out.drain()
+
+        for name, header, query in _csv_sections(db, user.id):
+            with archive.open(name, "w", force_zip64=True) as target:
+                for chunk in iter_csv(header, query.yield_per(CHUNK_ROWS)):
+                    target.write(chunk)
+                    yield out.drain()
+            yield out.drain()
+
+        # Программы и заметки — вложенные структуры, JSON-массив по одной записи
+        programs = db.query(models.TrainingProgram).options(
+            selectinload(models.TrainingProgram.days)
+            .selectinload(models.ProgramDay.blocks)
+            .selectinload(models.ProgramBlock.exercises)
+        ).filter(models.TrainingProgram.user_id == user.id).order_by(models.TrainingProgram.created_at)
+        with archive.open("programs.json", "w") as target:
+            target.write(b"[")
+            for i, program in enumerate(programs.yield_per(50)):
+                target.write((b"," if i else b"") + _dumps(_program_dict(program)))
+                yield out.drain()
+            target.write(b"]")
+        yield out.drain()
+
+        notes = db.query(
+            models.TrainerNote.id, models.TrainerNote.client_id, models.TrainerNote.title,
+            models.TrainerNote.content, models.TrainerNote.created_at, models.TrainerNote.updated_at,
+        ).filter(models.TrainerNote.trainer_id == user.id).order_by(models.TrainerNote.created_at)
+        with archive.open("notes.json", "w") as target:
+            target.write(b"[")
+            for i, note in enumerate(notes.yield_per(CHUNK_ROWS)):
+                target.write((b"," if i else b"") + _dumps(note._asdict()))
+            target.write(b"]")
+        yield out.drain()
+
+        # Оригиналы фото: уже сжаты, поэтому без deflate
+        storage = get_storage()
+        photos = db.query(
+            models.ProgressPhoto.id, models.ProgressPhoto.date, models.ProgressPhoto.url
+        ).filter(models.ProgressPhoto.user_id == user.id).order_by(models.ProgressPhoto.date)
+        for photo in photos.yield_per(CHUNK_ROWS):
+            key = storage_key_for(photo.url)
+            if key is None:
+                continue
+            extension = key.rsplit(".", 1)[-1]
+            info = zipfile.ZipInfo(
+                f"photos/{photo.date:%Y-%m-%d}_{photo.id}.{extension}",
+                date_time=photo.date.timetuple()[:6],
+            )
+            info.compress_type = zipfile.ZIP_STORED
+            try:
+                source = storage.open(key)
+            except Exception as e:
+                logger.warning(f"Export {user.id}: photo {photo.id} is unavailable: {e}")
+                continue
+            with closing(source), archive.open(info, "w") as target:
+                for block in iter(lambda: source.read(COPY_CHUNK), b""):
+                    target.write(block)
+                    yield out.drain()
+    yield out.drain()
+
+
+def write_account_zip(db: Session, user: models.User, fileobj: BinaryIO) -> int:
+    """Записать архив в файл; возвращает размер."""
+    size = 0
+    for chunk in iter_account_zip(db, user):
+        fileobj.write(chunk)
+        size += len(chunk)
+    return size
+
+
+def export_key(user_id: str, export_id: str) -> str:
+    return f"{EXPORT_KEY_PREFIX}/{user_id}/{export_id}.zip"
+
+
+def run_account_export(export_id: str) -> None:
+    """
+    Фоновая задача: собрать архив во временный файл, положить в хранилище и
+    отметить выгрузку готовой. Предыдущие архивы пользователя удаляются.
+    Работает в своей сессии — сессия запроса к этому моменту закрыта.
+    """
+    db = SessionLocal()
+    tmp_path: Optional[Path] = None
+    try:
+        job = db.query(models.AccountExport).filter(models.AccountExport.id == export_id).first()
+        if job is None:
+            return
+        user = db.query(models.User).filter(models.User.id == job.user_id).one()
+        job.status = "running"
+        db.commit()
+
+        fd, name = tempfile.mkstemp(suffix=".zip")
+        tmp_path = Path(name)
+        with os.fdopen(fd, "wb") as f:
+            size = write_account_zip(db, user, f)
+
+        key = export_key(user.id, job.id)
+        get_storage().put_file(tmp_path, key, "application/zip")
+
+        previous = db.query(models.AccountExport).filter(
+            models.AccountExport.user_id == user.id,
+            models.AccountExport.id != job.id,
+            models.AccountExport.key.isnot(None),
+        ).all()
+        for old in previous:
+            db.delete(old)
+        job.status = "ready"
+        job.key = key
+        job.size = size
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        delete_objects([old.key for old in previous])
+    except Exception as e:
+        logger.exception(f"Account export {export_id} failed")
+        db.rollback()
+        db.query(models.AccountExport).filter(models.AccountExport.id == export_id).update(
+            {"status": "failed", "error": str(e)[:1000], "finished_at": datetime.now(timezone.utc)}
+        )
+        db.commit()
+    finally:
+        if tmp_path is not None and tmp_path.exists():
+            tmp_path.unlink()
+        db.close()
@@ -0,0 +1,276 @@
+"""
+Метрики приложения в текстовом формате Prometheus (GET /metrics).
+
+Свой небольшой реестр вместо prometheus_client: нужны только счётчики,
+гистограммы и значения, снимаемые в момент сбора. Запись на горячем пути —
+bisect по границам корзин и инкремент под локом (~1 мкс), текст собирается
+только при запросе /metrics (bench_app_metrics.py меряет накладные расходы).
+
+Метрики живут в памяти процесса: при нескольких воркерах uvicorn каждый
+отдаёт свои, и Prometheus должен опрашивать их по отдельности.
+
+- http_request_duration_seconds{method,route,status} — MetricsMiddleware;
+  route — шаблон пути FastAPI ("/api/clients/{client_id}"), а не сам путь;
+- http_requests_in_flight;
+- db_pool_* — состояние пула engine и ожидание соединения
+  (InstrumentedQueuePool в app/database.py);
+- cache_lookups_total{cache,result} — попадания и промахи кэшей;
+- outbound_request_duration_seconds{service,status} — SMS и Telegram Gateway.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # charset добавляет PlainTextResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackGauge(_Metric):
+    """Значение читается функцией в момент сбора (состояние пула соединений)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._callback: Optional[Callable[[], Dict[Labels, float]]] = None
+
+    def set_function(self, callback: Callable[[], Dict[Labels, float]]) -> None:
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        if self._callback is None:
+            return []
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in self._callback().items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (последняя — +Inf), сумма]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, labels: Labels = ()) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        samples = metric.samples()
+        if samples:
+            lines.extend(metric.header())
+            lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being processed.")
+
+DB_POOL_SIZE = CallbackGauge("db_pool_size", "Configured pool size (pool_size).")
+DB_POOL_CHECKED_OUT = CallbackGauge("db_pool_checked_out", "Connections currently checked out.")
+DB_POOL_OVERFLOW = CallbackGauge("db_pool_overflow", "Overflow connections above pool_size (negative while the pool is not full).")
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool.")
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pool connection.", buckets=POOL_WAIT_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_checkout_timeouts_total", "Pool checkouts that hit pool_timeout.")
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "In-process cache lookups by result (hit/miss).", ("cache", "result"))
+
+OUTBOUND_DURATION = Histogram(
+    "outbound_request_duration_seconds", "Latency of calls to external services (SMS, Telegram Gateway).",
+    ("service", "status"),
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc((cache, "hit" if hit else "miss"))
+
+
+class _OutboundCall:
+    status = "error"  # код ответа; "error" — исключение до ответа
+
+
+@contextmanager
+def outbound_call(service: str) -> Iterator[_OutboundCall]:
+    """with outbound_call("smsc") as call: response = ...; call.status = response.status_code"""
+    call = _OutboundCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        OUTBOUND_DURATION.observe(time.perf_counter() - started, (service, str(call.status)))
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который меряет ожидание свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+        DB_POOL_CHECKOUTS.inc()
+        return connection
+
+
+def register_pool(pool) -> None:
+    """Отдавать состояние пула engine в db_pool_* при сборе метрик."""
+    if not isinstance(pool, QueuePool):
+        return
+    DB_POOL_SIZE.set_function(lambda: {(): pool.size()})
+    DB_POOL_CHECKED_OUT.set_function(lambda: {(): pool.checkedout()})
+    DB_POOL_OVERFLOW.set_function(lambda: {(): pool.overflow()})
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентность по шаблону маршрута и число запросов в работе."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # Несовпавшие пути — одной меткой, чтобы сканеры не раздували число рядов
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started, (scope["method"], template, str(status_code))
+            )
@@ -0,0 +1,216 @@
+"""
+Карточка клиента для тренера (GET /clients/{id}/overview).
+
+Раньше экран собирался из восьми запросов к API, и каждый заново проверял
+токен и принадлежность клиента. Здесь проверка делается один раз, а каждый
+раздел читается фиксированным числом SQL-запросов, не зависящим от объёма
+данных клиента (связанные объекты не подгружаются лениво):
+profile — 0 (строка клиента уже прочитана проверкой), stats — 5,
+onboarding — 1, body_metrics — 2, programs, notes, workouts — по 1.
+
+Список клиентов со сводкой (roster_with_summary) — один запрос: по каждому
+клиенту LATERAL-подзапросы к индексам ix_workouts_user_start и
+ix_payments_active_packages, вместо /clients/{id}/stats на каждую строку.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, func, select, true
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.services import onboarding_store
+
+OVERVIEW_SECTIONS = ("profile", "stats", "onboarding", "body_metrics", "programs", "notes", "workouts")
+STATS_PERIODS = {"7d": 7, "14d": 14, "30d": 30}
+
+
+def parse_sections(include: Optional[str]) -> tuple:
+    """Разделы из параметра include ("stats,notes"); пусто — все. ValueError на неизвестный раздел."""
+    if not include:
+        return OVERVIEW_SECTIONS
+    sections = tuple(dict.fromkeys(part.strip() for part in include.split(",") if part.strip()))
+    unknown = [section for section in sections if section not in OVERVIEW_SECTIONS]
+    if unknown:
+        raise ValueError(f"Неизвестные разделы: {', '.join(unknown)}")
+    return sections
+
+
+def client_stats(db: Session, client_id: str, period: str) -> schemas.DashboardStats:
+    """Статистика клиента за период (7d, 14d, 30d; иное — 7d)."""
+    today = datetime.now()
+    start_date = today - timedelta(days=STATS_PERIODS.get(period, 7))
+    today_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = today.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+    in_period = and_(models.Workout.start >= start_date, models.Workout.start <= today)
+    # Все счётчики — одним проходом по индексу (user_id, start)
+    counts = db.query(
+        func.count(models.Workout.id).filter(in_period).label("total"),
+        func.count(models.Workout.id).filter(
+            in_period, models.Workout.attendance == models.AttendanceStatus.COMPLETED
+        ).label("completed"),
+        func.count(models.Workout.id).filter(
+            models.Workout.start >= today_start, models.Workout.start <= today_end
+        ).label("today"),
+    ).filter(models.Workout.user_id == client_id).one()
+
+    next_workout = db.query(models.Workout).filter(
+        models.Workout.user_id == client_id,
+        models.Workout.start >= today,
+    ).order_by(models.Workout.start.asc()).first()
+
+    last_workout = db.query(models.Workout).filter(
+        models.Workout.user_id == client_id,
+        models.Workout.start < today,
+    ).order_by(models.Workout.start.desc()).first()
+
+    user_goal = db.query(models.UserGoal).filter(
+        models.UserGoal.user_id == client_id
+    ).order_by(models.UserGoal.created_at.desc()).first()
+
+    goal_response = None
+    if user_goal:
+        days_left = (user_goal.target_date.date() - today.date()).days
+        goal_response = schemas.GoalResponse(
+            headline=user_goal.headline,
+            description=user_goal.description,
+            milestone=user_goal.milestone,
+            days_left=days_left if days_left > 0 else 0,
+            progress=user_goal.progress
+        )
+
+    photos = db.query(models.ProgressPhoto).filter(
+        models.ProgressPhoto.user_id == client_id
+    ).order_by(models.ProgressPhoto.date.desc()).limit(4).all()
+
+    total = counts.total or 0
+    completed = counts.completed or 0
+    attendance_rate = (completed / total * 100) if total > 0 else 0
+    return schemas.DashboardStats(
+        total_workouts=total,
+        completed_workouts=completed,
+        attendance_rate=round(attendance_rate, 2),
+        today_workouts=counts.today or 0,
+        next_workout=next_workout,
+        last_workout=last_workout,
+        goal=goal_response,
+        progress_photos=photos
+    )
+
+
+def build_overview(
+    db: Session,
+    trainer: models.User,
+    client: models.User,
+    sections: Iterable[str],
+    period: str = "7d",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> schemas.ClientOverview:
+    """Собрать выбранные разделы карточки; принадлежность клиента тренеру уже проверена."""
+    sections = list(sections)
+    overview = {"client_id": client.id, "sections": sections}
+
+    if "profile" in sections:
+        overview["profile"] = client
+    if "stats" in sections:
+        overview["stats"] = client_stats(db, client.id, period)
+    if "onboarding" in sections:
+        overview["onboarding"] = onboarding_store.get_onboarding(db, client.id)
+    if "body_metrics" in sections:
+        overview["body_metrics"] = db.query(models.BodyMetric).filter(
+            models.BodyMetric.user_id == client.id
+        ).all()
+        # Последняя запись каждой метрики (DISTINCT ON), как /metrics/body/entries?latest=true
+        overview["body_metric_latest_entries"] = db.query(models.BodyMetricEntry).join(
+            models.BodyMetric, models.BodyMetric.id == models.BodyMetricEntry.metric_id
+        ).filter(
+            models.BodyMetric.user_id == client.id
+        ).distinct(models.BodyMetricEntry.metric_id).order_by(
+            models.BodyMetricEntry.metric_id, models.BodyMetricEntry.recorded_at.desc()
+        ).all()
+    if "programs" in sections:
+        overview["programs"] = db.query(models.TrainingProgram).filter(
+            models.TrainingProgram.user_id == client.id
+        ).all()
+    if "notes" in sections:
+        overview["notes"] = db.query(models.TrainerNote).filter(
+            models.TrainerNote.trainer_id == trainer.id,
+            models.TrainerNote.client_id == client.id,
+        ).order_by(models.TrainerNote.updated_at.desc()).all()
+    if "workouts" in sections:
+        query = db.query(models.Workout).filter(models.Workout.user_id == client.id)
+        if start_date:
+            query = query.filter(models.Workout.start >= start_date)
+        if end_date:
+            query = query.filter(models.Workout.start <= end_date)
+        overview["workouts"] = query.order_by(models.Workout.start).all()
+    return schemas.ClientOverview(**overview)
+
+
+def roster_with_summary(
+    db: Session, trainer_id: str, search: Optional[str] = None, period: str = "7d"
+) -> List[schemas.ClientRosterEntry]:
+    """Клиенты тренера со сводкой (посещаемость за период, ближайшая тренировка, пакет)."""
+    today = datetime.now()
+    start_date = today - timedelta(days=STATS_PERIODS.get(period, 7))
+    workout = models.Workout
+    client_workouts = workout.user_id == models.User.id
+
+    counts = select(
+        func.count(workout.id).label("total"),
+        func.count(workout.id).filter(
+            workout.attendance == models.AttendanceStatus.COMPLETED
+        ).label("completed"),
+    ).where(
+        client_workouts, workout.start >= start_date, workout.start <= today
+    ).lateral("counts")
+    next_workout = select(workout.id, workout.start).where(
+        client_workouts, workout.start >= today
+    ).order_by(workout.start.asc()).limit(1).lateral("next_workout")
+    last_workout = select(workout.start).where(
+        client_workouts, workout.start < today
+    ).order_by(workout.start.desc()).limit(1).lateral("last_workout")
+    # Условие совпадает с частичным индексом ix_payments_active_packages
+    packages = select(
+        func.sum(models.Payment.remaining_sessions).label("remaining")
+    ).where(
+        models.Payment.client_id == models.User.id,
+        models.Payment.type == models.PaymentType.PACKAGE,
+        models.Payment.remaining_sessions > 0,
+    ).lateral("packages")
+
+    query = db.query(
+        models.User,
+        counts.c.total,
+        counts.c.completed,
+        next_workout.c.id.label("next_workout_id"),
+        next_workout.c.start.label("next_workout_start"),
+        last_workout.c.start.label("last_workout_start"),
+        packages.c.remaining,
+    ).select_from(models.User).join(counts, true()).outerjoin(next_workout, true()).outerjoin(
+        last_workout, true()
+    ).join(packages, true()).filter(models.User.trainer_id == trainer_id)
+    if search:
+        query = query.filter(models.User.full_name.ilike(f"%{search}%"))
+
+    roster = []
+    for row in query:
+        client = row[0]
+        total = row.total or 0
+        completed = row.completed or 0
+        entry = schemas.ClientRosterEntry.model_validate(client)
+        entry.summary = schemas.ClientSummary(
+            total_workouts=total,
+            completed_workouts=completed,
+            attendance_rate=round(completed / total * 100, 2) if total > 0 else 0,
+            next_workout_id=row.next_workout_id,
+            next_workout_start=row.next_workout_start,
+            last_workout_start=row.last_workout_start,
+            workouts_package=client.workouts_package,
+            package_remaining_sessions=row.remaining,
+            package_expiry_date=client.package_expiry_date,
+        )
+        roster.append(entry)
+    return roster
@@ -0,0 +1,292 @@
+"""
+Аналитика упражнений: расчётный 1ПМ, тоннаж по тренировкам и неделям,
+личные рекорды.
+
+- e1RM по формуле Эпли: вес × (1 + повторения / 30), для 1 повторения — сам вес;
+- тоннаж записи: вес × повторения × подходы (пустые повторения/подходы = 1);
+- тренировка — календарный день записи (UTC), неделя начинается с понедельника;
+- рекорд — запись, чей e1RM выше всех предыдущих по этой метрике.
+
+Записи читаются колонками одним запросом на все метрики и считаются NumPy.
+Результат кэшируется в памяти воркера по каждой метрике. При запросе один
+агрегирующий запрос (count, max(created_at)) показывает, появились ли новые
+записи; если они только дописаны после уже учтённых — досчитывается лишь
+хвост, иначе (удаление, запись задним числом) метрика пересчитывается целиком.
+"""
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.app_metrics import record_cache_lookup
+
+SECONDS_PER_DAY = 86400
+EPOCH = date(1970, 1, 1)
+CACHE_MAX_METRICS = 5000
+
+
+@dataclass
+class MetricAnalytics:
+    exercise_metric_id: str
+    entries_count: int = 0
+    watermark: Optional[datetime] = None  # max(created_at) учтённых записей
+    last_ts: float = -math.inf  # дата последней учтённой записи (epoch)
+    best_e1rm: float = -math.inf
+    best_weight: float = -math.inf
+    last_e1rm: Optional[float] = None
+    total_tonnage: float = 0.0
+    sessions: Dict[int, List[float]] = field(default_factory=dict)  # день -> [тоннаж, лучший e1RM]
+    weeks: Dict[int, float] = field(default_factory=dict)  # день-понедельник -> тоннаж
+    personal_records: List[dict] = field(default_factory=list)
+
+    def to_dict(self, detail: bool = True) -> dict:
+        result = {
+            "exercise_metric_id": self.exercise_metric_id,
+            "entries_count": self.entries_count,
+            "best_e1rm": _finite(self.best_e1rm),
+            "best_weight": _finite(self.best_weight),
+            "last_e1rm": self.last_e1rm,
+            "total_tonnage": round(self.total_tonnage, 2),
+            "last_pr_date": self.personal_records[-1]["date"] if self.personal_records else None,
+        }
+        if detail:
+            result["sessions"] = [
+                {"date": _day_to_date(day), "tonnage": round(tonnage, 2), "best_e1rm": _finite(best)}
+                for day, (tonnage, best) in sorted(self.sessions.items())
+            ]
+            result["weeks"] = [
+                {"week_start": _day_to_date(day), "tonnage": round(tonnage, 2)}
+                for day, tonnage in sorted(self.weeks.items())
+            ]
+            result["personal_records"] = list(self.personal_records)
+        return result
+
+
+def _finite(value: float) -> Optional[float]:
+    return round(float(value), 2) if np.isfinite(value) else None
+
+
+def _day_to_date(day: int) -> date:
+    return EPOCH + timedelta(days=int(day))
+
+
+def estimate_1rm(weight: np.ndarray, reps: np.ndarray) -> np.ndarray:
+    """e1RM по Эпли; NaN, если веса нет."""
+    return np.where(reps <= 1, weight, weight * (1 + reps / 30.0))
+
+
+def accumulate(state: MetricAnalytics, ts: np.ndarray, weight: np.ndarray,
+               reps: np.ndarray, sets: np.ndarray) -> None:
+    """Добавить к состоянию записи, отсортированные по дате и не раньше state.last_ts."""
+    if len(ts) == 0:
+        return
+    reps = np.where(np.isnan(reps), 1.0, reps)
+    sets = np.where(np.isnan(sets), 1.0, sets)
+    e1rm = estimate_1rm(weight, reps)
+    e1rm_filled = np.where(np.isnan(e1rm), -np.inf, e1rm)
+    tonnage = np.nan_to_num(weight * reps * sets)
+
+    days = (ts // SECONDS_PER_DAY).astype(np.int64)
+    # 1970-01-01 — четверг: (day + 3) % 7 == 0 для понедельника
+    week_starts = days - (days + 3) % 7
+
+    uniq_days, day_idx = np.unique(days, return_inverse=True)
+    day_tonnage = np.bincount(day_idx, weights=tonnage)
+    day_best = np.full(len(uniq_days), -np.inf)
+    np.maximum.at(day_best, day_idx, e1rm_filled)
+    for day, ton, best in zip(uniq_days.tolist(), day_tonnage.tolist(), day_best.tolist()):
+        session = state.sessions.setdefault(day, [0.0, -math.inf])
+        session[0] += ton
+        session[1] = max(session[1], best)
+
+    uniq_weeks, week_idx = np.unique(week_starts, return_inverse=True)
+    for week, ton in zip(uniq_weeks.tolist(), np.bincount(week_idx, weights=tonnage).tolist()):
+        state.weeks[week] = state.weeks.get(week, 0.0) + ton
+
+    # Рекорд: e1RM выше максимума всех предыдущих записей (включая уже учтённые)
+    running = np.maximum.accumulate(np.concatenate(([state.best_e1rm], e1rm_filled)))[:-1]
+    for i in np.flatnonzero(e1rm_filled > running).tolist():
+        state.personal_records.append({
+            "date": datetime.fromtimestamp(ts[i], tz=timezone.utc),
+            "e1rm": round(float(e1rm[i]), 2),
+            "weight": float(weight[i]),
+            "repetitions": int(reps[i]),
+        })
+
+    state.best_e1rm = max(state.best_e1rm, float(e1rm_filled.max()))
+    state.best_weight = max(state.best_weight, float(np.nan_to_num(weight, nan=-np.inf).max()))
+    valid = np.flatnonzero(~np.isnan(e1rm))
+    if len(valid):
+        state.last_e1rm = round(float(e1rm[valid[-1]]), 2)
+    state.total_tonnage += float(tonnage.sum())
+    state.entries_count += len(ts)
+    state.last_ts = float(ts[-1])
+
+
+class AnalyticsCache:
+    """LRU-кэш exercise_metric_id -> MetricAnalytics."""
+
+    def __init__(self, max_items: int):
+        self._max_items = max_items
+        self._items: "OrderedDict[str, MetricAnalytics]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, metric_id: str) -> Optional[MetricAnalytics]:
+        with self._lock:
+            state = self._items.get(metric_id)
+            if state is not None:
+                self._items.move_to_end(metric_id)
+        record_cache_lookup("exercise_analytics", state is not None)
+        return state
+
+    def set(self, state: MetricAnalytics) -> None:
+        with self._lock:
+            self._items[state.exercise_metric_id] = state
+            self._items.move_to_end(state.exercise_metric_id)
+            while len(self._items) > self._max_items:
+                self._items.popitem(last=False)
+
+    def invalidate(self, metric_id: str) -> None:
+        with self._lock:
+            self._items.pop(metric_id, None)
+
+
+cache = AnalyticsCache(CACHE_MAX_METRICS)
+
+
+EMPTY_COLUMNS = (np.empty(0), np.empty(0), np.empty(0), np.empty(0), None)
+
+
+def _fetch_columns(db: Session, full: List[str], since: Dict[str, datetime]) -> Dict[str, tuple]:
+    """
+    Записи метрик колонками (ts, weight, reps, sets, max created_at), по (метрика, дата).
+    Для метрик full — все записи, для метрик из since — только created_at > since[id].
+    """
+    Entry = models.ExerciseMetricEntry
+    conditions = [Entry.exercise_metric_id.in_(full)] if full else []
+    conditions += [
+        and_(Entry.exercise_metric_id == metric_id, Entry.created_at > watermark)
+        for metric_id, watermark in since.items()
+    ]
+    if not conditions:
+        return {}
+    rows = db.query(
+        Entry.exercise_metric_id,
+        Entry.created_at,
+        func.extract("epoch", Entry.date),
+        Entry.weight,
+        Entry.repetitions,
+        Entry.sets,
+    ).filter(or_(*conditions)).order_by(Entry.exercise_metric_id, Entry.date).all()
+    if not rows:
+        return {}
+
+    ids = np.array([row[0] for row in rows], dtype=object)
+    created = [row[1] for row in rows]
+    ts = np.array([row[2] for row in rows], dtype=np.float64)
+    weight = np.array([row[3] for row in rows], dtype=np.float64)
+    reps = np.array([row[4] for row in rows], dtype=np.float64)
+    sets = np.array([row[5] for row in rows], dtype=np.float64)
+
+    # Строки отсортированы по метрике: границы групп — места смены id
+    bounds = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    starts = np.concatenate(([0], bounds)).tolist()
+    ends = np.concatenate((bounds, [len(ids)])).tolist()
+    return {
+        ids[lo]: (ts[lo:hi], weight[lo:hi], reps[lo:hi], sets[lo:hi],
+                  max((c for c in created[lo:hi] if c is not None), default=None))
+        for lo, hi in zip(starts, ends)
+    }
+
+
+def get_metric_analytics(db: Session, metric_ids: Iterable[str]) -> Dict[str, MetricAnalytics]:
+    """Аналитика по метрикам; пересчитываются только метрики с новыми записями."""
+    Entry = models.ExerciseMetricEntry
+    metric_ids = list(dict.fromkeys(metric_ids))
+    if not metric_ids:
+        return {}
+
+    fingerprints = {
+        metric_id: (count, watermark)
+        for metric_id, count, watermark in db.query(
+            Entry.exercise_metric_id, func.count(), func.max(Entry.created_at)
+        ).filter(Entry.exercise_metric_id.in_(metric_ids)).group_by(Entry.exercise_metric_id)
+    }
+
+    result: Dict[str, MetricAnalytics] = {}
+    incremental: Dict[str, MetricAnalytics] = {}
+    full: List[str] = []
+    for metric_id in metric_ids:
+        count, watermark = fingerprints.get(metric_id, (0, None))
+        cached = cache.get(metric_id)
+        if cached is not None and cached.entries_count == count and cached.watermark == watermark:
+            result[metric_id] = cached
+        elif count == 0:
+            result[metric_id] = MetricAnalytics(metric_id)
+            cache.set(result[metric_id])
+        elif cached is not None and cached.watermark is not None and cached.entries_count < count:
+            incremental[metric_id] = cached
+        else:
+            full.append(metric_id)
+
+    columns = _fetch_columns(db, full, {m: state.watermark for m, state in incremental.items()})
+    # Хвост годится, только если он целиком после учтённых записей и сходится по количеству
+    # (иначе было удаление или запись задним числом) — такие метрики читаются заново
+    retry = []
+    for metric_id, cached in incremental.items():
+        ts = columns.get(metric_id, EMPTY_COLUMNS)[0]
+        if not len(ts) or ts[0] < cached.last_ts or cached.entries_count + len(ts) != fingerprints[metric_id][0]:
+            retry.append(metric_id)
+    if retry:
+        columns.update(_fetch_columns(db, retry, {}))
+
+    for metric_id in full + list(incremental):
+        ts, weight, reps, sets, watermark = columns.get(metric_id, EMPTY_COLUMNS)
+        cached = incremental.get(metric_id)
+        state = _copy_state(cached) if cached is not None and metric_id not in retry else MetricAnalytics(metric_id)
+        accumulate(state, ts, weight, reps, sets)
+        if watermark is not None:
+            state.watermark = max(watermark, state.watermark) if state.watermark else watermark
+        cache.set(state)
+        result[metric_id] = state
+    return result
+
+
+def _copy_state(state: MetricAnalytics) -> MetricAnalytics:
+    """Копия, чтобы параллельный запрос не увидел наполовину обновлённое состояние."""
+    return MetricAnalytics(
+        exercise_metric_id=state.exercise_metric_id,
+        entries_count=state.entries_count,
+        watermark=state.watermark,
+        last_ts=state.last_ts,
+        best_e1rm=state.best_e1rm,
+        best_weight=state.best_weight,
+        last_e1rm=state.last_e1rm,
+        total_tonnage=state.total_tonnage,
+        sessions={day: list(values) for day, values in state.sessions.items()},
+        weeks=dict(state.weeks),
+        personal_records=list(state.personal_records),
+    )
+
+
+def get_users_analytics(db: Session, user_ids: List[str], detail: bool = True,
+                        exercise_metric_id: Optional[str] = None) -> List[dict]:
+    """Аналитика по всем метрикам упражнений пользователей (один пользователь или ростер тренера)."""
+    query = db.query(models.ExerciseMetric.id, models.ExerciseMetric.user_id, models.ExerciseMetric.label).filter(
+        models.ExerciseMetric.user_id.in_(user_ids)
+    )
+    if exercise_metric_id:
+        query = query.filter(models.ExerciseMetric.id == exercise_metric_id)
+    metrics = query.order_by(models.ExerciseMetric.user_id, models.ExerciseMetric.label).all()
+    analytics = get_metric_analytics(db, [m.id for m in metrics])
+    return [
+        {**analytics[m.id].to_dict(detail), "user_id": m.user_id, "label": m.label}
+        for m in metrics
+    ]
@@ -0,0 +1,141 @@
+"""
+Прореживание временных рядов метрик для графиков.
+
+Два способа:
+- bucket — агрегаты по интервалам (min/max/avg/last/count) считаются в SQL;
+  интервал — календарный (day/week/month, date_trunc) или равный
+  (диапазон / max_points, тогда точек не больше max_points);
+- lttb — Largest-Triangle-Three-Buckets: из исходных точек выбираются
+  max_points, сохраняющих форму линии. Точки читаются двумя колонками
+  и обрабатываются NumPy.
+
+Если точек не больше max_points, ряд возвращается без изменений.
+"""
+import math
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from sqlalchemy.orm import Session
+
+CALENDAR_RESOLUTIONS = ("day", "week", "month")
+DEFAULT_MAX_POINTS = 300
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Индексы точек, выбранных LTTB. x должен быть отсортирован."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Границы n_out - 2 внутренних корзин (первая и последняя точки берутся всегда)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Средние по корзинам — разом через накопленные суммы
+    cx, cy = np.cumsum(x), np.cumsum(y)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    avg_x = (cx[ends - 1] - cx[starts - 1]) / counts
+    avg_y = (cy[ends - 1] - cy[starts - 1]) / counts
+    # Для последней корзины «следующая» — последняя точка ряда
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = starts[i], ends[i]
+        # Удвоенная площадь треугольника (prev, кандидат, среднее следующей корзины)
+        area = np.abs(
+            (x[prev] - next_x[i]) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (next_y[i] - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def _bounds(db: Session, time_col, filters) -> tuple:
+    return db.query(func.count(), func.min(time_col), func.max(time_col)).filter(*filters).one()
+
+
+def _raw_points(db: Session, time_col, value_col, filters) -> List[dict]:
+    rows = db.query(time_col, value_col).filter(*filters).order_by(time_col).all()
+    return [
+        {"timestamp": t, "value": v, "min": v, "max": v, "avg": v, "count": 1}
+        for t, v in rows
+    ]
+
+
+def bucket_series(
+    db: Session,
+    time_col,
+    value_col,
+    filters: list,
+    resolution: Optional[str] = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+) -> dict:
+    """Агрегаты по интервалам, посчитанные в БД. value в точке — последнее значение интервала."""
+    filters = [*filters, value_col.isnot(None)]
+    count, first, last = _bounds(db, time_col, filters)
+    if not count:
+        return {"method": "bucket", "resolution": resolution, "points": []}
+
+    if resolution in CALENDAR_RESOLUTIONS:
+        bucket = func.date_trunc(resolution, time_col)
+    else:
+        if count <= max_points:
+            return {"method": "raw", "resolution": None, "points": _raw_points(db, time_col, value_col, filters)}
+        # Интервалы отсчитываются от первой точки; span / width < max_points,
+        # поэтому номер интервала последней точки — не больше max_points - 1
+        width = math.floor((last - first).total_seconds() / max_points) + 1
+        resolution = f"{width}s"
+        first_epoch = first.timestamp()
+        bucket = func.to_timestamp(
+            first_epoch + func.floor((func.extract("epoch", time_col) - first_epoch) / width) * width
+        )
+
+    bucket = bucket.label("bucket")
+    rows = db.query(
+        bucket,
+        func.min(value_col),
+        func.max(value_col),
+        func.avg(value_col),
+        array_agg(aggregate_order_by(value_col, time_col.desc()))[1],
+        func.count(),
+    ).filter(*filters).group_by(bucket).order_by(bucket).all()
+    return {
+        "method": "bucket",
+        "resolution": resolution,
+        "points": [
+            {"timestamp": t, "value": last_v, "min": min_v, "max": max_v, "avg": float(avg_v), "count": n}
+            for t, min_v, max_v, avg_v, last_v, n in rows
+        ],
+    }
+
+
+def lttb_series(
+    db: Session,
+    time_col,
+    value_col,
+    filters: list,
+    max_points: int = DEFAULT_MAX_POINTS,
+) -> dict:
+    """Ряд, прореженный LTTB до max_points исходных точек."""
+    filters = [*filters, value_col.isnot(None)]
+    rows = db.query(func.extract("epoch", time_col), value_col).filter(*filters).order_by(time_col).all()
+    if not rows:
+        return {"method": "lttb", "resolution": None, "points": []}
+    data = np.array(rows, dtype=np.float64)
+    x, y = data[:, 0], data[:, 1]
+    idx = lttb_indices(x, y, max_points)
+    return {
+        "method": "lttb",
+        "resolution": None,
+        "points": [
+            {"timestamp": datetime.fromtimestamp(x[i], tz=timezone.utc), "value": float(y[i])}
+            for i in idx.tolist()
+        ],
+    }
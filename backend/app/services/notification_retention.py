@@ -0,0 +1,233 @@
+"""
+Хранение уведомлений: помесячные партиции и сроки хранения по типам.
+
+Таблица notifications секционирована по created_at (RANGE, одна партиция на
+месяц, плюс notifications_default для строк вне диапазонов). Обслуживание:
+- ensure_partitions() создаёт партиции на текущий и ближайшие месяцы;
+- purge_expired() удаляет уведомления, у типа которых срок хранения короче
+  максимального (пачками, чтобы не держать длинные блокировки);
+- detach_expired_partitions() отсоединяет и удаляет месячные партиции,
+  целиком вышедшие за максимальный срок хранения.
+
+На несекционированной таблице (миграция не применена) работает только
+purge_expired() — как обычная «скользящая» очистка.
+
+Запуск по расписанию: python maintain_notifications.py
+"""
+import json
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+TABLE = "notifications"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME_RE = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+
+# Сколько месяцев вперёд держать готовые партиции
+PARTITION_MONTHS_AHEAD = int(os.getenv("NOTIFICATIONS_PARTITION_MONTHS_AHEAD", "3"))
+PURGE_BATCH_SIZE = 5000
+
+# ── Сроки хранения (дни) ──────────────────────────────────────────────────────
+# Ключ None — срок для типов, не перечисленных явно.
+# Переопределяется JSON в NOTIFICATIONS_RETENTION_DAYS, например:
+#   {"default": 365, "workout_rescheduled": 90}
+
+RETENTION_DAYS: Dict[Optional[str], int] = {
+    None: 365,
+    "workout_rescheduled": 180,
+}
+
+
+def _load_retention_overrides() -> None:
+    raw = os.getenv("NOTIFICATIONS_RETENTION_DAYS")
+    if not raw:
+        return
+    try:
+        overrides = json.loads(raw)
+    except ValueError:
+        logger.warning("NOTIFICATIONS_RETENTION_DAYS is not valid JSON, using defaults")
+        return
+    for key, days in overrides.items():
+        RETENTION_DAYS[None if key == "default" else key] = int(days)
+
+
+_load_retention_overrides()
+
+
+def get_retention_days(notification_type: Optional[str]) -> int:
+    """Срок хранения для типа уведомления."""
+    return RETENTION_DAYS.get(notification_type, RETENTION_DAYS[None])
+
+
+def max_retention_days() -> int:
+    return max(RETENTION_DAYS.values())
+
+
+# ── Партиции ─────────────────────────────────────────────────────────────────
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _add_months(d: date, months: int) -> date:
+    month_index = d.year * 12 + d.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :table AND pg_table_is_visible(c.oid)
+    """), {"table": TABLE}).scalar())
+
+
+def list_partitions(conn: Connection) -> List[str]:
+    rows = conn.execute(text("""
+        SELECT child.relname FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)
+    """), {"table": TABLE})
+    return [row[0] for row in rows]
+
+
+def create_month_partition(conn: Connection, month: date) -> bool:
+    """
+    Создать партицию на месяц. Строки этого месяца, успевшие попасть
+    в default-партицию, переносятся в новую перед ATTACH.
+    Возвращает False, если партиция уже есть.
+    """
+    name = partition_name(month)
+    if name in list_partitions(conn):
+        return False
+    start = month.isoformat()
+    end = _add_months(month, 1).isoformat()
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} "
+        f"(LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    if DEFAULT_PARTITION in list_partitions(conn):
+        conn.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE created_at >= :start AND created_at < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """), {"start": f"{start} 00:00:00+00", "end": f"{end} 00:00:00+00"})
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00')"
+    ))
+    logger.info(f"Created notifications partition {name}")
+    return True
+
+
+def ensure_partitions(
+    conn: Connection,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    since: Optional[date] = None,
+) -> List[str]:
+    """Создать недостающие партиции с месяца since (по умолчанию — текущего) на months_ahead вперёд."""
+    if not is_partitioned(conn):
+        return []
+    if DEFAULT_PARTITION not in list_partitions(conn):
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    current = _month_start(datetime.now(timezone.utc).date())
+    month = _month_start(since) if since else current
+    last = _add_months(current, months_ahead)
+    created = []
+    while month <= last:
+        if create_month_partition(conn, month):
+            created.append(partition_name(month))
+        month = _add_months(month, 1)
+    return created
+
+
+def detach_expired_partitions(conn: Connection, keep_detached: bool = False) -> List[str]:
+    """
+    Отсоединить месячные партиции, все строки которых старше максимального
+    срока хранения. По умолчанию отсоединённая таблица удаляется.
+    """
+    if not is_partitioned(conn):
+        return []
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=max_retention_days())).date()
+    detached = []
+    for name in sorted(list_partitions(conn)):
+        match = PARTITION_NAME_RE.match(name)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if _add_months(month, 1) > cutoff:
+            continue
+        conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        if not keep_detached:
+            conn.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+        logger.info(f"Detached notifications partition {name}")
+    return detached
+
+
+# ── Очистка по типам ─────────────────────────────────────────────────────────
+
+def _purge_batches(conn: Connection, where: str, params: dict) -> int:
+    total = 0
+    while True:
+        deleted = conn.execute(text(f"""
+            DELETE FROM {TABLE}
+            WHERE (id, created_at) IN (
+                SELECT id, created_at FROM {TABLE} WHERE {where} LIMIT :batch
+            )
+        """), {**params, "batch": PURGE_BATCH_SIZE}).rowcount
+        conn.commit()
+        total += deleted
+        if deleted < PURGE_BATCH_SIZE:
+            return total
+
+
+def purge_expired(conn: Connection) -> Dict[str, int]:
+    """
+    Удалить уведомления старше срока хранения их типа.
+    Типы со сроком, равным максимальному, на секционированной таблице
+    уходят вместе с партициями, но чистятся и здесь — для default-партиции
+    и несекционированной таблицы.
+    """
+    now = datetime.now(timezone.utc)
+    explicit_types = [t for t in RETENTION_DAYS if t is not None]
+    result = {}
+    for notification_type in explicit_types:
+        cutoff = now - timedelta(days=RETENTION_DAYS[notification_type])
+        result[notification_type] = _purge_batches(
+            conn, "type = :type AND created_at < :cutoff",
+            {"type": notification_type, "cutoff": cutoff},
+        )
+    where = "created_at < :cutoff"
+    params = {"cutoff": now - timedelta(days=RETENTION_DAYS[None])}
+    if explicit_types:
+        placeholders = ", ".join(f":type_{i}" for i in range(len(explicit_types)))
+        where += f" AND type NOT IN ({placeholders})"
+        params.update({f"type_{i}": t for i, t in enumerate(explicit_types)})
+    result["default"] = _purge_batches(conn, where, params)
+    return result
+
+
+def run_maintenance(conn: Connection, months_ahead: int = PARTITION_MONTHS_AHEAD, keep_detached: bool = False) -> dict:
+    """Полный цикл обслуживания: партиции вперёд, отсоединение старых, очистка по типам."""
+    created = ensure_partitions(conn, months_ahead)
+    conn.commit()
+    detached = detach_expired_partitions(conn, keep_detached)
+    conn.commit()
+    purged = purge_expired(conn)
+    return {"created": created, "detached": detached, "purged": purged}
@@ -0,0 +1,318 @@
+"""
+Сервис уведомлений.
+Создание уведомлений и доставка их подключённым клиентам в реальном времени.
+
+Схема доставки:
+- create_notification() добавляет строку в сессию и в той же транзакции
+  вызывает pg_notify, поэтому событие уходит только после commit;
+- каждый воркер держит отдельное соединение с LISTEN и раздаёт полученные
+  события своим локальным подписчикам (SSE-потокам) через NotificationHub;
+- если LISTEN недоступен (не psycopg2 / нет PostgreSQL), событие
+  раздаётся локально сразу после commit — в пределах одного воркера.
+
+Счётчик непрочитанных кэшируется в памяти воркера. Любое событие хаба, в
+том числе новое уведомление, сбрасывает запись пользователя до следующего
+COUNT по частичному индексу: прибавлять единицу нельзя, COUNT после commit
+уже учитывает уведомление. Эпоха кэша не даёт COUNT, начатому до сброса,
+записать устаревшее значение (UnreadCounterCache).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import engine
+from app.services.app_metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "notifications"
+# Лимит payload у NOTIFY — 8000 байт, оставляем запас
+NOTIFY_PAYLOAD_LIMIT = 7500
+# Размер очереди одного подписчика; медленный клиент теряет старые события
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTEN_RECONNECT_DELAY = 5
+# TTL кэша счётчика непрочитанных (страховка от пропущенных событий)
+UNREAD_CACHE_TTL = int(os.getenv("NOTIFICATIONS_UNREAD_CACHE_TTL", "60"))
+
+
+def serialize_notification(notification: models.Notification) -> dict:
+    """Преобразует уведомление в JSON-совместимый словарь (формат NotificationResponse)."""
+    return {
+        "id": notification.id,
+        "user_id": notification.user_id,
+        "sender_id": notification.sender_id,
+        "type": notification.type,
+        "title": notification.title,
+        "content": notification.content,
+        "link": notification.link,
+        "is_read": bool(notification.is_read),
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+class UnreadCounterCache:
+    """
+    Кэш user_id -> количество непрочитанных уведомлений с TTL.
+
+    Любое событие хаба (в том числе новое уведомление) сбрасывает запись:
+    прибавлять единицу нельзя — COUNT, закэшированный после commit, уже
+    учитывает это уведомление. Чтобы COUNT, начатый до сброса, не записал
+    устаревшее значение, set() принимает эпоху, прочитанную до запроса.
+    """
+
+    def __init__(self, ttl: int):
+        self._ttl = ttl
+        self._items: Dict[str, tuple] = {}
+        self._epoch = 0  # растёт с каждым сбросом
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def get(self, user_id: str) -> Optional[int]:
+        item = self._items.get(user_id)
+        if item is None:
+            record_cache_lookup("notifications_unread", False)
+            return None
+        count, expires_at = item
+        if expires_at < time.monotonic():
+            self._items.pop(user_id, None)
+            record_cache_lookup("notifications_unread", False)
+            return None
+        record_cache_lookup("notifications_unread", True)
+        return count
+
+    def set(self, user_id: str, count: int, epoch: int) -> None:
+        """Сохранить count, если с момента чтения epoch кэш не сбрасывался."""
+        if epoch == self._epoch:
+            self._items[user_id] = (count, time.monotonic() + self._ttl)
+
+    def invalidate(self, user_id: str) -> None:
+        self._epoch += 1
+        self._items.pop(user_id, None)
+
+    def apply(self, message: dict) -> None:
+        """Обновить кэш по событию хаба."""
+        self.invalidate(message.get("user_id"))
+
+
+unread_cache = UnreadCounterCache(UNREAD_CACHE_TTL)
+
+
+class NotificationHub:
+    """In-process pub/sub: user_id -> набор asyncio-очередей открытых SSE-потоков."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listen_conn = None
+        self._listen_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def listening(self) -> bool:
+        """Есть ли активное LISTEN-соединение (межворкерная доставка)."""
+        return self._listen_conn is not None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            self._subscribers.pop(user_id, None)
+
+    def dispatch(self, message: dict) -> None:
+        """Раздать событие локальным подписчикам. Потокобезопасно."""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._dispatch_now, message)
+
+    def _dispatch_now(self, message: dict) -> None:
+        unread_cache.apply(message)
+        for queue in list(self._subscribers.get(message.get("user_id"), ())):
+            if queue.full():
+                # Выбрасываем самое старое событие, чтобы не блокировать остальных
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(message)
+
+    # ── LISTEN/NOTIFY ────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        if engine.dialect.driver != "psycopg2":
+            logger.warning(
+                "Notification LISTEN disabled: driver %s is not psycopg2, "
+                "push delivery is limited to the current worker", engine.dialect.driver
+            )
+            return
+        self._listen_task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._listen_task:
+            self._listen_task.cancel()
+            try:
+                await self._listen_task
+            except asyncio.CancelledError:
+                pass
+            self._listen_task = None
+        self._close_listen_conn()
+
+    async def _listen_forever(self) -> None:
+        while not self._stopping:
+            lost = self._loop.create_future()
+            try:
+                self._open_listen_conn(lost)
+                await lost
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Notification LISTEN connection failed: {e}")
+            self._close_listen_conn()
+            if not self._stopping:
+                await asyncio.sleep(LISTEN_RECONNECT_DELAY)
+
+    def _open_listen_conn(self, lost: asyncio.Future) -> None:
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        conn = engine.dialect.dbapi.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        self._listen_conn = conn
+
+        def on_readable():
+            try:
+                conn.poll()
+            except Exception as e:
+                if not lost.done():
+                    lost.set_exception(e)
+                return
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    self._dispatch_now(json.loads(notify.payload))
+                except ValueError:
+                    logger.warning("Skipping malformed notification payload")
+
+        self._loop.add_reader(conn.fileno(), on_readable)
+        logger.info("Notification LISTEN started")
+
+    def _close_listen_conn(self) -> None:
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+        try:
+            self._loop.remove_reader(conn.fileno())
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+hub = NotificationHub()
+
+
+def _build_payload(message: dict) -> str:
+    payload = json.dumps(message, ensure_ascii=False)
+    if len(payload.encode("utf-8")) > NOTIFY_PAYLOAD_LIMIT:
+        # Длинный текст клиент дочитает через GET /api/notifications/
+        message = {**message, "data": {**message["data"], "content": None, "truncated": True}}
+        payload = json.dumps(message, ensure_ascii=False)
+    return payload
+
+
+def publish(db: Session, message: dict) -> None:
+    """
+    Опубликовать событие {"event", "user_id", "data"} для пользователя user_id.
+    Доставка происходит после commit текущей транзакции.
+    """
+    if hub.listening:
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": NOTIFY_CHANNEL, "payload": _build_payload(message)},
+        )
+        return
+
+    # Без LISTEN раздаём локально, но тоже только после успешного commit
+    outbox = db.info.get("notification_outbox")
+    if outbox is None:
+        outbox = db.info["notification_outbox"] = []
+        event.listen(db, "after_commit", _dispatch_outbox)
+        event.listen(db, "after_rollback", _discard_outbox)
+    outbox.append(message)
+
+
+def _dispatch_outbox(session: Session) -> None:
+    outbox = session.info["notification_outbox"]
+    messages, outbox[:] = list(outbox), []
+    for message in messages:
+        hub.dispatch(message)
+
+
+def _discard_outbox(session: Session) -> None:
+    """Откаченные уведомления не доставляются и не переходят в следующий commit."""
+    session.info["notification_outbox"].clear()
+
+
+def create_notification(
+    db: Session,
+    user_id: str,
+    type: str,
+    title: str,
+    content: Optional[str] = None,
+    link: Optional[str] = None,
+    sender_id: Optional[str] = None,
+) -> models.Notification:
+    """
+    Создаёт уведомление и ставит его в очередь на push-доставку.
+    commit остаётся за вызывающим кодом.
+    """
+    notification = models.Notification(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        sender_id=sender_id,
+        type=type,
+        title=title,
+        content=content,
+        link=link,
+        is_read=False,
+        created_at=datetime.now(timezone.utc),
+    )
+    db.add(notification)
+    publish(db, {"event": "notification", "user_id": user_id, "data": serialize_notification(notification)})
+    return notification
+
+
+def get_unread_count(db: Session, user_id: str) -> int:
+    """Количество непрочитанных уведомлений (кэш, иначе COUNT по частичному индексу)."""
+    count = unread_cache.get(user_id)
+    if count is None:
+        epoch = unread_cache.epoch
+        count = db.query(func.count(models.Notification.id)).filter(
+            models.Notification.user_id == user_id,
+            models.Notification.is_read == False,
+        ).scalar() or 0
+        unread_cache.set(user_id, count, epoch)
+    return count
@@ -0,0 +1,225 @@
+"""
+Импорт дневника питания из CSV (выгрузки MyFitnessPal, FatSecret и т.п.).
+
+Файл читается потоково, строка за строкой: заголовки сопоставляются по
+синонимам (COLUMN_ALIASES), разделитель определяется по первой строке.
+Ошибочные строки не прерывают импорт — они попадают в отчёт с номером строки.
+
+Дневник хранит одну запись на день, поэтому строки одного дня (приёмы пищи)
+суммируются. Дни пишутся пачками по BATCH_SIZE: один SELECT существующих
+записей на пачку, новые — одним многострочным INSERT, существующие
+заменяются импортированными суммами (как при POST /nutrition/).
+"""
+import codecs
+import csv
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.query_stats import expect_repeats
+
+BATCH_SIZE = 1000
+MAX_ROWS = 100_000
+MAX_REPORTED_ERRORS = 100
+
+COLUMN_ALIASES = {
+    "date": ("date", "day", "дата", "день"),
+    "calories": ("calories", "kcal", "energy", "energy (kcal)", "калории", "ккал", "калорийность"),
+    "proteins": ("proteins", "protein", "protein (g)", "белки", "белок"),
+    "fats": ("fats", "fat", "fat (g)", "жиры", "жир"),
+    "carbs": ("carbs", "carbohydrates", "carbohydrates (g)", "углеводы"),
+    "notes": ("notes", "note", "meal", "заметки", "комментарий", "приём пищи", "прием пищи"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d")
+
+
+class NutritionImportError(ValueError):
+    """Файл нельзя импортировать целиком (нет нужных колонок, слишком много строк)."""
+
+
+@dataclass
+class _DayTotals:
+    calories: float = 0.0
+    proteins: Optional[float] = None
+    fats: Optional[float] = None
+    carbs: Optional[float] = None
+    notes: List[str] = field(default_factory=list)
+
+    def add(self, row: dict) -> None:
+        self.calories += row["calories"]
+        for macro in ("proteins", "fats", "carbs"):
+            if row[macro] is not None:
+                setattr(self, macro, (getattr(self, macro) or 0.0) + row[macro])
+        if row["notes"] and row["notes"] not in self.notes:
+            self.notes.append(row["notes"])
+
+
+@dataclass
+class ImportReport:
+    rows_total: int = 0
+    rows_imported: int = 0
+    days_created: int = 0
+    days_updated: int = 0
+    errors_count: int = 0
+    errors: List[dict] = field(default_factory=list)
+
+    def error(self, row: int, message: str) -> None:
+        self.errors_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+
+def _normalize(header: str) -> str:
+    return " ".join(header.strip().lower().split())
+
+
+def _map_columns(fieldnames: List[str]) -> Dict[str, str]:
+    """Поле модели -> заголовок файла."""
+    by_name = {_normalize(name): name for name in fieldnames if name}
+    columns = {}
+    for target, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in by_name:
+                columns[target] = by_name[alias]
+                break
+    missing = [name for name in ("date", "calories") if name not in columns]
+    if missing:
+        raise NutritionImportError(f"В файле нет обязательных колонок: {', '.join(missing)}")
+    return columns
+
+
+def _parse_date(value: str) -> date:
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        raise ValueError(f"Неверная дата: {value!r}")
+
+
+def _parse_number(value: Optional[str], name: str, required: bool = False) -> Optional[float]:
+    value = (value or "").strip().replace("\xa0", "").replace(" ", "").replace(",", ".")
+    if not value:
+        if required:
+            raise ValueError(f"Не указано поле {name}")
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"Неверное значение {name}: {value!r}")
+    if number < 0 or number != number or number == float("inf"):
+        raise ValueError(f"Неверное значение {name}: {value!r}")
+    return number
+
+
+def _parse_row(raw: dict, columns: Dict[str, str]) -> dict:
+    notes = raw.get(columns["notes"]) if "notes" in columns else None
+    return {
+        "date": _parse_date(raw.get(columns["date"]) or ""),
+        "calories": _parse_number(raw.get(columns["calories"]), "calories", required=True),
+        "proteins": _parse_number(raw.get(columns.get("proteins", "")), "proteins"),
+        "fats": _parse_number(raw.get(columns.get("fats", "")), "fats"),
+        "carbs": _parse_number(raw.get(columns.get("carbs", "")), "carbs"),
+        "notes": notes.strip() if notes else None,
+    }
+
+
+def _open_csv(fileobj: BinaryIO) -> csv.DictReader:
+    # utf-8-sig снимает BOM, который добавляет Excel
+    text = codecs.getreader("utf-8-sig")(fileobj, errors="replace")
+    first_line = text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.DictReader(_chain(first_line, text), dialect=dialect)
+
+
+def _chain(first_line: str, rest: Iterable[str]) -> Iterator[str]:
+    yield first_line
+    yield from rest
+
+
+def _write_batch(db: Session, user_id: str, tz: ZoneInfo, days: Dict[date, _DayTotals], report: ImportReport) -> None:
+    entry = models.NutritionEntry
+
+    def day_start(day: date) -> datetime:
+        return datetime.combine(day, time.min, tzinfo=tz)
+
+    first, last = min(days), max(days)
+
+    existing: Dict[date, str] = {}
+    for entry_id, entry_date in db.query(entry.id, entry.date).filter(
+        entry.user_id == user_id,
+        entry.date >= day_start(first),
+        entry.date < day_start(last + timedelta(days=1)),
+    ):
+        local_day = entry_date.astimezone(tz).date()
+        if local_day in days:
+            existing.setdefault(local_day, entry_id)
+
+    new_rows, updated_rows = [], []
+    for day, totals in days.items():
+        values = {
+            "calories": round(totals.calories, 2),
+            "proteins": round(totals.proteins, 2) if totals.proteins is not None else None,
+            "fats": round(totals.fats, 2) if totals.fats is not None else None,
+            "carbs": round(totals.carbs, 2) if totals.carbs is not None else None,
+            "notes": "; ".join(totals.notes)[:2000] or None,
+        }
+        if day in existing:
+            updated_rows.append({"id": existing[day], **values})
+        else:
+            new_rows.append({"id": str(uuid.uuid4()), "user_id": user_id, "date": day_start(day), **values})
+
+    if new_rows:
+        db.execute(insert(entry).values(new_rows))
+    if updated_rows:
+        # executemany по первичному ключу
+        db.execute(update(entry), updated_rows)
+    report.days_created += len(new_rows)
+    report.days_updated += len(updated_rows)
+
+
+def import_nutrition_csv(db: Session, user_id: str, timezone: str, fileobj: BinaryIO) -> ImportReport:
+    """
+    Импортировать CSV в дневник пользователя. День строки — дата в его часовом поясе,
+    запись сохраняется на начало этого дня. Коммит делает вызывающий код.
+    """
+    tz = ZoneInfo(timezone)
+    reader = _open_csv(fileobj)
+    columns = _map_columns(reader.fieldnames or [])
+    report = ImportReport()
+
+    days: Dict[date, _DayTotals] = {}
+    for raw in reader:
+        if not any(value.strip() for value in raw.values() if isinstance(value, str)):
+            continue
+        report.rows_total += 1
+        if report.rows_total > MAX_ROWS:
+            raise NutritionImportError(f"Слишком много строк: не больше {MAX_ROWS}")
+        try:
+            row = _parse_row(raw, columns)
+        except ValueError as e:
+            # line_num — номер строки файла (1 — заголовок)
+            report.error(reader.line_num, str(e))
+            continue
+        days.setdefault(row["date"], _DayTotals()).add(row)
+        report.rows_imported += 1
+
+    pending = sorted(days)
+    with expect_repeats():
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch = {day: days[day] for day in pending[start:start + BATCH_SIZE]}
+            _write_batch(db, user_id, tz, batch, report)
+    return report
@@ -0,0 +1,74 @@
+"""
+Чтение и запись онбординга.
+
+Цели и ограничения хранятся массивами в самой строке onboardings (раньше —
+отдельные таблицы onboarding_goals / onboarding_restrictions, перенос —
+migrate_onboarding_arrays.py). Поэтому чтение — один SELECT, а запись —
+один INSERT ... ON CONFLICT (user_id) DO UPDATE ... RETURNING, ответ
+строится из возвращённой строки без повторного чтения.
+"""
+import uuid
+from typing import Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+
+ONBOARDING_FIELDS = ("weight", "height", "age", "goals", "restrictions", "activity_level")
+
+
+def _response(row) -> schemas.OnboardingResponse:
+    return schemas.OnboardingResponse(
+        id=row.id,
+        user_id=row.user_id,
+        weight=row.weight,
+        height=row.height,
+        age=row.age,
+        goals=list(row.goals or []),
+        restrictions=list(row.restrictions or []),
+        activity_level=row.activity_level,
+        created_at=row.created_at
+    )
+
+
+def _clean(values: dict) -> dict:
+    values = {field: value for field, value in values.items() if field in ONBOARDING_FIELDS}
+    for field in ("goals", "restrictions"):
+        if field in values:
+            values[field] = list(values[field] or [])
+    return values
+
+
+def get_onboarding(db: Session, user_id: str) -> Optional[schemas.OnboardingResponse]:
+    """Онбординг пользователя; None, если не заполнен."""
+    row = db.query(models.Onboarding).filter(models.Onboarding.user_id == user_id).first()
+    return _response(row) if row else None
+
+
+def save_onboarding(db: Session, user_id: str, values: dict) -> schemas.OnboardingResponse:
+    """
+    Создать онбординг или обновить поля из values (отсутствующие ключи не
+    меняются; goals/restrictions заменяются целиком). Без commit.
+    """
+    values = _clean(values)
+    table = models.Onboarding.__table__
+    stmt = pg_insert(table).values(id=str(uuid.uuid4()), user_id=user_id, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={**{field: stmt.excluded[field] for field in values}, "updated_at": func.now()},
+    ).returning(*table.c)
+    return _response(db.execute(stmt).one())
+
+
+def update_onboarding(db: Session, user_id: str, values: dict) -> Optional[schemas.OnboardingResponse]:
+    """Обновить существующий онбординг; None, если его нет. Без commit."""
+    table = models.Onboarding.__table__
+    row = db.execute(
+        update(table)
+        .where(table.c.user_id == user_id)
+        .values(**_clean(values), updated_at=func.now())
+        .returning(*table.c)
+    ).first()
+    return _response(row) if row else None
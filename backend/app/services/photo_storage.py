@@ -0,0 +1,182 @@
+"""
+Дедупликация фото прогресса по содержимому.
+
+Каждый уникальный файл (по SHA-256) хранится один раз вместе с WebP-вариантами;
+ProgressPhoto ссылается на него ключом в url и хешем в content_hash.
+Таблица stored_blobs считает ссылки:
+- acquire_photo_blob() увеличивает счётчик существующей строки, а для нового
+  содержимого сначала кладёт файлы в хранилище и только потом вставляет строку
+  (INSERT ... ON CONFLICT DO UPDATE) — ни блокировка строки, ни транзакция не
+  держатся, пока генерируются варианты и идёт загрузка;
+- release_photo_blobs() уменьшает счётчики и возвращает ключи объектов,
+  на которые больше никто не ссылается. Удалять их — после commit.
+
+В ключе, кроме хеша, есть поколение — случайный суффикс, новый для каждой
+созданной строки. Поэтому ключ никогда не используется повторно: удаление
+объектов после commit не может задеть тот же файл, загруженный заново
+(новая строка — новый ключ), а проигравшая гонку загрузка удаляет только
+свои объекты.
+"""
+import re
+import secrets
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import models
+from app.services.photo_variants import VARIANT_SIZES, generate_variants_async, variant_url
+from app.services.storage import delete_objects, get_storage
+from app.services.upload_service import StoredUpload
+
+KEY_PREFIX = "progress_photos"
+
+# progress_photos/ab/cd/<sha256>-<поколение>[_thumb|_medium].<ext> (ключи без поколения — до его появления)
+BLOB_KEY_RE = re.compile(
+    rf"^{KEY_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<hash>[0-9a-f]{{64}})(?:-[0-9a-f]{{8}})?(?:_[a-z]+)?\.[a-z0-9]+$"
+)
+# Фото до content-addressed хранилища: progress_photos/<user_id>/<uuid>[_variant].<ext>
+LEGACY_KEY_RE = re.compile(rf"^{KEY_PREFIX}/(?P<user_id>[0-9a-f-]{{36}})/[0-9a-f-]{{36}}(?:_[a-z]+)?\.[a-z0-9]+$")
+
+
+def blob_key(sha256: str, extension: str) -> str:
+    """Новый ключ для содержимого sha256: каждый вызов — новое поколение."""
+    return f"{KEY_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}-{secrets.token_hex(4)}.{extension}"
+
+
+def variant_keys(key: str) -> List[str]:
+    return [variant_url(key, variant) for variant in VARIANT_SIZES]
+
+
+@dataclass
+class PhotoBlob:
+    key: str
+    has_variants: bool
+    created: bool  # файл записан в хранилище этой загрузкой
+
+    @property
+    def thumbnail_key(self) -> Optional[str]:
+        return variant_url(self.key, "thumb") if self.has_variants else None
+
+    @property
+    def medium_key(self) -> Optional[str]:
+        return variant_url(self.key, "medium") if self.has_variants else None
+
+    def object_keys(self) -> List[str]:
+        return [self.key] + (variant_keys(self.key) if self.has_variants else [])
+
+
+def _add_reference(db: Session, sha256: str) -> Optional[PhotoBlob]:
+    """+1 к счётчику существующей строки; None, если такого содержимого нет."""
+    row = db.execute(
+        update(models.StoredBlob)
+        .where(models.StoredBlob.hash == sha256)
+        .values(ref_count=models.StoredBlob.ref_count + 1)
+        .returning(models.StoredBlob.key, models.StoredBlob.has_variants)
+    ).first()
+    return PhotoBlob(key=row.key, has_variants=row.has_variants, created=False) if row else None
+
+
+async def acquire_photo_blob(db: Session, stored: StoredUpload) -> PhotoBlob:
+    """
+    Зарегистрировать ссылку на загруженный файл. Если такого содержимого ещё нет,
+    генерирует варианты и кладёт файлы в хранилище; иначе staging-файл не нужен.
+    Файлы из staging вызывающий код удаляет сам (часть из них может быть уже перемещена).
+    Для нового содержимого транзакция сессии откатывается до загрузки — в ней
+    не должно быть несохранённых изменений.
+    """
+    existing = _add_reference(db, stored.sha256)
+    if existing is not None:
+        return existing
+    # Строки нет: до загрузки закрыть транзакцию, чтобы не держать соединение из пула
+    db.rollback()
+
+    storage = get_storage()
+    key = blob_key(stored.sha256, stored.extension)
+    # WebP-миниатюра и средний размер (в пуле процессов, ошибка не мешает загрузке)
+    variants = await generate_variants_async(stored.path)
+    blob = PhotoBlob(key=key, has_variants=bool(variants), created=True)
+    try:
+        for variant, path in variants.items():
+            await run_in_threadpool(storage.put_file, Path(path), variant_url(key, variant), "image/webp")
+        await run_in_threadpool(storage.put_file, stored.path, key, stored.content_type)
+        row = db.execute(
+            pg_insert(models.StoredBlob)
+            .values(
+                hash=stored.sha256,
+                key=key,
+                content_type=stored.content_type,
+                size=stored.size,
+                has_variants=blob.has_variants,
+                ref_count=1,
+            )
+            .on_conflict_do_update(
+                index_elements=[models.StoredBlob.hash],
+                set_={"ref_count": models.StoredBlob.ref_count + 1},
+            )
+            .returning(models.StoredBlob.key, models.StoredBlob.has_variants)
+        ).one()
+    except Exception:
+        await run_in_threadpool(delete_objects, blob.object_keys())
+        raise
+    if row.key != key:
+        # То же содержимое параллельно загрузил другой запрос: ссылаемся на его объекты
+        await run_in_threadpool(delete_objects, blob.object_keys())
+        return PhotoBlob(key=row.key, has_variants=row.has_variants, created=False)
+    return blob
+
+
+def release_photo_blobs(db: Session, hashes: Iterable[Optional[str]]) -> List[str]:
+    """
+    Снять ссылки (по одной на каждый элемент hashes). Строки с нулевым счётчиком
+    удаляются; возвращаются ключи их объектов для delete_objects() после commit.
+    Хеши без строки в stored_blobs (старые фото) пропускаются.
+    """
+    orphaned: List[str] = []
+    for sha256, count in Counter(h for h in hashes if h).items():
+        row = db.execute(
+            update(models.StoredBlob)
+            .where(models.StoredBlob.hash == sha256)
+            .values(ref_count=models.StoredBlob.ref_count - count)
+            .returning(models.StoredBlob.key, models.StoredBlob.ref_count, models.StoredBlob.has_variants)
+        ).first()
+        if row is None or row.ref_count > 0:
+            continue
+        db.execute(delete(models.StoredBlob).where(models.StoredBlob.hash == sha256))
+        orphaned.append(row.key)
+        if row.has_variants:
+            orphaned.extend(variant_keys(row.key))
+    return orphaned
+
+
+def parse_photo_key(key: str) -> Optional[re.Match]:
+    return BLOB_KEY_RE.match(key) or LEGACY_KEY_RE.match(key)
+
+
+def can_access_photo_object(db: Session, user: models.User, key: str) -> bool:
+    """
+    Может ли пользователь получить объект фото: владелец фото или его тренер.
+    Один запрос по индексу content_hash (или по users.id для старых фото).
+    """
+    match = parse_photo_key(key)
+    if match is None:
+        return False
+    if "hash" in match.groupdict():
+        return db.query(models.ProgressPhoto.id).join(
+            models.User, models.User.id == models.ProgressPhoto.user_id
+        ).filter(
+            models.ProgressPhoto.content_hash == match.group("hash"),
+            or_(models.ProgressPhoto.user_id == user.id, models.User.trainer_id == user.id),
+        ).first() is not None
+    owner_id = match.group("user_id")
+    if owner_id == user.id:
+        return True
+    return db.query(models.User.id).filter(
+        models.User.id == owner_id,
+        models.User.trainer_id == user.id,
+    ).first() is not None
@@ -0,0 +1,100 @@
+"""
+Производные версии фото прогресса (WebP): миниатюра для плиток дашборда
+и средний размер для просмотра на телефоне.
+
+Декодирование и ресайз — CPU-bound, поэтому выполняются в пуле процессов:
+event loop и другие запросы не ждут, а GIL не ограничивает параллелизм.
+HEIC обрабатывается только при установленном pillow-heif; иначе, как и при
+любой ошибке, фото остаётся без вариантов и отдаётся оригиналом.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Вариант -> максимальная сторона в пикселях
+VARIANT_SIZES = {
+    "thumb": 320,
+    "medium": 1080,
+}
+WEBP_QUALITY = 80
+VARIANT_WORKERS = int(os.getenv("PHOTO_VARIANT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def variant_path(original: Path, variant: str) -> Path:
+    return original.with_name(f"{original.stem}_{variant}.webp")
+
+
+def variant_url(original_url: str, variant: str) -> str:
+    base, _, filename = original_url.rpartition("/")
+    stem = filename.rsplit(".", 1)[0]
+    return f"{base}/{stem}_{variant}.webp"
+
+
+def generate_variants(src: str) -> Dict[str, str]:
+    """
+    Создать все варианты для файла src. Выполняется в дочернем процессе.
+    Возвращает {variant: путь к файлу}.
+    """
+    from PIL import Image, ImageOps
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+    except ImportError:
+        pass
+
+    original = Path(src)
+    result = {}
+    with Image.open(original) as image:
+        # draft() позволяет декодеру JPEG сразу читать уменьшенную копию
+        image.draft("RGB", (max(VARIANT_SIZES.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        # От большего к меньшему: каждый следующий ресайз идёт с уже уменьшенной копии
+        for variant, size in sorted(VARIANT_SIZES.items(), key=lambda item: -item[1]):
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            target = variant_path(original, variant)
+            tmp = target.with_name(f".{target.name}.tmp")
+            image.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp, target)
+            result[variant] = str(target)
+    return result
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=VARIANT_WORKERS)
+    return _pool
+
+
+async def generate_variants_async(src: Path) -> Dict[str, str]:
+    """Создать варианты в пуле процессов. При ошибке возвращает пустой словарь."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), generate_variants, str(src))
+    except Exception as e:
+        logger.warning(f"Could not generate photo variants for {src}: {e}")
+        return {}
+
+
+def delete_variants(original: Path) -> None:
+    for variant in VARIANT_SIZES:
+        try:
+            variant_path(original, variant).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,263 @@
+"""
+Сэмплирующий профилировщик для администратора (PROFILING_ENABLED=1).
+
+Фоновый поток раз в PROFILE_INTERVAL_MS снимает стеки всех потоков процесса
+(sys._current_frames) и складывает одинаковые стеки в счётчик. Код
+приложения не трассируется, поэтому профиль снимается и с продакшен-воркера.
+Кадры простоя (ожидание в selectors/threading) отбрасываются: пустой цикл
+событий и свободные потоки пула ничего не добавляют в профиль.
+
+Два режима, оба по секрету администратора (admin.require_admin):
+- один запрос: заголовок X-Profile: <ADMIN_SECRET> — запрос выполняется как
+  обычно (со всеми побочными эффектами), но вместо его ответа возвращается
+  профиль, статус исходного ответа — в X-Profiled-Status;
+- сессия воркера: GET /api/admin/profile?seconds=N — всё, что воркер делал
+  N секунд.
+Формат — X-Profile-Format / ?format=: speedscope (JSON для speedscope.app)
+или collapsed (свёрнутые стеки для flamegraph.pl и speedscope).
+
+Снимаются все потоки, так что параллельные запросы на том же воркере
+попадают в профиль одного запроса — его лучше снимать на ненагруженном
+воркере. Одновременно в процессе идёт не больше одной сессии.
+
+При PROFILING_ENABLED=0 (по умолчанию) middleware не подключается, а
+эндпоинт отвечает 404 — накладных расходов нет.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+PROFILE_FORMATS = ("speedscope", "collapsed")
+
+# Верхний кадр стека, означающий, что поток просто ждёт (epoll, Condition.wait)
+_IDLE_LEAVES = {("selectors.py", "select"), ("threading.py", "wait")}
+
+Frame = Tuple[str, str, int]  # (функция, файл, строка начала функции)
+
+
+class ProfilerBusy(RuntimeError):
+    """В процессе уже идёт сессия профилирования."""
+
+
+_session_lock = threading.Lock()
+
+
+class Sampler:
+    """with Sampler() as sampler: ...; sampler.speedscope()"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, name: str = "profile"):
+        self.interval = interval
+        self.name = name
+        self.frames: List[Frame] = []
+        self._frame_ids: Dict[Frame, int] = {}
+        # (id потока, стек индексов кадров от корня) -> секунды
+        self.stacks: Counter = Counter()
+        self.thread_names: Dict[int, str] = {}
+        self.samples = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if not _session_lock.acquire(blocking=False):
+            raise ProfilerBusy("Profiling session already in progress")
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        _session_lock.release()
+
+    def __enter__(self) -> "Sampler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            # Вес сэмпла — фактически прошедшее время, а не номинальный интервал
+            self._sample(own_id, now - last)
+            last = now
+
+    def _sample(self, own_id: int, weight: float) -> None:
+        self.samples += 1
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if not stack or (os.path.basename(stack[0][1]), stack[0][0].rsplit(".", 1)[-1]) in _IDLE_LEAVES:
+                continue
+            self.stacks[(thread_id, tuple(self._frame_id(f) for f in reversed(stack)))] += weight
+            if thread_id not in self.thread_names:
+                self.thread_names.update((t.ident, t.name) for t in threading.enumerate())
+
+    def _frame_id(self, frame: Frame) -> int:
+        frame_id = self._frame_ids.get(frame)
+        if frame_id is None:
+            frame_id = self._frame_ids[frame] = len(self.frames)
+            self.frames.append(frame)
+        return frame_id
+
+    def _thread_name(self, thread_id: int) -> str:
+        return self.thread_names.get(thread_id, f"thread-{thread_id}")
+
+    def collapsed(self) -> str:
+        """Строки "поток;кадр;...;кадр вес" (вес — микросекунды)."""
+        lines = []
+        for (thread_id, stack), seconds in sorted(self.stacks.items(), key=lambda item: item[0][1]):
+            names = [self._thread_name(thread_id)]
+            names.extend(
+                f"{function} ({os.path.basename(filename)}:{line})"
+                for function, filename, line in (self.frames[i] for i in stack)
+            )
+            lines.append(f"{';'.join(names)} {max(1, round(seconds * 1e6))}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict:
+        """Профиль в формате speedscope: по сэмплированному профилю на поток."""
+        by_thread: Dict[int, list] = {}
+        for (thread_id, stack), seconds in self.stacks.items():
+            by_thread.setdefault(thread_id, []).append((list(stack), seconds * 1000))
+        profiles = []
+        for thread_id, samples in sorted(by_thread.items(), key=lambda item: -sum(w for _, w in item[1])):
+            total = sum(weight for _, weight in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": self._thread_name(thread_id),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": [stack for stack, _ in samples],
+                "weights": [weight for _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "coach-fit profiler",
+            "shared": {
+                "frames": [
+                    {"name": function, "file": filename, "line": line}
+                    for function, filename, line in self.frames
+                ],
+            },
+            "profiles": profiles,
+        }
+
+    def render(self, profile_format: str) -> Tuple[bytes, str]:
+        """(тело, content-type) в формате speedscope или collapsed."""
+        if profile_format == "collapsed":
+            return self.collapsed().encode(), "text/plain; charset=utf-8"
+        return json.dumps(self.speedscope(), ensure_ascii=False).encode(), "application/json"
+
+
+async def profile_worker(seconds: float, name: str = "worker") -> Sampler:
+    """Сэмплировать весь процесс seconds секунд, не занимая цикл событий."""
+    sampler = Sampler(name=name)
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
+
+
+class ProfileRequestMiddleware:
+    """
+    ASGI-middleware: запрос с X-Profile: <секрет> профилируется, а в ответ
+    отдаётся профиль. authorize — проверка секрета (admin.is_admin_secret).
+    """
+
+    def __init__(self, app, authorize: Callable[[str], bool]):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        secret = None
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    secret = value.decode("latin-1")
+                    break
+        if secret is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        profile_format = headers.get(b"x-profile-format", b"speedscope").decode("latin-1")
+        if not self.authorize(secret):
+            await self._send(send, 403, {"detail": "Недействительный ключ администратора"})
+            return
+        if profile_format not in PROFILE_FORMATS:
+            await self._send(send, 400, {"detail": f"Формат профиля: {', '.join(PROFILE_FORMATS)}"})
+            return
+
+        status_code = 500
+
+        async def capture(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        sampler = Sampler(name=f'{scope["method"]} {scope["path"]}')
+        try:
+            sampler.start()
+        except ProfilerBusy:
+            await self._send(send, 409, {"detail": "Профилирование уже идёт"})
+            return
+        try:
+            await self.app(scope, receive, capture)
+        except Exception:
+            # Профиль упавшего запроса тоже нужен; ошибка остаётся в логе
+            logger.exception("Profiled request failed: %s %s", scope["method"], scope["path"])
+            status_code = 500
+        finally:
+            sampler.stop()
+
+        body, content_type = sampler.render(profile_format)
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(status_code).encode()),
+                (b"x-profile-samples", str(sampler.samples).encode()),
+                (b"x-profile-duration-ms", f"{sampler.duration * 1000:.1f}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send(send, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
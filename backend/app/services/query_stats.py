@@ -0,0 +1,191 @@
+"""
+Счётчик SQL-запросов на HTTP-запрос.
+
+Обработчики before/after_cursor_execute на engine (подключаются в
+app/database.py) считают выражения и время в БД для текущего запроса —
+объект RequestQueryStats лежит в ContextVar, который выставляет
+QueryStatsMiddleware. Контекст копируется в run_in_threadpool и дочерние
+задачи, поэтому синхронные зависимости и сервисы учитываются тоже.
+
+По завершении запроса в ответ добавляется Server-Timing
+(db;dur=…;desc="N queries", app;dur=…), а в лог — JSON-строка со
+счётчиками. Одно и то же выражение (с точностью до параметров и длины
+списков IN/VALUES), выполненное SQL_REPEAT_THRESHOLD раз и больше, —
+признак N+1: запрос логируется с WARNING, а в строгом режиме
+(SQL_STATS_STRICT=1, для тестов) сразу падает с RepeatedQueryError.
+Пакетные циклы, где повторы ожидаемы, оборачиваются в expect_repeats().
+
+Вне HTTP (скрипты, тесты) те же счётчики даёт track().
+"""
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQL_STATS_ENABLED = os.getenv("SQL_STATS_ENABLED", "1") == "1"
+SQL_STATS_STRICT = os.getenv("SQL_STATS_STRICT", "0") == "1"
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "10"))
+# Запрос с таким числом выражений логируется с WARNING даже без повторов
+SQL_QUERY_WARN_COUNT = int(os.getenv("SQL_QUERY_WARN_COUNT", "50"))
+
+_PARAM_RE = re.compile(r"%\(\w+\)s|%s|\?")
+_PARAM_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LIST_RE = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class RepeatedQueryError(RuntimeError):
+    """Строгий режим: одно выражение выполнено SQL_REPEAT_THRESHOLD раз за запрос."""
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Выражение без параметров: IN (?, ?, ?) и VALUES (?), (?) сворачиваются."""
+    shape = _PARAM_RE.sub("?", _SPACE_RE.sub(" ", statement.strip()))
+    shape = _PARAM_LIST_RE.sub("?", shape)
+    return _ROW_LIST_RE.sub("(?)", shape)
+
+
+class RequestQueryStats:
+    def __init__(self, strict: Optional[bool] = None, threshold: Optional[int] = None):
+        self.strict = SQL_STATS_STRICT if strict is None else strict
+        self.threshold = SQL_REPEAT_THRESHOLD if threshold is None else threshold
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes: Counter = Counter()
+        self.expected_repeats = 0  # > 0 внутри expect_repeats(): выражения только считаются
+        self.started = time.perf_counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.db_time += duration
+        if self.expected_repeats:
+            return
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.strict and self.shapes[shape] == self.threshold:
+            raise RepeatedQueryError(
+                f"Statement executed {self.threshold} times in one request: {shape[:300]}"
+            )
+
+    def repeated(self) -> List[tuple]:
+        """(выражение, сколько раз) для выражений, повторённых threshold раз и больше."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= self.threshold]
+
+    def server_timing(self) -> str:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return f'db;dur={self.db_time * 1000:.1f};desc="{self.count} queries", app;dur={total_ms:.1f}'
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def current() -> Optional[RequestQueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track(strict: Optional[bool] = None, threshold: Optional[int] = None) -> Iterator[RequestQueryStats]:
+    """Считать запросы внутри блока: with track() as stats: ...; stats.count"""
+    stats = RequestQueryStats(strict=strict, threshold=threshold)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def expect_repeats() -> Iterator[None]:
+    """Блок с ожидаемо повторяющимися выражениями (пакетная запись) — не считать их N+1."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    stats.expected_repeats += 1
+    try:
+        yield
+    finally:
+        stats.expected_repeats -= 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._query_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_query_stats_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine) -> None:
+    """Подключить счётчик к engine (ничего не делает при SQL_STATS_ENABLED=0)."""
+    if not SQL_STATS_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """ASGI-middleware: счётчики на каждый HTTP-запрос, Server-Timing и лог."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current.set(stats)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._log(scope, stats, status_code)
+
+    @staticmethod
+    def _log(scope, stats: RequestQueryStats, status_code: int) -> None:
+        repeated = stats.repeated()
+        level = logging.WARNING if repeated or stats.count >= SQL_QUERY_WARN_COUNT else logging.DEBUG
+        if not logger.isEnabledFor(level):
+            return
+        route = scope.get("route")
+        record = {
+            "event": "sql_stats",
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "route": getattr(route, "path", None),
+            "status": status_code,
+            "queries": stats.count,
+            "db_ms": round(stats.db_time * 1000, 1),
+            "total_ms": round((time.perf_counter() - stats.started) * 1000, 1),
+        }
+        if repeated:
+            record["repeated"] = [{"count": n, "statement": shape[:300]} for shape, n in repeated]
+        logger.log(level, json.dumps(record, ensure_ascii=False))
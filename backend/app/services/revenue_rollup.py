@@ -0,0 +1,88 @@
+"""
+Помесячная выручка тренеров (таблица trainer_monthly_revenue).
+
+Строка (тренер, месяц, тип платежа) хранит сумму и число платежей. Она
+обновляется в той же транзакции, что и платежи:
+- add_payment() / remove_payment() — при создании и удалении одного платежа
+  (INSERT ... ON CONFLICT DO UPDATE, инкремент без чтения);
+- remove_payments() — перед массовым удалением платежей (удаление клиента).
+
+Месяц считается по дате платежа в UTC. rebuild() пересчитывает таблицу
+из payments целиком (миграция, проверка расхождений).
+"""
+from datetime import date, datetime, timezone
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+def month_of(moment: datetime) -> date:
+    """Первое число месяца платежа (UTC; дата без зоны считается UTC)."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date().replace(day=1)
+
+
+def _month_expr():
+    return cast(func.date_trunc("month", func.timezone("UTC", models.Payment.date)), Date)
+
+
+def _apply(db: Session, trainer_id: str, month: date, payment_type: models.PaymentType, amount: float, count: int) -> None:
+    rollup = models.TrainerMonthlyRevenue
+    db.execute(
+        pg_insert(rollup)
+        .values(trainer_id=trainer_id, month=month, type=payment_type, revenue=amount, payments_count=count)
+        .on_conflict_do_update(
+            index_elements=[rollup.trainer_id, rollup.month, rollup.type],
+            set_={
+                "revenue": rollup.revenue + amount,
+                "payments_count": rollup.payments_count + count,
+            },
+        )
+    )
+
+
+def add_payment(db: Session, payment: models.Payment) -> None:
+    _apply(db, payment.trainer_id, month_of(payment.date), payment.type, payment.amount, 1)
+
+
+def remove_payment(db: Session, payment: models.Payment) -> None:
+    _apply(db, payment.trainer_id, month_of(payment.date), payment.type, -payment.amount, -1)
+
+
+def remove_payments(db: Session, *filters) -> None:
+    """Вычесть из свёртки платежи, подходящие под filters (вызывать до их удаления)."""
+    month = _month_expr()
+    rows = db.query(
+        models.Payment.trainer_id,
+        month,
+        models.Payment.type,
+        func.sum(models.Payment.amount),
+        func.count(models.Payment.id),
+    ).filter(*filters).group_by(models.Payment.trainer_id, month, models.Payment.type).all()
+    for trainer_id, payment_month, payment_type, amount, count in rows:
+        _apply(db, trainer_id, payment_month, payment_type, -amount, -count)
+
+
+def rebuild(db: Session) -> int:
+    """Пересчитать свёртку из payments. Возвращает число строк."""
+    rollup = models.TrainerMonthlyRevenue
+    month = _month_expr()
+    db.execute(delete(rollup))
+    source = select(
+        models.Payment.trainer_id,
+        month,
+        models.Payment.type,
+        func.sum(models.Payment.amount),
+        func.count(models.Payment.id),
+    ).group_by(models.Payment.trainer_id, month, models.Payment.type)
+    result = db.execute(
+        insert(rollup).from_select(
+            [rollup.trainer_id, rollup.month, rollup.type, rollup.revenue, rollup.payments_count],
+            source,
+        )
+    )
+    return result.rowcount
@@ -0,0 +1,88 @@
+"""
+Списание тренировок из пакета клиента при отметке посещения.
+
+Все изменения — одиночными UPDATE ... RETURNING, без чтения-изменения-записи
+в Python, поэтому одновременные отметки не теряют и не удваивают списания:
+- claim_completion() переводит тренировку в COMPLETED условным UPDATE;
+  списывать должен только запрос, который выполнил переход;
+- deduct_session() уменьшает User.workouts_package (если > 0) и
+  remaining_sessions самого старого активного пакета. Пакет выбирается
+  SELECT ... FOR UPDATE по частичному индексу ix_payments_active_packages:
+  если строку держит другая транзакция, списание ждёт её, а не пропускает
+  пакет (иначе баланс клиента и сумма остатков пакетов расходятся).
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import and_, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+@dataclass
+class SessionDeduction:
+    workouts_package: Optional[int]  # остаток у клиента; None — списывать было нечего
+    payment_id: Optional[str]  # пакет, из которого списано занятие
+    remaining_sessions: Optional[int]
+
+
+def claim_completion(db: Session, workout_id: str) -> bool:
+    """Отметить тренировку выполненной. False — её уже отметил другой запрос."""
+    claimed = db.execute(
+        update(models.Workout)
+        .where(
+            models.Workout.id == workout_id,
+            models.Workout.attendance.is_distinct_from(models.AttendanceStatus.COMPLETED),
+        )
+        .values(attendance=models.AttendanceStatus.COMPLETED)
+        .returning(models.Workout.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    return claimed is not None
+
+
+def deduct_session(db: Session, client_id: str) -> SessionDeduction:
+    """Списать одно занятие с баланса клиента и с самого старого активного пакета."""
+    balance = db.execute(
+        update(models.User)
+        .where(models.User.id == client_id, models.User.workouts_package > 0)
+        .values(workouts_package=models.User.workouts_package - 1)
+        .returning(models.User.workouts_package)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+    active_packages = and_(
+        models.Payment.client_id == client_id,
+        models.Payment.type == models.PaymentType.PACKAGE,
+        models.Payment.remaining_sessions > 0,
+    )
+    payment = None
+    while payment is None:
+        package_id = db.execute(
+            select(models.Payment.id)
+            .where(active_packages)
+            .order_by(models.Payment.date.asc())
+            .limit(1)
+            .with_for_update()
+        ).scalar()
+        if package_id is None:
+            # В READ COMMITTED FOR UPDATE с LIMIT возвращает пустоту, если пакет,
+            # которого ждали, за это время исчерпали, — тогда повторить с новым снимком
+            still_active = db.execute(select(models.Payment.id).where(active_packages).limit(1)).scalar()
+            if still_active is None:
+                break
+            continue
+        payment = db.execute(
+            update(models.Payment)
+            .where(models.Payment.id == package_id, models.Payment.remaining_sessions > 0)
+            .values(remaining_sessions=models.Payment.remaining_sessions - 1)
+            .returning(models.Payment.id, models.Payment.remaining_sessions)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+    return SessionDeduction(
+        workouts_package=balance,
+        payment_id=payment.id if payment else None,
+        remaining_sessions=payment.remaining_sessions if payment else None,
+    )
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 import requests
 from sqlalchemy.orm import Session
 from app import models
+from app.services.app_metrics import outbound_call
 
 def generate_sms_code() -> str:
     """Генерирует 4-значный код подтверждения"""
@@ -40,7 +41,9 @@ def send_telegram_code(phone: str, code: str) -> bool:
             "code": code,
             "ttl": 60 # 1 minute expiration aligns with our UI timer
         }
-        response = requests.post(url, headers=headers, json=data)
+        with outbound_call("telegram_gateway") as call:
+            response = requests.post(url, headers=headers, json=data)
+            call.status = response.status_code
         response_data = response.json()
         
         if response.status_code == 200 and response_data.get("ok"):
@@ -83,7 +86,9 @@ def send_sms_code(phone: str, code: str) -> bool:
             "translit": 1,
         }
         print(f"[SMSC.ru] Параметры запроса: phones={clean_phone}, sender={sender}, translit=1")
-        response = requests.get(url, params=params)
+        with outbound_call("smsc") as call:
+            response = requests.get(url, params=params)
+            call.status = response.status_code
         print(f"[SMSC.ru] Ответ API: status={response.status_code}, body={response.text}")
         result = response.json()
         
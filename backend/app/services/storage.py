@@ -0,0 +1,220 @@
+"""
+Хранилище загруженных файлов.
+
+Файлы адресуются ключом вида "progress_photos/ab/cd/<sha256>.<ext>"; в БД
+хранится ключ, а клиент получает подписанный URL эндпоинта FILES_URL/<ключ>
+(app/services/url_signing.py), который передаёт файл бэкенда (app/routers/files.py).
+Бэкенд выбирается переменной STORAGE_BACKEND:
+- local (по умолчанию) — каталог STORAGE_LOCAL_ROOT;
+- s3 — любое S3-совместимое хранилище (AWS S3, MinIO, Yandex Object Storage),
+  бакет закрыт, отдача через короткоживущие presigned-ссылки.
+  Нужен boto3; для локальной разработки: docker compose --profile s3 up.
+
+Значения "/uploads/<путь>" (фото, загруженные до появления хранилища) лежат
+в STORAGE_LOCAL_ROOT под тем же путём и тоже отдаются через FILES_URL.
+"""
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional
+from urllib.parse import quote
+
+from app.services import url_signing
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_LOCAL_ROOT = Path(os.getenv("STORAGE_LOCAL_ROOT", "uploads"))
+# Префикс авторизованной раздачи файлов
+FILES_URL = os.getenv("FILES_URL", "/api/files").rstrip("/")
+LEGACY_URL_PREFIX = "/uploads/"
+
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_BUCKET = os.getenv("S3_BUCKET", "coachflo")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
+# Адрес, по которому хранилище видят браузеры (для presigned-ссылок); по умолчанию S3_ENDPOINT_URL
+S3_PUBLIC_ENDPOINT_URL = os.getenv("S3_PUBLIC_ENDPOINT_URL")
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", "300"))
+
+# Имя объекта определяется содержимым, поэтому его можно кэшировать навсегда
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StorageBackend:
+    """Интерфейс бэкенда хранилища."""
+
+    def put_file(self, local_path: Path, key: str, content_type: str) -> None:
+        """Сохранить локальный файл под ключом. Исходный файл может быть перемещён."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def open(self, key: str) -> BinaryIO:
+        """Поток чтения объекта (читать кусками: объект может быть большим)."""
+        raise NotImplementedError
+
+    def direct_url(self, key: str) -> Optional[str]:
+        """Временная прямая ссылка на объект; None — файл отдаёт приложение."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Storage key escapes root: {key}")
+        return path
+
+    def put_file(self, local_path: Path, key: str, content_type: str) -> None:
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(local_path, target)
+        except OSError:
+            # Другая файловая система: копируем во временный файл рядом и переименовываем
+            tmp = target.with_name(f".{target.name}.tmp")
+            shutil.copyfile(local_path, tmp)
+            os.replace(tmp, target)
+
+    def delete(self, key: str) -> None:
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+
+class S3Storage(StorageBackend):
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        public_endpoint_url: Optional[str] = None,
+        presign_expires: int = S3_PRESIGN_EXPIRES,
+    ):
+        import boto3
+        from botocore.config import Config
+
+        def make_client(endpoint):
+            return boto3.client(
+                "s3",
+                endpoint_url=endpoint,
+                region_name=region,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                # path-style адреса нужны MinIO и большинству S3-совместимых хранилищ
+                config=Config(s3={"addressing_style": "path"}, retries={"max_attempts": 3}),
+            )
+
+        self.bucket = bucket
+        self.presign_expires = presign_expires
+        self.client = make_client(endpoint_url)
+        # Подпись presigned-ссылки включает хост, поэтому она строится от публичного адреса
+        if public_endpoint_url and public_endpoint_url != endpoint_url:
+            self.presign_client = make_client(public_endpoint_url)
+        else:
+            self.presign_client = self.client
+
+    def put_file(self, local_path: Path, key: str, content_type: str) -> None:
+        self.client.upload_file(
+            str(local_path),
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL},
+        )
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def direct_url(self, key: str) -> Optional[str]:
+        return self.presign_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=self.presign_expires,
+        )
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Бэкенд хранилища по настройкам окружения (создаётся при первом обращении)."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "s3":
+            _storage = S3Storage(
+                bucket=S3_BUCKET,
+                endpoint_url=S3_ENDPOINT_URL,
+                region=S3_REGION,
+                access_key=S3_ACCESS_KEY,
+                secret_key=S3_SECRET_KEY,
+                public_endpoint_url=S3_PUBLIC_ENDPOINT_URL,
+            )
+        elif STORAGE_BACKEND == "local":
+            _storage = LocalStorage(STORAGE_LOCAL_ROOT)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
+
+
+def is_storage_key(value: Optional[str]) -> bool:
+    return bool(value) and not value.startswith(("/", "http://", "https://"))
+
+
+def storage_key_for(value: Optional[str]) -> Optional[str]:
+    """Ключ в хранилище для значения из БД (ключ или старый /uploads/... URL)."""
+    if is_storage_key(value):
+        return value
+    if value and value.startswith(LEGACY_URL_PREFIX):
+        return value[len(LEGACY_URL_PREFIX):]
+    return None
+
+
+def resolve_url(value: Optional[str]) -> Optional[str]:
+    """Подписанный URL для значения из БД; внешние http(s)-ссылки отдаются как есть."""
+    key = storage_key_for(value)
+    if key is None:
+        return value
+    exp, sig = url_signing.sign(key)
+    return f"{FILES_URL}/{quote(key)}?exp={exp}&sig={sig}"
+
+
+def delete_objects(keys: Iterable[str]) -> None:
+    """Удалить объекты; ошибки только логируются — сирота в хранилище не ломает данные."""
+    storage = get_storage()
+    for key in keys:
+        try:
+            storage.delete(key)
+        except Exception as e:
+            logger.warning(f"Could not delete stored object {key}: {e}")
@@ -0,0 +1,217 @@
+"""
+Лента изменений для локального кэша мобильного клиента (GET /api/sync).
+
+По курсору since возвращаются id созданных, изменённых и удалённых записей
+каждой сущности. Изменения ищутся по updated_at (для записей метрик, которые
+не редактируются, — по created_at) через индексы (владелец, updated_at);
+удаления — по таблице sync_tombstones, которую заполняют обработчики ниже:
+after_delete — для db.delete(obj), do_orm_execute — для массовых
+query(...).delete() (INSERT ... SELECT по тому же условию перед DELETE). Правка дня, блока или упражнения программы обновляет
+updated_at самой программы (_touch_programs).
+
+Курсор — момент чтения минус SYNC_CURSOR_OVERLAP: транзакция, начатая раньше,
+но зафиксированная позже чтения, всё равно попадёт в следующую выборку.
+Поэтому одно изменение может прийти дважды — клиент применяет его повторно.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, insert, literal, null, or_, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+SYNC_CURSOR_OVERLAP = timedelta(seconds=int(os.getenv("SYNC_CURSOR_OVERLAP_SECONDS", "60")))
+
+ENTITIES = (
+    "workouts", "programs", "nutrition", "notes",
+    "body_metrics", "body_metric_entries", "exercise_metrics", "exercise_metric_entries",
+)
+
+
+def encode_cursor(moment: datetime) -> str:
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def decode_cursor(cursor: str) -> datetime:
+    """Момент из курсора; ValueError, если курсор не выдан этим API."""
+    try:
+        return datetime.fromtimestamp(int(cursor) / 1_000_000, tz=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f"Invalid sync cursor: {cursor!r}")
+
+
+def _sources(db: Session, viewer: models.User, user_id: str) -> Dict[str, tuple]:
+    """(запрос id и created_at, колонка момента изменения) по каждой сущности пользователя user_id."""
+    is_trainer = viewer.role == models.UserRole.TRAINER
+    own = user_id == viewer.id
+
+    workout_owner = models.Workout.user_id == user_id
+    if own and is_trainer:
+        workout_owner = or_(workout_owner, models.Workout.trainer_id == viewer.id)
+    if is_trainer:
+        note_owner = models.TrainerNote.trainer_id == viewer.id
+        if not own:
+            note_owner = note_owner & (models.TrainerNote.client_id == user_id)
+    else:
+        note_owner = models.TrainerNote.client_id == user_id
+
+    def simple(model, owner):
+        return db.query(model.id, model.created_at).filter(owner), model.updated_at
+
+    def entries(entry_model, metric_model, metric_fk):
+        query = db.query(entry_model.id, entry_model.created_at).join(
+            metric_model, metric_model.id == metric_fk
+        ).filter(metric_model.user_id == user_id)
+        return query, entry_model.created_at
+
+    return {
+        "workouts": simple(models.Workout, workout_owner),
+        "programs": simple(models.TrainingProgram, models.TrainingProgram.user_id == user_id),
+        "nutrition": simple(models.NutritionEntry, models.NutritionEntry.user_id == user_id),
+        "notes": simple(models.TrainerNote, note_owner),
+        "body_metrics": simple(models.BodyMetric, models.BodyMetric.user_id == user_id),
+        "body_metric_entries": entries(
+            models.BodyMetricEntry, models.BodyMetric, models.BodyMetricEntry.metric_id
+        ),
+        "exercise_metrics": simple(models.ExerciseMetric, models.ExerciseMetric.user_id == user_id),
+        "exercise_metric_entries": entries(
+            models.ExerciseMetricEntry, models.ExerciseMetric, models.ExerciseMetricEntry.exercise_metric_id
+        ),
+    }
+
+
+def get_changes(db: Session, viewer: models.User, user_id: str, since: Optional[datetime]) -> dict:
+    """Изменения данных пользователя user_id после since (None — полная синхронизация)."""
+    now = db.query(func.now()).scalar()
+    changes = {name: {"created": [], "updated": [], "deleted": []} for name in ENTITIES}
+
+    for name, (query, changed_at) in _sources(db, viewer, user_id).items():
+        if since is not None:
+            query = query.filter(changed_at > since)
+        for row in query:
+            created = since is None or row.created_at is None or row.created_at > since
+            changes[name]["created" if created else "updated"].append(row.id)
+
+    if since is not None:
+        # Владелец записи видит её удаление; тренер — ещё удаление тренировок и заметок, которые он вёл
+        audience = models.SyncTombstone.user_id == user_id
+        if user_id == viewer.id:
+            audience = or_(audience, models.SyncTombstone.trainer_id == viewer.id)
+        tombstones = db.query(models.SyncTombstone.entity, models.SyncTombstone.entity_id).filter(
+            audience,
+            models.SyncTombstone.deleted_at > since,
+        )
+        if user_id != viewer.id:
+            # В ленте клиента тренер видит только свои заметки о нём
+            tombstones = tombstones.filter(
+                or_(models.SyncTombstone.entity != "notes", models.SyncTombstone.trainer_id == viewer.id)
+            )
+        for entity, entity_id in tombstones:
+            if entity in changes:
+                changes[entity]["deleted"].append(entity_id)
+
+    cursor = now - SYNC_CURSOR_OVERLAP
+    if since is not None and cursor < since:
+        cursor = since
+    return {"cursor": encode_cursor(cursor), "changes": changes}
+
+
+# ─── Надгробия удалённых записей ──────────────────────────────────────────────
+
+# модель -> (сущность в ленте, колонка владельца, колонка тренера, внешний ключ на метрику).
+# Для записей метрик владелец — user_id родительской метрики.
+TOMBSTONE_SOURCES = {
+    models.Workout: ("workouts", models.Workout.user_id, models.Workout.trainer_id, None),
+    models.TrainingProgram: ("programs", models.TrainingProgram.user_id, None, None),
+    models.NutritionEntry: ("nutrition", models.NutritionEntry.user_id, None, None),
+    models.TrainerNote: ("notes", models.TrainerNote.client_id, models.TrainerNote.trainer_id, None),
+    models.BodyMetric: ("body_metrics", models.BodyMetric.user_id, None, None),
+    models.BodyMetricEntry: (
+        "body_metric_entries", models.BodyMetric.user_id, None, models.BodyMetricEntry.metric_id
+    ),
+    models.ExerciseMetric: ("exercise_metrics", models.ExerciseMetric.user_id, None, None),
+    models.ExerciseMetricEntry: (
+        "exercise_metric_entries", models.ExerciseMetric.user_id, None, models.ExerciseMetricEntry.exercise_metric_id
+    ),
+}
+
+_TOMBSTONE_COLUMNS = ["entity", "entity_id", "user_id", "trainer_id"]
+
+
+def _record_tombstone(entity, owner, trainer, metric_fk):
+    def after_delete(mapper, connection, target):
+        if metric_fk is None:
+            user_id = getattr(target, owner.key)
+        else:
+            user_id = connection.execute(
+                select(owner).where(owner.class_.id == getattr(target, metric_fk.key))
+            ).scalar()
+        if user_id is None:
+            return
+        connection.execute(insert(models.SyncTombstone).values(
+            entity=entity,
+            entity_id=target.id,
+            user_id=user_id,
+            trainer_id=getattr(target, trainer.key) if trainer is not None else None,
+        ))
+    return after_delete
+
+
+for _model, (_entity, _owner, _trainer, _metric_fk) in TOMBSTONE_SOURCES.items():
+    event.listen(_model, "after_delete", _record_tombstone(_entity, _owner, _trainer, _metric_fk))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_tombstones(orm_execute_state) -> None:
+    """query(...).delete() не вызывает after_delete: надгробия — одним INSERT ... SELECT до DELETE."""
+    if not orm_execute_state.is_delete or orm_execute_state.bind_mapper is None:
+        return
+    model = orm_execute_state.bind_mapper.class_
+    source = TOMBSTONE_SOURCES.get(model)
+    if source is None:
+        return
+    entity, owner, trainer, metric_fk = source
+    rows = select(literal(entity), model.id, owner, trainer if trainer is not None else null())
+    if metric_fk is not None:
+        rows = rows.join_from(model, owner.class_, owner.class_.id == metric_fk)
+    whereclause = orm_execute_state.statement.whereclause
+    if whereclause is not None:
+        rows = rows.where(whereclause)
+    rows = rows.where(owner.is_not(None))
+    orm_execute_state.session.execute(
+        insert(models.SyncTombstone).from_select(_TOMBSTONE_COLUMNS, rows),
+        orm_execute_state.parameters,
+    )
+
+
+# ─── Изменения внутри программы ───────────────────────────────────────────────
+
+def _program_id(obj) -> Optional[str]:
+    if isinstance(obj, models.ProgramDay):
+        return obj.program_id or (obj.program.id if obj.program else None)
+    if isinstance(obj, models.ProgramBlock):
+        day = obj.day
+        return _program_id(day) if day else None
+    if isinstance(obj, models.ProgramExercise):
+        block = obj.block
+        return _program_id(block) if block else None
+    return None
+
+
+@event.listens_for(Session, "before_flush")
+def _touch_programs(session: Session, flush_context, instances) -> None:
+    """Правка дня/блока/упражнения — изменение программы для ленты /api/sync."""
+    program_ids = set()
+    modified = (obj for obj in session.dirty if session.is_modified(obj))
+    for obj in chain(session.new, modified, session.deleted):
+        program_id = _program_id(obj)
+        if program_id:
+            program_ids.add(program_id)
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, models.TrainingProgram)}
+    for program_id in program_ids - deleted:
+        program = session.get(models.TrainingProgram, program_id)
+        if program is not None and program not in session.new:
+            program.updated_at = func.now()
@@ -0,0 +1,173 @@
+"""
+Потоковое сохранение загружаемых изображений.
+
+Файл читается из UploadFile частями, запись идёт в пуле потоков (не блокирует
+event loop), размер проверяется на каждом шаге, SHA-256 считается на лету.
+Но multipart-парсер Starlette получает всё тело раньше обработчика, поэтому
+маршруты загрузки используют ImageUploadRoute: тело больше лимита отклоняется
+с 413 по Content-Length до чтения, а без него — как только байтов стало больше.
+Данные пишутся во временный файл и атомарно переименовываются — наружу никогда
+не виден частично записанный файл. Тип определяется по сигнатуре содержимого,
+а не по имени/Content-Type от клиента.
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 256 * 1024
+MAX_IMAGE_SIZE = int(os.getenv("UPLOAD_MAX_IMAGE_SIZE_MB", "15")) * 1024 * 1024
+# Запас на поля формы и заголовки частей multipart сверх размера файла
+MAX_FORM_OVERHEAD = 64 * 1024
+
+# MIME-тип -> расширение сохраняемого файла
+IMAGE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/heic": "heic",
+}
+
+HEIC_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+
+class UploadError(Exception):
+    """Базовая ошибка загрузки."""
+
+
+class UploadTooLarge(UploadError):
+    def __init__(self, limit: int):
+        super().__init__(f"File is too large. Maximum size is {limit // (1024 * 1024)} MB")
+        self.limit = limit
+
+
+class UnsupportedImageType(UploadError):
+    def __init__(self):
+        super().__init__(f"Unsupported image format. Allowed types: {', '.join(IMAGE_EXTENSIONS)}")
+
+
+class ImageUploadRoute(APIRoute):
+    """Маршрут, не дающий разбирать тело больше max_body_size (413 до записи на диск)."""
+    max_body_size = MAX_IMAGE_SIZE + MAX_FORM_OVERHEAD
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        limit = self.max_body_size
+
+        def too_large() -> HTTPException:
+            return HTTPException(status_code=413, detail=str(UploadTooLarge(limit - MAX_FORM_OVERHEAD)))
+
+        async def limited_handler(request: Request):
+            content_length = request.headers.get("content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+                raise too_large()
+
+            received = 0
+            receive = request.receive
+
+            async def limited_receive():
+                nonlocal received
+                message = await receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise too_large()
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
+
+
+@dataclass
+class StoredUpload:
+    path: Path
+    size: int
+    sha256: str
+    content_type: str
+    extension: str
+
+
+def detect_image_type(head: bytes) -> Optional[str]:
+    """MIME-тип изображения по первым байтам файла."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in HEIC_BRANDS:
+        return "image/heic"
+    return None
+
+
+async def save_image_upload(
+    file: UploadFile,
+    dest_dir: Path,
+    name: str,
+    max_size: int = MAX_IMAGE_SIZE,
+) -> StoredUpload:
+    """
+    Сохранить изображение из UploadFile в dest_dir/<name>.<ext>.
+    Бросает UploadTooLarge / UnsupportedImageType, временный файл при этом удаляется.
+    """
+    # Размер уже известен, если multipart-парсер его посчитал — отказываем до чтения
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLarge(max_size)
+
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest_dir / f".{name}.{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    content_type = None
+
+    out = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        try:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if content_type is None:
+                    content_type = detect_image_type(chunk[:16])
+                    if content_type is None:
+                        raise UnsupportedImageType()
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+            await run_in_threadpool(out.flush)
+        finally:
+            await run_in_threadpool(out.close)
+
+        if content_type is None:
+            raise UnsupportedImageType()
+
+        extension = IMAGE_EXTENSIONS[content_type]
+        final_path = dest_dir / f"{name}.{extension}"
+        await run_in_threadpool(os.replace, tmp_path, final_path)
+    except BaseException:
+        await run_in_threadpool(_unlink_quietly, tmp_path)
+        raise
+
+    return StoredUpload(
+        path=final_path,
+        size=size,
+        sha256=digest.hexdigest(),
+        content_type=content_type,
+        extension=extension,
+    )
+
+
+def _unlink_quietly(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,47 @@
+"""
+Подписанные ссылки на файлы хранилища.
+
+URL вида /api/files/<ключ>?exp=<unix-время>&sig=<HMAC-SHA256(ключ:exp)>
+проверяется только по подписи — без JWT и без запроса к БД, поэтому
+его можно отдавать в <img src> и кэшировать на CDN/прокси до exp.
+
+Срок округляется вверх до FILE_URL_TTL_STEP: в пределах шага для одного
+ключа выдаётся один и тот же URL, и кэши браузера/CDN не промахиваются
+при каждом обновлении страницы.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional, Tuple
+
+from app.auth import SECRET_KEY
+
+FILE_URL_TTL = int(os.getenv("FILE_URL_TTL", str(24 * 3600)))
+FILE_URL_TTL_STEP = int(os.getenv("FILE_URL_TTL_STEP", "3600"))
+
+# Отдельный ключ, чтобы подпись файла нельзя было использовать как JWT и наоборот
+_SIGNING_KEY = (
+    os.getenv("FILE_URL_SECRET")
+    or hmac.new(SECRET_KEY.encode(), b"file-url-signing", hashlib.sha256).hexdigest()
+).encode()
+
+
+def _signature(key: str, exp: int) -> str:
+    digest = hmac.new(_SIGNING_KEY, f"{key}:{exp}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def sign(key: str, now: Optional[float] = None) -> Tuple[int, str]:
+    """Срок действия и подпись для ключа."""
+    now = time.time() if now is None else now
+    exp = -(-int(now + FILE_URL_TTL) // FILE_URL_TTL_STEP) * FILE_URL_TTL_STEP
+    return exp, _signature(key, exp)
+
+
+def verify(key: str, exp: int, sig: str, now: Optional[float] = None) -> bool:
+    now = time.time() if now is None else now
+    if exp < now:
+        return False
+    return hmac.compare_digest(sig.encode(), _signature(key, exp).encode())
@@ -0,0 +1,173 @@
+"""
+Бенчмарк накладных расходов метрик (app.services.app_metrics).
+
+Меряет:
+- запись в гистограмму и счётчик (нс на операцию);
+- собственную цену MetricsMiddleware вокруг ASGI-приложения, которое ничего
+  не делает;
+- запрос к пустому маршруту FastAPI с MetricsMiddleware и без него
+  (ASGI-вызов напрямую, без сети — чтобы разница не тонула в шуме);
+- выдачу соединения из пула: QueuePool против InstrumentedQueuePool;
+- сборку текста /metrics при заданном числе рядов.
+
+Run with:
+    python bench_app_metrics.py [--requests 20000] [--rounds 7] [--routes 200]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sqlite3
+import sys
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import FastAPI
+from sqlalchemy.pool import QueuePool
+
+from app.services import app_metrics
+
+
+def per_op(fn, n: int) -> float:
+    started = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - started) / n
+
+
+def bench_primitives(n: int) -> None:
+    histogram = app_metrics.Histogram("bench_histogram_seconds", "bench", ("route",))
+    counter = app_metrics.Counter("bench_total", "bench", ("cache", "result"))
+    labels = ("/api/clients/{client_id}",)
+
+    def observe(k):
+        for i in range(k):
+            histogram.observe(0.0123, labels)
+
+    def inc(k):
+        for i in range(k):
+            counter.inc(("bench", "hit"))
+
+    def empty(k):
+        for i in range(k):
+            pass
+
+    loop = per_op(empty, n)
+    print(f"Histogram.observe: {(per_op(observe, n) - loop) * 1e9:.0f} ns/op")
+    print(f"Counter.inc:       {(per_op(inc, n) - loop) * 1e9:.0f} ns/op")
+    app_metrics.REGISTRY.remove(histogram)
+    app_metrics.REGISTRY.remove(counter)
+
+
+def make_app(with_metrics: bool):
+    app = FastAPI()
+
+    @app.get("/ping/{item_id}")
+    async def ping(item_id: str):
+        return {"ok": True}
+
+    if with_metrics:
+        app.add_middleware(app_metrics.MetricsMiddleware)
+    return app
+
+
+async def call(app, path: str) -> None:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def bench_middleware(n: int) -> None:
+    async def noop_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    results = {}
+    for name, app in (("bare", noop_app), ("middleware", app_metrics.MetricsMiddleware(noop_app))):
+        await call(app, "/ping/1")
+        started = time.perf_counter()
+        for i in range(n):
+            await call(app, "/ping/1")
+        results[name] = (time.perf_counter() - started) / n
+    print(f"MetricsMiddleware own cost: {(results['middleware'] - results['bare']) * 1e6:.2f} us/request")
+
+
+async def bench_requests(n: int, rounds: int) -> None:
+    # Варианты чередуются, берётся лучший раунд каждого: так меньше влияют шум и прогрев
+    apps = {False: make_app(False), True: make_app(True)}
+    for app in apps.values():
+        for i in range(500):
+            await call(app, f"/ping/{i}")
+    results = {}
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            for with_metrics, app in apps.items():
+                started = time.perf_counter()
+                for i in range(n):
+                    await call(app, f"/ping/{i}")
+                elapsed = (time.perf_counter() - started) / n
+                results[with_metrics] = min(results.get(with_metrics, elapsed), elapsed)
+    finally:
+        gc.enable()
+    base, instrumented = results[False], results[True]
+    print(
+        f"Request without metrics: {base * 1e6:.1f} us, with metrics: {instrumented * 1e6:.1f} us "
+        f"(+{(instrumented - base) * 1e6:.1f} us, {(instrumented / base - 1) * 100:+.1f}%)"
+    )
+
+
+def bench_pool(n: int) -> None:
+    results = {}
+    for pool_class in (QueuePool, app_metrics.InstrumentedQueuePool):
+        pool = pool_class(lambda: sqlite3.connect(":memory:"), pool_size=10, max_overflow=20)
+
+        def checkout(k):
+            for i in range(k):
+                pool.connect().close()
+
+        checkout(100)
+        results[pool_class.__name__] = per_op(checkout, n)
+        pool.dispose()
+    base, instrumented = results["QueuePool"], results["InstrumentedQueuePool"]
+    print(
+        f"Pool checkout+checkin: QueuePool {base * 1e6:.2f} us, "
+        f"InstrumentedQueuePool {instrumented * 1e6:.2f} us (+{(instrumented - base) * 1e6:.2f} us)"
+    )
+
+
+def bench_render(routes: int) -> None:
+    for i in range(routes):
+        for status in ("200", "404"):
+            app_metrics.HTTP_REQUEST_DURATION.observe(0.02, ("GET", f"/api/bench/{i}", status))
+    started = time.perf_counter()
+    text = app_metrics.render()
+    elapsed = time.perf_counter() - started
+    print(f"render(): {routes * 2} series, {len(text) // 1024} KB in {elapsed * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--routes", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    bench_primitives(args.requests * 10)
+    asyncio.run(bench_middleware(args.requests))
+    asyncio.run(bench_requests(args.requests // args.rounds, args.rounds))
+    bench_pool(args.requests)
+    bench_render(args.routes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Бенчмарк генерации вариантов фото прогресса на пачке «телефонных» снимков.
+
+Создаёт синтетические JPEG 4032x3024 (12 Мп, типичная камера смартфона) и
+сравнивает последовательную обработку с пулом процессов из photo_variants.
+
+Run with:
+    python bench_photo_variants.py [--photos 24] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.services.photo_variants import VARIANT_WORKERS, generate_variants
+
+MOBILE_SIZE = (4032, 3024)
+
+
+def make_photos(directory: Path, count: int) -> list:
+    from PIL import Image, ImageDraw
+
+    paths = []
+    for i in range(count):
+        image = Image.linear_gradient("L").resize(MOBILE_SIZE).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        for j in range(0, MOBILE_SIZE[0], 97):
+            draw.line([(j, 0), (MOBILE_SIZE[0] - j, MOBILE_SIZE[1])], fill=((i * 37 + j) % 255, j % 255, 128), width=9)
+        path = directory / f"photo_{i}.jpg"
+        image.save(path, "JPEG", quality=90)
+        paths.append(str(path))
+    return paths
+
+
+def bench(paths: list, workers: int) -> None:
+    original_bytes = sum(os.path.getsize(p) for p in paths)
+
+    started = time.perf_counter()
+    results = [generate_variants(p) for p in paths]
+    serial = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(generate_variants, paths))
+    pooled = time.perf_counter() - started
+
+    thumb_bytes = sum(os.path.getsize(r["thumb"]) for r in results)
+    medium_bytes = sum(os.path.getsize(r["medium"]) for r in results)
+    n = len(paths)
+    print(f"Photos: {n} x {MOBILE_SIZE[0]}x{MOBILE_SIZE[1]} JPEG, avg {original_bytes / n / 1024:.0f} KB")
+    print(f"Serial:            {serial:.2f}s ({serial / n * 1000:.0f} ms/photo)")
+    print(f"Process pool ({workers}): {pooled:.2f}s ({pooled / n * 1000:.0f} ms/photo, x{serial / pooled:.1f})")
+    print(f"Avg thumb:  {thumb_bytes / n / 1024:.1f} KB ({thumb_bytes / original_bytes * 100:.1f}% of original)")
+    print(f"Avg medium: {medium_bytes / n / 1024:.1f} KB ({medium_bytes / original_bytes * 100:.1f}% of original)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Photo variants benchmark")
+    parser.add_argument("--photos", type=int, default=24)
+    parser.add_argument("--workers", type=int, default=VARIANT_WORKERS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_photos(Path(tmp), args.photos)
+        bench(paths, args.workers)
+
+
+if __name__ == "__main__":
+    main()
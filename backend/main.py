@@ -1,14 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from app.database import engine, Base
+from app.services.notification_service import hub as notification_hub
+from app.services.notification_retention import ensure_partitions as ensure_notification_partitions
+from app.services.photo_variants import shutdown_pool as shutdown_photo_variant_pool
+from app.services import app_metrics, profiler
+from app.services.query_stats import QueryStatsMiddleware
 from app.routers import (
     auth, onboarding, users, workouts, programs, metrics,
     nutrition, finances, clients, exercises, notes, dashboard, settings, library, progress_photos, notifications,
-    clubs, admin
+    clubs, admin, files, sync
 )
+import hmac
 import logging
 import os
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -151,6 +158,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Число SQL-запросов и время в БД: заголовок Server-Timing и лог, поиск N+1
+app.add_middleware(QueryStatsMiddleware)
+# Латентность по маршрутам для /metrics (внешний слой — время всего запроса)
+app.add_middleware(app_metrics.MetricsMiddleware)
+# Профиль запроса по заголовку X-Profile: <ADMIN_SECRET>; выключен — не подключается вовсе
+if profiler.PROFILING_ENABLED:
+    app.add_middleware(profiler.ProfileRequestMiddleware, authorize=admin.is_admin_secret)
 
 # Подключение роутеров
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
@@ -174,11 +188,10 @@ from app.routers import payments
 app.include_router(payments.router, prefix="/api/payments", tags=["payments"])
 app.include_router(clubs.router, prefix="/api/clubs", tags=["clubs"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(sync.router, prefix="/api/sync", tags=["sync"])
 
-# Mount static files for uploads
-uploads_dir = os.path.join(os.path.dirname(__file__), "uploads")
-os.makedirs(uploads_dir, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# Uploaded files: access-checked, transfer offloaded to nginx (X-Accel-Redirect) or sendfile
+app.include_router(files.router, prefix="/api/files", tags=["files"])
 
 
 @app.get("/")
@@ -191,6 +204,19 @@ async def health():
     return {"status": "ok"}
 
 
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    """Метрики в формате Prometheus; при заданном METRICS_TOKEN — Bearer-токен"""
+    if METRICS_TOKEN and not hmac.compare_digest(
+        (authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(app_metrics.render(), media_type=app_metrics.CONTENT_TYPE)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Создаем таблицы при запуске приложения"""
@@ -200,4 +226,17 @@ async def startup_event():
     except Exception as e:
         logger.warning(f"Could not create database tables: {e}")
         logger.warning("Make sure PostgreSQL is running. You can start it with: docker-compose up -d db")
+    try:
+        # Страховка на случай, если maintain_notifications.py давно не запускался
+        with engine.begin() as conn:
+            ensure_notification_partitions(conn)
+    except Exception as e:
+        logger.warning(f"Could not ensure notification partitions: {e}")
+    await notification_hub.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await notification_hub.stop()
+    shutdown_photo_variant_pool()
 
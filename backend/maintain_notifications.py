@@ -0,0 +1,38 @@
+"""
+Обслуживание таблицы уведомлений: партиции вперёд, удаление старых партиций,
+очистка по срокам хранения типов (см. app/services/notification_retention.py).
+
+Запуск (например, ежедневно из cron):
+    python maintain_notifications.py
+    python maintain_notifications.py --months-ahead 6 --keep-detached
+"""
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.database import engine
+from app.services.notification_retention import PARTITION_MONTHS_AHEAD, RETENTION_DAYS, run_maintenance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notifications partitions and retention maintenance")
+    parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD,
+                        help="Сколько месяцев вперёд создавать партиции")
+    parser.add_argument("--keep-detached", action="store_true",
+                        help="Не удалять отсоединённые партиции (оставить как архив)")
+    args = parser.parse_args()
+
+    print(f"Retention (days): {RETENTION_DAYS}")
+    with engine.connect() as conn:
+        result = run_maintenance(conn, months_ahead=args.months_ahead, keep_detached=args.keep_detached)
+        conn.commit()
+
+    print(f"Created partitions: {', '.join(result['created']) or '—'}")
+    print(f"Detached partitions: {', '.join(result['detached']) or '—'}")
+    for notification_type, count in result["purged"].items():
+        print(f"Purged {notification_type}: {count}")
+
+
+if __name__ == "__main__":
+    main()
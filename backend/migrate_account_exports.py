@@ -0,0 +1,22 @@
+"""
+Migration: Create account_exports (background ZIP exports of user data).
+
+Run with:
+    python migrate_account_exports.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app import models
+from app.database import engine
+
+
+def migrate():
+    models.AccountExport.__table__.create(bind=engine, checkfirst=True)
+    print("Table account_exports is present")
+    print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate()
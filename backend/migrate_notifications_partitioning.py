@@ -0,0 +1,61 @@
+"""
+Migration: convert notifications into a table partitioned by month (created_at).
+
+Existing rows are copied into monthly partitions, the old table is dropped.
+The primary key becomes (id, created_at) — required for partitioning.
+
+Run with:
+    python migrate_notifications_partitioning.py
+
+After that schedule the maintenance job (e.g. daily cron):
+    python maintain_notifications.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import text
+from app.database import engine
+from app import models
+from app.services.notification_retention import ensure_partitions, is_partitioned
+
+LEGACY_TABLE = "notifications_legacy"
+LEGACY_INDEXES = ["notifications_pkey", "ix_notifications_id", "ix_notifications_user_id", "ix_notifications_user_unread"]
+COLUMNS = "id, user_id, sender_id, type, title, content, link, is_read, created_at"
+
+
+def migrate():
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            print("Table notifications is already partitioned")
+            return
+
+        conn.execute(text("LOCK TABLE notifications IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text(f"ALTER TABLE notifications RENAME TO {LEGACY_TABLE}"))
+        for index in LEGACY_INDEXES:
+            conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_legacy"))
+        print(f"Renamed notifications -> {LEGACY_TABLE}")
+
+        # Создаёт секционированную таблицу, индексы и партиции на ближайшие месяцы
+        models.Notification.__table__.create(conn)
+
+        oldest = conn.execute(text(f"SELECT min(created_at) FROM {LEGACY_TABLE}")).scalar()
+        if oldest:
+            created = ensure_partitions(conn, since=oldest.date())
+            print(f"Created {len(created)} partitions for existing data")
+
+        copied = conn.execute(text(f"""
+            INSERT INTO notifications ({COLUMNS})
+            SELECT id, user_id, sender_id, type, title, content, link,
+                   COALESCE(is_read, FALSE), COALESCE(created_at, now())
+            FROM {LEGACY_TABLE}
+        """)).rowcount
+        print(f"Copied {copied} notifications")
+
+        conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+        conn.commit()
+        print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate()
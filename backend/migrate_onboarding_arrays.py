@@ -0,0 +1,75 @@
+"""
+Migration: Move onboarding goals and restrictions into array columns.
+
+- adds onboardings.goals / onboardings.restrictions (VARCHAR[] NOT NULL DEFAULT '{}');
+- copies rows from onboarding_goals / onboarding_restrictions into them
+  (only into rows whose array is still empty, so re-running is safe);
+- checks that every legacy row was copied;
+- with --drop-legacy, drops the legacy tables after a successful check.
+
+Run with:
+    python migrate_onboarding_arrays.py [--drop-legacy]
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import inspect, text
+from app.database import engine
+
+# (устаревшая таблица, колонка значения, колонка-массив в onboardings)
+LEGACY_TABLES = (
+    ("onboarding_goals", "goal", "goals"),
+    ("onboarding_restrictions", "restriction", "restrictions"),
+)
+
+
+def migrate(drop_legacy: bool = False):
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for _, _, column in LEGACY_TABLES:
+            conn.execute(text(
+                f"ALTER TABLE onboardings ADD COLUMN IF NOT EXISTS {column} VARCHAR[] NOT NULL DEFAULT '{{}}'"
+            ))
+
+        verified = True
+        for table, value, column in LEGACY_TABLES:
+            if table not in existing:
+                print(f"{table}: not found, nothing to copy")
+                continue
+            # ctid — порядок вставки; отдельной колонки порядка в старых таблицах нет
+            result = conn.execute(text(f"""
+                UPDATE onboardings o
+                SET {column} = legacy.items
+                FROM (
+                    SELECT onboarding_id, array_agg({value} ORDER BY ctid) AS items
+                    FROM {table}
+                    GROUP BY onboarding_id
+                ) legacy
+                WHERE legacy.onboarding_id = o.id AND cardinality(o.{column}) = 0
+            """))
+            print(f"{table}: copied into {result.rowcount} onboardings")
+
+            legacy_count = conn.execute(text(
+                f"SELECT count(*) FROM {table} WHERE onboarding_id IN (SELECT id FROM onboardings)"
+            )).scalar()
+            copied_count = conn.execute(text(f"""
+                SELECT coalesce(sum(cardinality(o.{column})), 0)
+                FROM onboardings o
+                WHERE EXISTS (SELECT 1 FROM {table} t WHERE t.onboarding_id = o.id)
+            """)).scalar()
+            if legacy_count != copied_count:
+                verified = False
+                print(f"{table}: {legacy_count} legacy rows, {copied_count} array items — check manually")
+
+        if drop_legacy:
+            if not verified:
+                raise SystemExit("Legacy tables were not dropped: copy check failed")
+            for table, _, _ in LEGACY_TABLES:
+                conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+                print(f"{table}: dropped")
+    print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate(drop_legacy="--drop-legacy" in sys.argv[1:])
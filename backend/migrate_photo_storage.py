@@ -0,0 +1,104 @@
+"""
+Migration: Create stored_blobs and move progress photos uploaded to
+uploads/progress_photos/<user_id>/ into content-addressed storage.
+
+Identical files are stored once; ProgressPhoto.url / thumbnail_url / medium_url
+become storage keys. Legacy files are removed after the photo is committed.
+Works with any STORAGE_BACKEND (local or s3).
+
+Run with:
+    python migrate_photo_storage.py
+"""
+import hashlib
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app import models
+from app.database import engine
+from app.services.photo_storage import blob_key
+from app.services.photo_variants import VARIANT_SIZES, variant_path, variant_url
+from app.services.storage import get_storage
+from app.services.upload_service import detect_image_type
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def migrate():
+    models.StoredBlob.__table__.create(bind=engine, checkfirst=True)
+    print("Table stored_blobs is present")
+
+    storage = get_storage()
+    with Session(engine) as db:
+        photos = db.query(models.ProgressPhoto).filter(
+            models.ProgressPhoto.url.like("/uploads/%")
+        ).all()
+        print(f"Legacy photos: {len(photos)}")
+
+        moved = 0
+        for photo in photos:
+            path = Path(BASE_DIR) / photo.url.lstrip("/")
+            if not path.is_file():
+                print(f"File not found for photo {photo.id}: {photo.url}")
+                continue
+            with open(path, "rb") as f:
+                content_type = detect_image_type(f.read(16))
+            if content_type is None:
+                print(f"Unknown image type for photo {photo.id}: {photo.url}")
+                continue
+
+            sha256 = file_sha256(path)
+            blob = db.get(models.StoredBlob, sha256)
+            legacy_files = [path] + [variant_path(path, v) for v in VARIANT_SIZES]
+            if blob is None:
+                variants = [v for v in VARIANT_SIZES if variant_path(path, v).is_file()]
+                has_variants = len(variants) == len(VARIANT_SIZES)
+                blob = models.StoredBlob(
+                    hash=sha256,
+                    key=blob_key(sha256, path.suffix.lstrip(".")),
+                    content_type=content_type,
+                    size=path.stat().st_size,
+                    has_variants=has_variants,
+                    ref_count=0,
+                )
+                if has_variants:
+                    for variant in VARIANT_SIZES:
+                        storage.put_file(variant_path(path, variant), variant_url(blob.key, variant), "image/webp")
+                storage.put_file(path, blob.key, content_type)
+                db.add(blob)
+
+            blob.ref_count += 1
+            photo.url = blob.key
+            photo.content_hash = sha256
+            photo.thumbnail_url = variant_url(blob.key, "thumb") if blob.has_variants else None
+            photo.medium_url = variant_url(blob.key, "medium") if blob.has_variants else None
+            db.commit()
+
+            # Дубликаты и оставшиеся после копирования в S3 файлы больше не нужны
+            for legacy in legacy_files:
+                legacy.unlink(missing_ok=True)
+            moved += 1
+            if moved % 100 == 0:
+                print(f"Moved {moved} photos")
+
+        print(f"Moved {moved} photos to storage")
+
+    with engine.connect() as conn:
+        blobs, refs = conn.execute(text("SELECT COUNT(*), COALESCE(SUM(ref_count), 0) FROM stored_blobs")).one()
+        print(f"Stored blobs: {blobs}, references: {refs}")
+    print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,67 @@
+"""
+Migration: Add thumbnail_url / medium_url columns to progress_photos and
+generate WebP variants for photos uploaded before the variant pipeline.
+
+Run with:
+    python migrate_photo_variants.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sqlalchemy import text
+from app.database import engine
+from app.services.photo_variants import VARIANT_WORKERS, generate_variants, variant_url
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def migrate():
+    with engine.connect() as conn:
+        conn.execute(text("ALTER TABLE progress_photos ADD COLUMN IF NOT EXISTS thumbnail_url VARCHAR"))
+        conn.execute(text("ALTER TABLE progress_photos ADD COLUMN IF NOT EXISTS medium_url VARCHAR"))
+        conn.commit()
+        print("Columns thumbnail_url, medium_url are present")
+
+        rows = conn.execute(text(
+            "SELECT id, url FROM progress_photos WHERE thumbnail_url IS NULL"
+        )).fetchall()
+        print(f"Photos without variants: {len(rows)}")
+
+        done = 0
+        with ProcessPoolExecutor(max_workers=VARIANT_WORKERS) as pool:
+            futures = {}
+            for photo_id, url in rows:
+                path = os.path.join(BASE_DIR, url.lstrip("/"))
+                if not os.path.isfile(path):
+                    print(f"File not found for photo {photo_id}: {url}")
+                    continue
+                futures[pool.submit(generate_variants, path)] = (photo_id, url)
+
+            for future in as_completed(futures):
+                photo_id, url = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as e:
+                    print(f"Could not generate variants for photo {photo_id}: {e}")
+                    continue
+                conn.execute(
+                    text("UPDATE progress_photos SET thumbnail_url = :thumb, medium_url = :medium WHERE id = :id"),
+                    {
+                        "thumb": variant_url(url, "thumb") if "thumb" in variants else None,
+                        "medium": variant_url(url, "medium") if "medium" in variants else None,
+                        "id": photo_id,
+                    },
+                )
+                done += 1
+                if done % 100 == 0:
+                    conn.commit()
+                    print(f"Processed {done} photos")
+        conn.commit()
+        print(f"Generated variants for {done} photos")
+        print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate()
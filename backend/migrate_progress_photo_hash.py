@@ -0,0 +1,58 @@
+"""
+Migration: Add content_hash (SHA-256) column to progress_photos and backfill it
+from files already stored under uploads/.
+
+Run with:
+    python migrate_progress_photo_hash.py
+"""
+import hashlib
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import text
+from app.database import engine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def migrate():
+    with engine.connect() as conn:
+        conn.execute(text(
+            "ALTER TABLE progress_photos ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_progress_photos_content_hash ON progress_photos (content_hash)"
+        ))
+        conn.commit()
+        print("Column content_hash is present")
+
+        rows = conn.execute(text(
+            "SELECT id, url FROM progress_photos WHERE content_hash IS NULL"
+        )).fetchall()
+        updated = 0
+        for photo_id, url in rows:
+            path = os.path.join(BASE_DIR, url.lstrip("/"))
+            if not os.path.isfile(path):
+                print(f"File not found for photo {photo_id}: {url}")
+                continue
+            conn.execute(
+                text("UPDATE progress_photos SET content_hash = :hash WHERE id = :id"),
+                {"hash": file_sha256(path), "id": photo_id},
+            )
+            updated += 1
+        conn.commit()
+        print(f"Backfilled content_hash for {updated} of {len(rows)} photos")
+        print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate()
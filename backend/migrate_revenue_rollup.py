@@ -0,0 +1,32 @@
+"""
+Migration: Create trainer_monthly_revenue and fill it from existing payments.
+
+The table is maintained by app.services.revenue_rollup on payment create/delete;
+running this script again recomputes it from scratch.
+
+Run with:
+    python migrate_revenue_rollup.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy.orm import Session
+from app import models
+from app.database import engine
+from app.services import revenue_rollup
+
+
+def migrate():
+    models.TrainerMonthlyRevenue.__table__.create(bind=engine, checkfirst=True)
+    print("Table trainer_monthly_revenue is present")
+
+    with Session(engine) as db:
+        rows = revenue_rollup.rebuild(db)
+        db.commit()
+    print(f"Rebuilt {rows} monthly revenue rows")
+    print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,64 @@
+"""
+Migration: Prepare tables for the /api/sync change feed.
+
+- adds updated_at to body_metrics and exercise_metrics;
+- backfills updated_at = created_at where it is NULL and sets DEFAULT now(),
+  so new rows are visible to the feed without a separate created_at check;
+- creates sync_tombstones (ids of hard-deleted rows);
+- creates the (owner, updated_at) indexes CONCURRENTLY.
+
+Run with:
+    python migrate_sync_feed.py
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import text
+from app import models
+from app.database import engine
+
+SYNCED_TABLES = (
+    "workouts", "training_programs", "nutrition_entries", "trainer_notes",
+    "body_metrics", "exercise_metrics",
+)
+
+INDEXES = (
+    "ix_workouts_user_updated ON workouts (user_id, updated_at)",
+    "ix_workouts_trainer_updated ON workouts (trainer_id, updated_at)",
+    "ix_training_programs_user_updated ON training_programs (user_id, updated_at)",
+    "ix_nutrition_entries_user_updated ON nutrition_entries (user_id, updated_at)",
+    "ix_trainer_notes_trainer_updated ON trainer_notes (trainer_id, updated_at)",
+    "ix_trainer_notes_client_updated ON trainer_notes (client_id, updated_at)",
+    "ix_body_metrics_user_updated ON body_metrics (user_id, updated_at)",
+    "ix_exercise_metrics_user_updated ON exercise_metrics (user_id, updated_at)",
+    "ix_body_metric_entries_metric_created ON body_metric_entries (metric_id, created_at)",
+    "ix_exercise_metric_entries_metric_created ON exercise_metric_entries (exercise_metric_id, created_at)",
+)
+
+
+def migrate():
+    with engine.connect() as conn:
+        for table in ("body_metrics", "exercise_metrics"):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE"))
+        for table in SYNCED_TABLES:
+            result = conn.execute(text(
+                f"UPDATE {table} SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL"
+            ))
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN updated_at SET DEFAULT now()"))
+            print(f"{table}: backfilled updated_at for {result.rowcount} rows")
+        conn.commit()
+
+    models.SyncTombstone.__table__.create(bind=engine, checkfirst=True)
+    print("Table sync_tombstones is present")
+
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in INDEXES:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index}"))
+            print(f"Index {index.split()[0]} is present")
+    print("Migration completed successfully.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,7 @@
+-- Составные индексы для выборки записей метрики по дате и режима latest=true (DISTINCT ON)
+-- CONCURRENTLY нельзя выполнять внутри транзакции: запускайте файл через psql без -1
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_body_metric_entries_metric_recorded
+    ON body_metric_entries (metric_id, recorded_at DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_exercise_metric_entries_metric_date
+    ON exercise_metric_entries (exercise_metric_id, date DESC);
@@ -0,0 +1,8 @@
+-- Частичный индекс по непрочитанным уведомлениям (счётчик бейджа, only_unread=true)
+-- CONCURRENTLY нельзя выполнять внутри транзакции: запускайте файл через psql без -1
+UPDATE notifications SET is_read = FALSE WHERE is_read IS NULL;
+ALTER TABLE notifications ALTER COLUMN is_read SET DEFAULT FALSE;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notifications_user_unread
+    ON notifications (user_id, created_at)
+    WHERE is_read = false;
@@ -0,0 +1,4 @@
+-- Составной индекс для дневника питания за период и GET /api/nutrition/summary
+-- CONCURRENTLY нельзя выполнять внутри транзакции: запускайте файл через psql без -1
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_nutrition_entries_user_date
+    ON nutrition_entries (user_id, date);
@@ -0,0 +1,7 @@
+-- Частичный индекс активных пакетов клиента для списания занятий (SELECT ... FOR UPDATE в session_ledger.deduct_session;
+-- блокировка ждущая, без SKIP LOCKED — иначе баланс клиента и остатки пакетов расходятся)
+-- В enum paymenttype хранятся имена членов PaymentType (PACKAGE, а не package)
+-- CONCURRENTLY нельзя выполнять внутри транзакции: запускайте файл через psql без -1
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payments_active_packages
+    ON payments (client_id, date)
+    WHERE type = 'PACKAGE' AND remaining_sessions > 0;
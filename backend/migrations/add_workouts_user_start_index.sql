@@ -0,0 +1,5 @@
+-- Тренировки клиента по времени: сводка в списке клиентов (LATERAL-подзапросы),
+-- статистика /clients/{id}/stats, ближайшая и последняя тренировка
+-- CONCURRENTLY нельзя выполнять внутри транзакции: запускайте файл через psql без -1
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_workouts_user_start
+    ON workouts (user_id, start);
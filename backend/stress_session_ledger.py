@@ -0,0 +1,185 @@
+"""
+Нагрузочная проверка списания занятий (app.services.session_ledger) на PostgreSQL.
+
+Создаёт тренера и клиента с несколькими пакетами, затем из множества потоков
+одновременно отмечает тренировки выполненными — каждую по несколько раз.
+Параллельно --lockers потоков держат блокировку строки активного пакета (как
+редактирование платежа), чтобы списание сталкивалось с чужой блокировкой.
+После прогона проверяет, что каждая тренировка списана ровно один раз:
+баланс клиента и остатки пакетов уменьшились на число тренировок,
+ни один остаток не ушёл в минус. Созданные данные удаляются.
+
+Run with:
+    DATABASE_URL=postgresql://... python stress_session_ledger.py [--workouts 200] [--threads 16] [--repeats 3]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+sys.path.insert(0, os.path.dirname(__file__))
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import engine
+from app.services import session_ledger
+
+
+def create_fixture(workouts: int, packages: int) -> dict:
+    trainer_id, client_id = str(uuid.uuid4()), str(uuid.uuid4())
+    per_package = -(-workouts // packages) + 1  # с запасом: пакеты не должны закончиться
+    now = datetime.now(timezone.utc)
+    with Session(engine) as db:
+        for user_id, role in ((trainer_id, models.UserRole.TRAINER), (client_id, models.UserRole.CLIENT)):
+            db.add(models.User(
+                id=user_id,
+                full_name=f"Stress {role.value}",
+                email=f"stress-{user_id}@example.com",
+                hashed_password="-",
+                role=role,
+                trainer_id=trainer_id if role == models.UserRole.CLIENT else None,
+                workouts_package=per_package * packages if role == models.UserRole.CLIENT else None,
+            ))
+        db.flush()
+        for i in range(packages):
+            db.add(models.Payment(
+                id=str(uuid.uuid4()),
+                trainer_id=trainer_id,
+                client_id=client_id,
+                amount=1000,
+                date=now - timedelta(days=packages - i),
+                type=models.PaymentType.PACKAGE,
+                package_size=per_package,
+                remaining_sessions=per_package,
+            ))
+        workout_ids = []
+        for i in range(workouts):
+            workout_id = str(uuid.uuid4())
+            workout_ids.append(workout_id)
+            db.add(models.Workout(
+                id=workout_id,
+                user_id=client_id,
+                trainer_id=trainer_id,
+                title="Stress",
+                start=now + timedelta(hours=i),
+                end=now + timedelta(hours=i, minutes=50),
+            ))
+        db.commit()
+    return {
+        "trainer_id": trainer_id,
+        "client_id": client_id,
+        "workout_ids": workout_ids,
+        "initial_sessions": per_package * packages,
+    }
+
+
+def complete(workout_id: str, client_id: str) -> bool:
+    with Session(engine) as db:
+        deducted = False
+        if session_ledger.claim_completion(db, workout_id):
+            session_ledger.deduct_session(db, client_id)
+            deducted = True
+        # Немного подержать блокировки, чтобы транзакции пересекались
+        time.sleep(random.uniform(0, 0.005))
+        db.commit()
+        return deducted
+
+
+def hold_package_locks(client_id: str, stop) -> int:
+    """Блокировать самый старый активный пакет на несколько мс, пока не выставлен stop."""
+    held = 0
+    while not stop.is_set():
+        with Session(engine) as db:
+            package_id = db.execute(
+                select(models.Payment.id)
+                .where(
+                    models.Payment.client_id == client_id,
+                    models.Payment.type == models.PaymentType.PACKAGE,
+                    models.Payment.remaining_sessions > 0,
+                )
+                .order_by(models.Payment.date.asc())
+                .limit(1)
+                .with_for_update()
+            ).scalar()
+            if package_id is None:
+                return held
+            held += 1
+            time.sleep(random.uniform(0.001, 0.01))
+            db.commit()
+    return held
+
+
+def cleanup(fixture: dict) -> None:
+    with Session(engine) as db:
+        db.query(models.Workout).filter(models.Workout.user_id == fixture["client_id"]).delete(synchronize_session=False)
+        db.query(models.Payment).filter(models.Payment.client_id == fixture["client_id"]).delete(synchronize_session=False)
+        db.query(models.User).filter(models.User.id == fixture["client_id"]).delete(synchronize_session=False)
+        db.query(models.User).filter(models.User.id == fixture["trainer_id"]).delete(synchronize_session=False)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workouts", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3, help="Сколько раз отмечается каждая тренировка")
+    parser.add_argument("--packages", type=int, default=3)
+    parser.add_argument("--lockers", type=int, default=2, help="Потоки, держащие блокировку пакета")
+    args = parser.parse_args()
+
+    fixture = create_fixture(args.workouts, args.packages)
+    try:
+        calls = fixture["workout_ids"] * args.repeats
+        random.shuffle(calls)
+        started = time.perf_counter()
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=args.lockers or 1) as lockers:
+            locks = [lockers.submit(hold_package_locks, fixture["client_id"], stop) for _ in range(args.lockers)]
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                results = list(pool.map(lambda workout_id: complete(workout_id, fixture["client_id"]), calls))
+            stop.set()
+            held = sum(lock.result() for lock in locks)
+        elapsed = time.perf_counter() - started
+        print(f"{len(calls)} completions in {elapsed:.2f}s ({len(calls) / elapsed:.0f}/s), threads={args.threads}, "
+              f"package locks held by lockers: {held}")
+
+        with Session(engine) as db:
+            balance = db.query(models.User.workouts_package).filter(
+                models.User.id == fixture["client_id"]
+            ).scalar()
+            remaining = [
+                row.remaining_sessions for row in db.query(models.Payment.remaining_sessions).filter(
+                    models.Payment.client_id == fixture["client_id"]
+                )
+            ]
+            completed = db.query(func.count(models.Workout.id)).filter(
+                models.Workout.user_id == fixture["client_id"],
+                models.Workout.attendance == models.AttendanceStatus.COMPLETED,
+            ).scalar()
+
+        expected = fixture["initial_sessions"] - args.workouts
+        checks = {
+            "deductions == workouts": sum(results) == args.workouts,
+            "completed workouts": completed == args.workouts,
+            "client balance": balance == expected,
+            "package remaining total": sum(remaining) == expected,
+            "no negative packages": min(remaining) >= 0,
+        }
+        for name, ok in checks.items():
+            print(f"{'OK  ' if ok else 'FAIL'} {name}")
+        print(f"balance={balance} remaining={remaining} expected={expected}")
+        if not all(checks.values()):
+            sys.exit(1)
+    finally:
+        cleanup(fixture)
+
+
+if __name__ == "__main__":
+    main()